@@ -14,6 +14,14 @@ class Settings(BaseSettings):
     supabase_key: str
     supabase_service_key: str
 
+    # Supabase - pool de conexiones HTTP del cliente async
+    supabase_http_max_connections: int = 100
+    supabase_http_max_keepalive: int = 20  # Conexiones ociosas que se conservan abiertas
+    supabase_http_keepalive_seconds: float = 30
+    supabase_http_timeout_seconds: float = 10
+    supabase_http_connect_timeout_seconds: float = 5
+    supabase_http2: bool = True
+
     # JWT
     secret_key: str
     algorithm: str = "HS256"
@@ -25,6 +33,57 @@ class Settings(BaseSettings):
     document_ai_location: str = "us"  # us, eu, asia
     document_ai_processor_id: str
 
+    # OCR - concurrencia
+    ocr_max_concurrency: int = 4  # Llamadas simultáneas máximas a Document AI por worker
+
+    # OCR - backend: documentai | record (Document AI + grabar respuestas) | replay (sin red)
+    ocr_backend: str = "documentai"
+    ocr_recordings_dir: str = "ocr_recordings"
+    ocr_replay_latency_ms: float = 1500  # Latencia sintética en modo replay
+    ocr_replay_jitter_ms: float = 0
+    ocr_replay_strict: bool = False  # True = falla si la imagen no tiene grabación
+
+    # OCR - cache de resultados (por hash de imagen)
+    ocr_cache_max_bytes: int = 64 * 1024 * 1024  # Límite del nivel en memoria
+    ocr_cache_path: str = ""  # Archivo SQLite para el nivel persistente (vacío = solo memoria)
+
+    # OCR - escaneo por lotes
+    ocr_batch_concurrency: int = 4  # Recibos procesándose a la vez por lote
+    ocr_batch_max_files: int = 200
+
+    # OCR - trabajos en segundo plano (scan-and-create-expense con background=true)
+    ocr_job_workers: int = 4
+    ocr_job_max_pending: int = 500
+    ocr_job_retention_seconds: int = 3600  # Cuánto se conserva un trabajo terminado
+
+    # OCR - recepción de archivos
+    ocr_upload_max_bytes: int = 20 * 1024 * 1024  # Máximo por archivo (413 si pasa)
+    ocr_upload_max_request_bytes: int = 200 * 1024 * 1024  # Máximo por request (scan-batch manda varios)
+    ocr_upload_spool_bytes: int = 1024 * 1024  # Arriba de esto el archivo se queda en disco (mmap)
+
+    # Preprocesamiento de imágenes (antes de OCR y Storage)
+    image_preprocess_enabled: bool = True
+    image_max_dimension: int = 2000  # Lado mayor en px
+    image_grayscale: bool = True
+    image_jpeg_quality: int = 85
+
+    # Importación masiva de gastos (CSV, XLSX, OFX)
+    expense_import_chunk_size: int = 500  # Filas por upsert
+    expense_import_max_errors: int = 1000  # Errores por fila que se incluyen en el reporte
+
+    # Cache de categorías (nombre -> id)
+    category_cache_ttl_seconds: float = 300
+
+    # Catálogo de comercios y categorías
+    merchant_catalog_path: str = ""  # JSON del catálogo (vacío = app/data/merchants.json)
+    merchant_catalog_reload_seconds: float = 30  # Cada cuánto revisar si el archivo cambió
+    merchant_fuzzy_threshold: float = 0.65  # Similitud mínima (0-1) para aceptar un comercio con errores de OCR
+    merchant_fuzzy_header_lines: int = 8  # Renglones del inicio del recibo donde buscar el comercio
+
+    # Sincronización offline (GET/POST /api/sync)
+    sync_page_size: int = 500  # Cambios por página de GET /api/sync
+    sync_max_operations: int = 500  # Operaciones máximas por POST /api/sync
+
     class Config:
         env_file = ".env"
         case_sensitive = False
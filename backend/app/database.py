@@ -1,4 +1,25 @@
-from supabase import create_client, Client
+"""
+Acceso a Supabase
+
+- `get_db` (routers y servicios): cliente async de Supabase sobre un pool de
+  conexiones httpx compartido (keep-alive y HTTP/2), así que cada consulta a
+  PostgREST o Storage se hace con `await ... .execute()` sin bloquear el event
+  loop, y las consultas concurrentes usan conexiones distintas en lugar de
+  formarse detrás de un cliente síncrono
+- `get_admin_db`: igual, con la service key (sin RLS). Solo para las rutas
+  que llaman funciones de la BD reservadas a `service_role` (sync_*,
+  budget_evaluate_alerts); el resto sigue con `get_db` y RLS
+- `supabase` / `supabase_admin`: clientes síncronos para scripts y jobs que
+  corren fuera del servidor (scripts/)
+
+Límites del pool y timeouts: SUPABASE_HTTP_* en .env.
+"""
+
+from typing import Dict, Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, Client, create_client
+
 from app.config import settings
 
 # Cliente de Supabase (singleton)
@@ -13,6 +34,95 @@ supabase_admin: Client = create_client(
     settings.supabase_service_key
 )
 
-def get_db():
-    """Dependency para obtener cliente de Supabase"""
-    return supabase
+
+class Database:
+    """Cliente async de Supabase con un pool de conexiones httpx propio"""
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30,
+        timeout: float = 10,
+        connect_timeout: float = 5,
+        http2: bool = True
+    ):
+        self.url = url
+        self.key = key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self._client: Optional[AsyncClient] = None
+
+    @property
+    def client(self) -> AsyncClient:
+        """
+        Cliente async (se crea en el primer uso, ya dentro del event loop)
+
+        PostgREST, Storage y Auth comparten el mismo pool de conexiones.
+        """
+        if self._client is None:
+            self._http = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                follow_redirects=True
+            )
+            self._client = AsyncClient(
+                self.url,
+                self.key,
+                options=AsyncClientOptions(httpx_client=self._http)
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Cierra las conexiones del pool (al apagar el servidor)"""
+        if self._http is not None:
+            await self._http.aclose()
+        self._http = None
+        self._client = None
+
+    def stats(self) -> Dict:
+        return {
+            "connected": self._client is not None,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "timeout": self.timeout.read,
+            "connect_timeout": self.timeout.connect,
+            "http2": self.http2,
+        }
+
+
+def _build_database(key: str) -> Database:
+    return Database(
+        settings.supabase_url,
+        key,
+        max_connections=settings.supabase_http_max_connections,
+        max_keepalive_connections=settings.supabase_http_max_keepalive,
+        keepalive_expiry=settings.supabase_http_keepalive_seconds,
+        timeout=settings.supabase_http_timeout_seconds,
+        connect_timeout=settings.supabase_http_connect_timeout_seconds,
+        http2=settings.supabase_http2
+    )
+
+
+# Singletons
+database = _build_database(settings.supabase_key)
+admin_database = _build_database(settings.supabase_service_key)
+
+def get_db() -> AsyncClient:
+    """Dependency para obtener cliente async de Supabase"""
+    return database.client
+
+def get_admin_db() -> AsyncClient:
+    """Dependency para obtener cliente async de Supabase con service key"""
+    return admin_database.client
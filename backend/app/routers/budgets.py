@@ -0,0 +1,256 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from uuid import UUID
+from datetime import date, datetime, timezone
+from app.schemas.budget import BudgetCreate, BudgetUpdate
+from app.database import get_admin_db, get_db
+from app.services.budget_service import budget_service
+from supabase import AsyncClient
+
+router = APIRouter()
+
+# TODO: Obtener user_id del token JWT
+TEMP_USER_ID = "00000000-0000-0000-0000-000000000000"
+
+
+@router.post("/", response_model=dict, status_code=201)
+async def create_budget(
+    budget: BudgetCreate,
+    db: AsyncClient = Depends(get_db),
+    admin_db: AsyncClient = Depends(get_admin_db)
+):
+    """
+    Crear un presupuesto
+
+    Si el periodo actual ya cruzó un umbral, las alertas se registran al
+    crearlo y vienen en `alerts`.
+    """
+    try:
+        budget_data = {
+            "user_id": TEMP_USER_ID,
+            "project_id": str(budget.project_id) if budget.project_id else None,
+            "category_id": str(budget.category_id) if budget.category_id else None,
+            "amount": str(budget.amount),
+            "period": budget.period,
+            "start_date": budget.start_date.isoformat(),
+            "end_date": budget.end_date.isoformat() if budget.end_date else None,
+        }
+
+        result = await db.table("budgets").insert(budget_data).execute()
+        if not result.data:
+            raise HTTPException(status_code=400, detail="Error al crear presupuesto")
+
+        created = result.data[0]
+        # budget_evaluate_alerts solo la ejecuta service_role
+        alerts = await budget_service.evaluate_alerts(admin_db, [created["id"]])
+        status = await budget_service.status(db, budget_ids=[created["id"]])
+
+        return {
+            "success": True,
+            "message": "Presupuesto creado exitosamente",
+            "data": created,
+            "status": status[0] if status else None,
+            "alerts": alerts
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear presupuesto: {str(e)}")
+
+@router.get("/", response_model=dict)
+async def get_budgets(
+    project_id: Optional[UUID] = None,
+    as_of: Optional[date] = None,
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Consumo del periodo actual de los presupuestos activos
+
+    Con `project_id`, los del proyecto; sin él, los del usuario. `as_of`
+    evalúa otro día (default: hoy). Una sola consulta para todos.
+    """
+    try:
+        # TODO: Validar que el usuario del token sea miembro del proyecto
+        if project_id:
+            budgets = await budget_service.status(db, project_id=str(project_id), as_of=as_of)
+        else:
+            budgets = await budget_service.status(db, user_id=TEMP_USER_ID, as_of=as_of)
+
+        return {
+            "success": True,
+            "data": budgets,
+            "count": len(budgets)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener presupuestos: {str(e)}")
+
+@router.get("/alerts", response_model=dict)
+async def get_budget_alerts(
+    project_id: Optional[UUID] = None,
+    include_acknowledged: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Alertas de umbral (80% / 100%) de los presupuestos, más recientes primero
+
+    Por default solo las que no se han marcado como vistas.
+    """
+    try:
+        if project_id:
+            alerts = await budget_service.alerts(
+                db, project_id=str(project_id), include_acknowledged=include_acknowledged, limit=limit
+            )
+        else:
+            alerts = await budget_service.alerts(
+                db, user_id=TEMP_USER_ID, include_acknowledged=include_acknowledged, limit=limit
+            )
+
+        return {
+            "success": True,
+            "data": alerts,
+            "count": len(alerts)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener alertas: {str(e)}")
+
+@router.post("/alerts/{alert_id}/acknowledge", response_model=dict)
+async def acknowledge_budget_alert(
+    alert_id: UUID,
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Marcar una alerta como vista
+    """
+    try:
+        result = await db.table("budget_alerts")\
+            .update({"acknowledged_at": datetime.now(timezone.utc).isoformat()})\
+            .eq("id", str(alert_id))\
+            .execute()
+
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Alerta no encontrada")
+
+        return {
+            "success": True,
+            "data": result.data[0]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar alerta: {str(e)}")
+
+@router.get("/{budget_id}", response_model=dict)
+async def get_budget(
+    budget_id: UUID,
+    as_of: Optional[date] = None,
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Obtener un presupuesto con el consumo de su periodo actual
+
+    `status` es None si el presupuesto no está activo ese día.
+    """
+    try:
+        result = await db.table("budgets")\
+            .select("*")\
+            .eq("id", str(budget_id))\
+            .execute()
+
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
+
+        status = await budget_service.status(db, budget_ids=[str(budget_id)], as_of=as_of)
+
+        return {
+            "success": True,
+            "data": result.data[0],
+            "status": status[0] if status else None
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener presupuesto: {str(e)}")
+
+@router.put("/{budget_id}", response_model=dict)
+async def update_budget(
+    budget_id: UUID,
+    budget: BudgetUpdate,
+    db: AsyncClient = Depends(get_db),
+    admin_db: AsyncClient = Depends(get_admin_db)
+):
+    """
+    Actualizar un presupuesto (se re-evalúan sus alertas)
+    """
+    try:
+        update_data = budget.model_dump(mode="json", exclude_none=True)
+        if not update_data:
+            raise HTTPException(status_code=400, detail="No hay datos para actualizar")
+
+        if "start_date" in update_data or "end_date" in update_data:
+            current = await db.table("budgets")\
+                .select("start_date, end_date")\
+                .eq("id", str(budget_id))\
+                .execute()
+            if not current.data:
+                raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
+            dates = {**current.data[0], **update_data}
+            if dates["end_date"] and dates["end_date"] < dates["start_date"]:
+                raise HTTPException(status_code=400, detail="end_date debe ser posterior o igual a start_date")
+
+        result = await db.table("budgets")\
+            .update(update_data)\
+            .eq("id", str(budget_id))\
+            .execute()
+
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
+
+        updated = result.data[0]
+        alerts = await budget_service.evaluate_alerts(admin_db, [updated["id"]])
+        status = await budget_service.status(db, budget_ids=[updated["id"]])
+
+        return {
+            "success": True,
+            "message": "Presupuesto actualizado exitosamente",
+            "data": updated,
+            "status": status[0] if status else None,
+            "alerts": alerts
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar presupuesto: {str(e)}")
+
+@router.delete("/{budget_id}", response_model=dict)
+async def delete_budget(
+    budget_id: UUID,
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Eliminar un presupuesto (y sus alertas)
+    """
+    try:
+        result = await db.table("budgets")\
+            .delete()\
+            .eq("id", str(budget_id))\
+            .execute()
+
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Presupuesto no encontrado")
+
+        return {
+            "success": True,
+            "message": "Presupuesto eliminado exitosamente"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al eliminar presupuesto: {str(e)}")
@@ -1,16 +1,98 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, File, Form, Query, Request, Response, UploadFile
+from typing import Dict, List, Optional
 from uuid import UUID
+from datetime import date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import asyncio
 from app.schemas.expense import ExpenseCreate, ExpenseUpdate, ExpenseResponse
 from app.database import get_db
-from supabase import Client
+from app.services.category_resolver import category_resolver
+from app.services.expense_service import expense_service
+from app.services.expense_import import expense_importer, detect_format, FORMATS
+from app.services.expense_summary import expense_summary, DEFAULT_TIMEZONE, PERIODS
+from app.services.expense_search import expense_search
+from app.utils.pagination import InvalidCursorError, decode_cursor, keyset_filter, page
+from app.utils.etag import etag_matches, make_etag, not_modified, set_etag
+from supabase import AsyncClient
 
 router = APIRouter()
 
+# TODO: Obtener user_id del token JWT
+TEMP_USER_ID = "00000000-0000-0000-0000-000000000000"
+
+# Columnas de expenses que se pueden pedir en la lista con `fields=`
+EXPENSE_FIELDS = (
+    "id", "user_id", "project_id", "category_id", "name", "description", "amount", "date",
+    "merchant_name", "merchant_address", "tax_amount", "payment_method", "rfc",
+    "is_deductible", "has_invoice", "invoice_uuid", "category_confidence",
+    "is_recurring", "is_anomaly", "external_id", "created_at", "updated_at", "created_by",
+)
+# Lo que muestra la pantalla de lista
+DEFAULT_LIST_FIELDS = ("id", "name", "amount", "date", "category_id", "project_id")
+# `id` y `date` van siempre: el cursor de la página se arma con ellos
+REQUIRED_LIST_FIELDS = ("id", "date")
+
+# Relaciones que se embeben con `include=` (sin ocr_text ni ocr_data de los
+# recibos: esos se piden en GET /api/expenses/{id})
+EXPENSE_EMBEDS = {
+    "category": "category:categories(id, name, icon, color)",
+    "receipts": "receipts(id, image_url, thumbnail_url, created_at)",
+    "comments": "comments(id, user_id, text, created_at)",
+}
+
+# Detalle (GET y PUT /api/expenses/{id}): columnas explícitas, sin
+# search_vector (el tsvector con el texto del OCR de todos los recibos)
+EXPENSE_DETAIL_SELECT = ", ".join(EXPENSE_FIELDS) + (
+    ", receipts(*), comments(*, user:users(id, full_name, avatar_url))"
+)
+
+
+def _split_param(value: Optional[str]) -> List[str]:
+    """'name, amount,,date' -> ['name', 'amount', 'date']"""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def _list_select(fields: Optional[str], include: Optional[str]) -> str:
+    """
+    Proyección de PostgREST para la lista a partir de `fields=` e `include=`
+    (400 si piden una columna o relación que no existe)
+    """
+    requested = _split_param(fields) or list(DEFAULT_LIST_FIELDS)
+    unknown = [field for field in requested if field not in EXPENSE_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos no válidos: {', '.join(unknown)}. Disponibles: {', '.join(EXPENSE_FIELDS)}"
+        )
+
+    embeds = _split_param(include)
+    unknown = [embed for embed in embeds if embed not in EXPENSE_EMBEDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"include no válido: {', '.join(unknown)}. Disponibles: {', '.join(EXPENSE_EMBEDS)}"
+        )
+
+    columns = list(dict.fromkeys([*REQUIRED_LIST_FIELDS, *requested]))
+    return ", ".join(columns + [EXPENSE_EMBEDS[embed] for embed in dict.fromkeys(embeds)])
+
+
+def _expense_etag(expense: dict) -> str:
+    return make_etag("expense", expense["id"], expense["updated_at"])
+
+
+async def _resolve_category_name(db: AsyncClient, category_name: str) -> str:
+    """category_id de un nombre de categoría (400 si no existe)"""
+    category_id = await category_resolver.resolve(db, category_name, user_id=TEMP_USER_ID)
+    if category_id is None:
+        raise HTTPException(status_code=400, detail=f"Categoría no encontrada: {category_name}")
+    return category_id
+
+
 @router.post("/", response_model=dict, status_code=201)
 async def create_expense(
     expense: ExpenseCreate,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Crear un nuevo gasto
@@ -20,60 +102,295 @@ async def create_expense(
     try:
         # TODO: Obtener user_id del token JWT
         # Por ahora usamos un user_id temporal
-        temp_user_id = "00000000-0000-0000-0000-000000000000"
+        temp_user_id = TEMP_USER_ID
+
+        category_id = str(expense.category_id) if expense.category_id else None
+        if category_id is None and expense.category_name:
+            category_id = await _resolve_category_name(db, expense.category_name)
 
         # Preparar datos para insertar
         expense_data = {
             "user_id": temp_user_id,
             "project_id": str(expense.project_id),
-            "category_id": str(expense.category_id) if expense.category_id else None,
+            "category_id": category_id,
             "name": expense.name,
             "description": expense.description,
             "amount": str(expense.amount),
             "date": expense.date.isoformat(),
         }
 
-        # Insertar en Supabase
-        result = db.table("expenses").insert(expense_data).execute()
+        # Insertar el gasto y sus recibos en una sola transacción
+        created = await expense_service.create_with_receipts(
+            db,
+            expense_data,
+            [{"image_url": receipt_url} for receipt_url in expense.receipts or []]
+        )
 
-        if not result.data:
+        if not created:
             raise HTTPException(status_code=400, detail="Error al crear gasto")
 
-        expense_id = result.data[0]["id"]
-
-        # Agregar recibos si hay
-        if expense.receipts:
-            for receipt_url in expense.receipts:
-                receipt_data = {
-                    "expense_id": expense_id,
-                    "image_url": receipt_url
-                }
-                db.table("receipts").insert(receipt_data).execute()
-
         return {
             "success": True,
             "message": "Gasto creado exitosamente",
-            "expense_id": expense_id,
-            "data": result.data[0]
+            "expense_id": created["id"],
+            "data": created
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear gasto: {str(e)}")
 
+def _summary_filters(
+    project_id: UUID,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    timezone: str = DEFAULT_TIMEZONE
+) -> Dict:
+    """Proyecto y rango de fechas de los resúmenes (días locales, ambos incluidos)"""
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from debe ser anterior o igual a date_to")
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Zona horaria no válida: {timezone}")
+
+    # TODO: Validar que el usuario del token sea miembro del proyecto
+    return {"project_id": str(project_id), "date_from": date_from, "date_to": date_to, "timezone": timezone}
+
+
+@router.get("/summary", response_model=dict)
+async def get_summary(
+    filters: Dict = Depends(_summary_filters),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Resumen del dashboard: totales y gastos por categoría de un proyecto
+
+    - **project_id**: Proyecto
+    - **date_from** / **date_to**: Rango de fechas (AAAA-MM-DD, ambos
+      incluidos, opcionales)
+    - **timezone**: Zona horaria de las fechas (default America/Mexico_City)
+
+    Se calcula en la BD: la respuesta no crece con el número de gastos.
+    """
+    try:
+        totals, by_category = await asyncio.gather(
+            expense_summary.totals(db, **filters),
+            expense_summary.by_category(db, **filters)
+        )
+        return {
+            "success": True,
+            **filters,
+            "totals": totals,
+            "by_category": by_category
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular resumen: {str(e)}")
+
+
+@router.get("/summary/periods", response_model=dict)
+async def get_summary_by_period(
+    period: str = Query("month", pattern=f"^({'|'.join(PERIODS)})$"),
+    filters: Dict = Depends(_summary_filters),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Total de gastos por día, semana (desde el lunes) o mes
+
+    - **period**: day | week | month
+    - Mismos filtros que `/summary`. Solo aparecen los periodos con gastos
+    """
+    try:
+        periods = await expense_summary.by_period(db, period=period, **filters)
+        return {
+            "success": True,
+            **filters,
+            "period": period,
+            "data": periods
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular resumen por periodo: {str(e)}")
+
+
+@router.get("/summary/members", response_model=dict)
+async def get_summary_by_member(
+    filters: Dict = Depends(_summary_filters),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Total de gastos por miembro del proyecto (quién los registró)
+
+    Mismos filtros que `/summary`.
+    """
+    try:
+        members = await expense_summary.by_member(db, **filters)
+        return {
+            "success": True,
+            **filters,
+            "data": members
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular resumen por miembro: {str(e)}")
+
+
+@router.get("/search", response_model=dict)
+async def search_expenses(
+    q: str = Query(..., min_length=1, max_length=200),
+    project_id: UUID = Query(...),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Buscar gastos por texto, más relevantes primero
+
+    - **q**: texto libre sobre nombre, comercio, descripción, RFC y OCR de
+      los recibos ("farmacia", "\"farmacias guadalajara\" -oxxo"). Meses y
+      años ("farmacia enero", "renta 2024") filtran por fecha; fragmentos de
+      RFC ("CCO86") buscan dentro del RFC
+    - **offset**: siguiente página con `next_offset`
+    """
+    try:
+        # TODO: Validar que el usuario del token sea miembro del proyecto
+        result = await expense_search.search(db, q, project_id=str(project_id), limit=limit, offset=offset)
+        return {
+            "success": True,
+            **result,
+            "count": len(result["data"])
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar gastos: {str(e)}")
+
+
+@router.post("/import", response_model=dict)
+async def import_expenses(
+    file: UploadFile = File(...),
+    project_id: UUID = Form(...),
+    file_format: Optional[str] = Form(None, alias="format"),
+    chunk_size: Optional[int] = Form(None, ge=1, le=5000),
+    dry_run: bool = Form(False),
+    signed_amounts: bool = Form(False),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Importar gastos desde un archivo (CSV, XLSX u OFX de estado de cuenta)
+
+    - **file**: Archivo con encabezados (fecha, concepto, monto, categoría, referencia...)
+    - **project_id**: Proyecto al que se asignan todos los gastos
+    - **format**: csv | xlsx | ofx (default: según la extensión)
+    - **chunk_size**: Filas por upsert (default: EXPENSE_IMPORT_CHUNK_SIZE)
+    - **dry_run**: Solo validar y reportar errores, sin guardar
+    - **signed_amounts**: Estado de cuenta en CSV/XLSX con montos con signo:
+      los positivos (abonos) se omiten, como los depósitos en OFX
+
+    Las filas ya importadas a este proyecto (misma referencia o mismo
+    contenido) se cuentan en `duplicates` y no se vuelven a crear.
+    """
+    file_format = (file_format or detect_format(file.filename, file.content_type) or "").lower()
+    if file_format not in FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato no soportado. Usa {', '.join(FORMATS)} (campo format o extensión del archivo)"
+        )
+
+    # TODO: Obtener user_id del token JWT
+    result = await expense_importer.import_file(
+        db,
+        file.file,
+        file_format,
+        project_id=str(project_id),
+        user_id=TEMP_USER_ID,
+        chunk_size=chunk_size,
+        dry_run=dry_run,
+        signed_amounts=signed_amounts
+    )
+
+    if not result["success"] and not result["rows"]:
+        raise HTTPException(status_code=400, detail=result["error"])
+
+    return result
+
+@router.get("/categories", response_model=dict)
+async def get_categories(
+    refresh: bool = False,
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    Categorías disponibles (del sistema y del usuario), desde el cache
+
+    - **refresh**: Si es `true`, vuelve a leerlas de la BD
+    """
+    try:
+        if refresh:
+            category_resolver.invalidate()
+
+        categories = await category_resolver.list(db, user_id=TEMP_USER_ID)
+        return {
+            "success": True,
+            "count": len(categories),
+            "data": categories,
+            "cache": category_resolver.stats()
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener categorías: {str(e)}")
+
 @router.get("/", response_model=dict)
 async def get_expenses(
+    request: Request,
+    response: Response,
     project_id: Optional[UUID] = None,
     category_id: Optional[UUID] = None,
-    limit: int = 50,
-    offset: int = 0,
-    db: Client = Depends(get_db)
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Obtener lista de gastos con filtros opcionales
+
+    Por default solo trae lo que muestra la lista (id, name, amount, date,
+    category_id, project_id), sin recibos ni comentarios:
+
+    - **fields**: Columnas separadas por coma (`fields=name,amount,rfc`)
+    - **include**: Relaciones a embeber: `category`, `receipts`, `comments`
+      (`include=category,receipts`). El texto y datos OCR de los recibos
+      solo vienen en `GET /api/expenses/{id}`
+
+    Paginación por cursor, del más reciente al más antiguo:
+
+    - **limit**: Gastos por página (1-200)
+    - **cursor**: `next_cursor` de la página anterior (vacío = primera página).
+      Si es `null` en la respuesta, ya no hay más gastos
+
+    Responde con `ETag` (versión de los gastos del proyecto + parámetros de
+    la consulta): con `If-None-Match` y sin cambios, 304 sin cuerpo.
     """
     try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    select = _list_select(fields, include)
+
+    try:
+        # Versión de la lista antes que los datos: si alguien escribe entre
+        # las dos consultas, el ETag queda viejo y el siguiente GET revalida
+        version = (await db.rpc("expenses_list_version", {
+            "p_project_id": str(project_id) if project_id else None,
+            "p_category_id": str(category_id) if category_id else None,
+        }).execute()).data or {}
+        etag = make_etag("expenses", version.get("expenses"), version.get("categories"), request.url.query)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+
         # TODO: Filtrar por user_id del token
-        query = db.table("expenses").select("*, receipts(*), comments(*)")
+        query = db.table("expenses").select(select)
 
         # Aplicar filtros
         if project_id:
@@ -82,18 +399,24 @@ async def get_expenses(
         if category_id:
             query = query.eq("category_id", str(category_id))
 
-        # Ordenar por fecha descendente
-        query = query.order("date", desc=True)
+        # Keyset: continuar después de la última fila de la página anterior
+        if after:
+            # lte redundante: un OR no sirve de límite del índice, el lte sí
+            query = query.lte("date", after["date"]).or_(keyset_filter(after))
 
-        # Paginación
-        query = query.range(offset, offset + limit - 1)
+        # Orden estable (date DESC, id): usa idx_expenses_project_date_id
+        query = query.order("date", desc=True).order("id")
 
-        result = query.execute()
+        # Una fila de más para saber si hay otra página
+        result = await query.limit(limit + 1).execute()
+        result_page = page(result.data, limit)
+        set_etag(response, etag)
 
         return {
             "success": True,
-            "count": len(result.data),
-            "data": result.data
+            "count": len(result_page["data"]),
+            "data": result_page["data"],
+            "next_cursor": result_page["next_cursor"]
         }
 
     except Exception as e:
@@ -102,14 +425,33 @@ async def get_expenses(
 @router.get("/{expense_id}", response_model=dict)
 async def get_expense(
     expense_id: UUID,
-    db: Client = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Obtener un gasto por ID
+
+    Responde con `ETag` (de `updated_at`, que cambia también con recibos y
+    comentarios): con `If-None-Match` y sin cambios, 304 sin cuerpo.
     """
     try:
-        result = db.table("expenses")\
-            .select("*, receipts(*), comments(*, user:users(id, full_name, avatar_url))")\
+        # Con If-None-Match, comparar primero solo id + updated_at (sin
+        # recibos, OCR ni comentarios)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            current = await db.table("expenses")\
+                .select("id, updated_at")\
+                .eq("id", str(expense_id))\
+                .limit(1)\
+                .execute()
+            if current.data:
+                etag = _expense_etag(current.data[0])
+                if etag_matches(if_none_match, etag):
+                    return not_modified(etag)
+
+        result = await db.table("expenses")\
+            .select(EXPENSE_DETAIL_SELECT)\
             .eq("id", str(expense_id))\
             .single()\
             .execute()
@@ -117,6 +459,7 @@ async def get_expense(
         if not result.data:
             raise HTTPException(status_code=404, detail="Gasto no encontrado")
 
+        set_etag(response, _expense_etag(result.data))
         return {
             "success": True,
             "data": result.data
@@ -131,7 +474,7 @@ async def get_expense(
 async def update_expense(
     expense_id: UUID,
     expense: ExpenseUpdate,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Actualizar un gasto
@@ -150,14 +493,17 @@ async def update_expense(
             update_data["date"] = expense.date.isoformat()
         if expense.category_id is not None:
             update_data["category_id"] = str(expense.category_id)
+        elif expense.category_name:
+            update_data["category_id"] = await _resolve_category_name(db, expense.category_name)
 
         if not update_data:
             raise HTTPException(status_code=400, detail="No hay datos para actualizar")
 
         # Actualizar en Supabase
-        result = db.table("expenses")\
+        result = await db.table("expenses")\
             .update(update_data)\
             .eq("id", str(expense_id))\
+            .select(", ".join(EXPENSE_FIELDS))\
             .execute()
 
         if not result.data:
@@ -169,13 +515,15 @@ async def update_expense(
             "data": result.data[0]
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar gasto: {str(e)}")
 
 @router.delete("/{expense_id}", response_model=dict)
 async def delete_expense(
     expense_id: UUID,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Eliminar un gasto
@@ -183,7 +531,7 @@ async def delete_expense(
     try:
         # TODO: Validar que el usuario sea dueño del gasto
 
-        result = db.table("expenses")\
+        result = await db.table("expenses")\
             .delete()\
             .eq("id", str(expense_id))\
             .execute()
@@ -203,7 +551,7 @@ async def delete_expense(
 async def add_comment(
     expense_id: UUID,
     text: str,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Agregar un comentario a un gasto
@@ -218,7 +566,7 @@ async def add_comment(
             "text": text
         }
 
-        result = db.table("comments").insert(comment_data).execute()
+        result = await db.table("comments").insert(comment_data).execute()
 
         if not result.data:
             raise HTTPException(status_code=400, detail="Error al agregar comentario")
@@ -235,7 +583,7 @@ async def add_comment(
 @router.delete("/comments/{comment_id}", response_model=dict)
 async def delete_comment(
     comment_id: UUID,
-    db: Client = Depends(get_db)
+    db: AsyncClient = Depends(get_db)
 ):
     """
     Eliminar un comentario
@@ -243,7 +591,7 @@ async def delete_comment(
     try:
         # TODO: Validar que el usuario sea dueño del comentario
 
-        result = db.table("comments")\
+        result = await db.table("comments")\
             .delete()\
             .eq("id", str(comment_id))\
             .execute()
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Form
-from typing import Dict
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List
 from uuid import UUID
-from datetime import datetime
 from decimal import Decimal
-from app.services.ocr_service import ocr_service
+from app.services.ocr_cache import cached_ocr_service
+from app.services.image_preprocessor import image_preprocessor
+from app.services.merchant_catalog import merchant_catalog
 from app.utils.mexico_utils import (
     validate_rfc,
     calculate_iva,
@@ -11,14 +13,29 @@ from app.utils.mexico_utils import (
     suggest_category_from_merchant
 )
 from app.database import get_db
-from app.services.storage_service import storage_service
 from app.services.ocr_postprocessor import ocr_postprocessor
-from supabase import Client
+from app.services.receipt_pipeline import receipt_pipeline
+from app.services.job_queue import job_queue, JobQueueFullError
+from app.services.upload_intake import upload_intake, UploadTooLargeError, ReceivedUpload
+from app.config import settings
+from supabase import AsyncClient
+import asyncio
+import json
 import tempfile
+import time
 import os
 
 router = APIRouter()
 
+
+async def _receive_upload(file: UploadFile) -> ReceivedUpload:
+    """Lee el archivo subido con el límite de tamaño (413 si pasa)"""
+    try:
+        return await upload_intake.receive(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
 @router.post("/scan", response_model=Dict)
 async def scan_receipt(file: UploadFile = File(...)):
     """
@@ -36,14 +53,18 @@ async def scan_receipt(file: UploadFile = File(...)):
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="El archivo debe ser una imagen")
 
-    try:
-        # Leer bytes de la imagen
-        image_bytes = await file.read()
+    # Leer la imagen (en memoria si es chica, mapeada desde disco si no)
+    upload = await _receive_upload(file)
 
-        # Escanear con Document AI (pasando el mime_type correcto)
-        ocr_result = await ocr_service.scan_receipt_from_bytes(
-            image_bytes=image_bytes,
-            mime_type=file.content_type or "image/jpeg"
+    try:
+        # Preprocesar (enderezar, grises, reducir) antes de mandar a OCR
+        preprocessed = await image_preprocessor.process(upload.buffer, file.content_type or "image/jpeg")
+
+        # Escanear con Document AI (pasando el mime_type correcto).
+        # Si la misma imagen ya se escaneó, se usa el resultado cacheado
+        ocr_result = await cached_ocr_service.scan_receipt_from_bytes(
+            image_bytes=preprocessed["image_bytes"],
+            mime_type=preprocessed["mime_type"]
         )
 
         if not ocr_result.get("success"):
@@ -73,6 +94,8 @@ async def scan_receipt(file: UploadFile = File(...)):
                 "date": enhanced_data['date_confidence'],
                 "category": enhanced_data['category_confidence'],
             },
+            "cache_hit": ocr_result.get("cache_hit", False),
+            "preprocessing": preprocessed["stats"],
         }
 
         # Validar RFC si existe
@@ -122,6 +145,42 @@ async def scan_receipt(file: UploadFile = File(...)):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al procesar imagen: {str(e)}")
+    finally:
+        upload.close()
+
+@router.get("/cache/stats")
+async def ocr_cache_stats():
+    """
+    Contadores del cache de OCR (hits, misses, ocupación)
+    """
+    return cached_ocr_service.stats()
+
+@router.get("/uploads/stats")
+async def upload_stats():
+    """
+    Contadores de uploads recibidos (en memoria, en disco, rechazados)
+    """
+    return upload_intake.stats()
+
+@router.get("/merchants/stats")
+async def merchant_catalog_stats():
+    """
+    Estado del catálogo de comercios (tamaño, última carga, errores)
+    """
+    return merchant_catalog.stats()
+
+@router.post("/merchants/reload")
+async def reload_merchant_catalog():
+    """
+    Recarga el catálogo de comercios sin reiniciar
+
+    Si el archivo nuevo es inválido se conserva el catálogo anterior y el
+    error se reporta en `last_error`.
+    """
+    stats = await asyncio.to_thread(merchant_catalog.load)
+    if stats["last_error"]:
+        raise HTTPException(status_code=422, detail=f"Catálogo inválido: {stats['last_error']}")
+    return stats
 
 @router.post("/validate-rfc")
 async def validate_rfc_endpoint(rfc: str):
@@ -169,9 +228,11 @@ async def check_deductible(
 
 @router.post("/scan-and-create-expense", response_model=Dict)
 async def scan_and_create_expense(
+    request: Request,
     file: UploadFile = File(...),
     project_id: str = Form(...),
-    db: Client = Depends(get_db)
+    background: bool = Form(False),
+    db: AsyncClient = Depends(get_db)
 ):
     """
     **ENDPOINT PRINCIPAL: Escanear recibo y crear expense automáticamente**
@@ -186,193 +247,177 @@ async def scan_and_create_expense(
 
     - **file**: Imagen del recibo (JPEG, PNG)
     - **project_id**: UUID del proyecto donde crear el expense
+    - **background**: Si es `true`, responde `202` con un `job_id` en cuanto
+      recibe la imagen; el progreso y el expense se consultan en
+      `GET /api/ocr/jobs/{job_id}`
 
     Returns:
         - Expense creado con ID
         - Todos los datos extraídos del OCR
         - Validaciones y sugerencias
+        - `timings`: inicio y duración de cada etapa (la subida a Storage
+          corre a la par del OCR)
     """
     # Validar tipo de archivo
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="El archivo debe ser una imagen")
 
+    upload = await _receive_upload(file)
+    # En modo background el trabajo se queda con el upload y lo cierra al terminar
+    owns_upload = True
+
     try:
-        # PASO 1: Escanear recibo con Document AI
-        image_bytes = await file.read()
-        ocr_result = await ocr_service.scan_receipt_from_bytes(
-            image_bytes=image_bytes,
-            mime_type=file.content_type or "image/jpeg"
+        if background:
+            # Modo asíncrono: encolar y responder de inmediato
+            async def run_job(on_stage, **payload) -> Dict:
+                try:
+                    return await receipt_pipeline.scan_and_create_expense(on_stage=on_stage, **payload)
+                finally:
+                    upload.close()
+
+            try:
+                job = job_queue.submit(
+                    run_job,
+                    stages=receipt_pipeline.STAGES,
+                    db=db,
+                    image_bytes=upload.buffer,
+                    content_type=file.content_type,
+                    project_id=project_id
+                )
+            except JobQueueFullError as e:
+                raise HTTPException(status_code=503, detail=f"Cola de OCR llena, reintenta más tarde: {str(e)}")
+            owns_upload = False
+
+            status_url = str(request.url_for("get_ocr_job", job_id=job["id"]))
+            return JSONResponse(
+                status_code=202,
+                headers={"Location": status_url},
+                content={
+                    "success": True,
+                    "message": "Recibo recibido, procesando en segundo plano",
+                    "job_id": job["id"],
+                    "status": job["status"],
+                    "status_url": status_url,
+                }
+            )
+
+        result = await receipt_pipeline.scan_and_create_expense(
+            db=db,
+            image_bytes=upload.buffer,
+            content_type=file.content_type,
+            project_id=project_id
         )
 
-        if not ocr_result.get("success"):
-            raise HTTPException(status_code=400, detail=ocr_result.get("error"))
+        if not result.get("success"):
+            raise HTTPException(status_code=result.get("status_code", 500), detail=result.get("error"))
 
-        # PASO 2: Post-procesamiento INTELIGENTE (nivel enterprise)
-        enhanced_data = ocr_postprocessor.process(ocr_result, ocr_result["full_text"])
+        return result
 
-        # Usar datos mejorados en lugar de los originales
-        extracted = {
-            **ocr_result["extracted_data"],
-            'merchant_name': enhanced_data['merchant_name'],
-            'rfc': enhanced_data['rfc'],
-            'total_amount': enhanced_data['total_amount'],
-            'date': enhanced_data['date'],
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al procesar recibo y crear expense: {str(e)}")
+    finally:
+        if owns_upload:
+            upload.close()
 
-        # PASO 3: Post-procesamiento adicional con utilidades de México
-        # Validar RFC si existe
-        rfc_validation = {"valid": False, "error": "No se encontró RFC"}
-        if extracted.get("rfc"):
-            rfc_validation = validate_rfc(extracted["rfc"])
+@router.get("/jobs/{job_id}", response_model=Dict)
+async def get_ocr_job(job_id: str):
+    """
+    Estado de un escaneo en segundo plano
 
-        # Calcular/validar IVA
-        tax_breakdown = None
-        if extracted.get("total_amount"):
-            total = Decimal(str(extracted["total_amount"]))
-            if extracted.get("tax_amount"):
-                tax = Decimal(str(extracted["tax_amount"]))
-                subtotal = total - tax
-                tax_breakdown = {
-                    "subtotal": float(subtotal),
-                    "iva": float(tax),
-                    "total": float(total)
-                }
-            else:
-                from app.utils.mexico_utils import extract_iva_from_total
-                tax_breakdown = extract_iva_from_total(total)
+    - **status**: queued | running | completed | failed
+    - **stage** / **progress**: etapa actual del flujo y avance (0 a 1)
+    - **result**: respuesta completa de scan-and-create-expense al terminar
+    - **error**: motivo si falló
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+    return job
+
+@router.post("/scan-batch")
+async def scan_batch(
+    files: List[UploadFile] = File(...),
+    project_id: str = Form(...),
+    db: AsyncClient = Depends(get_db)
+):
+    """
+    **Escanear muchos recibos y crear un expense por cada uno**
 
-        # Sugerir categoría (usar el mejorado del post-processor)
-        suggested_category = enhanced_data['suggested_category']
-        category_confidence = enhanced_data['category_confidence']
+    Procesa los archivos concurrentemente (máximo `OCR_BATCH_CONCURRENCY` a la
+    vez) y responde en streaming NDJSON: una línea por archivo en cuanto
+    termina (en orden de terminación, no de envío) y una línea final de
+    resumen con `done: true`.
 
-        # Verificar deducibilidad
-        has_rfc = rfc_validation.get("valid", False)
-        deductible_info = is_deductible(
-            category=suggested_category,
-            has_rfc=has_rfc,
-            has_invoice=False,
-            merchant_type=extracted.get("merchant_name")
+    - **files**: Imágenes de los recibos (JPEG, PNG)
+    - **project_id**: UUID del proyecto donde crear los expenses
+    """
+    if len(files) > settings.ocr_batch_max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {settings.ocr_batch_max_files} archivos por lote"
         )
 
-        # PASO 3: Preparar datos para crear expense
-        # TODO: Obtener user_id del token JWT
-        temp_user_id = "00000000-0000-0000-0000-000000000000"
+    semaphore = asyncio.Semaphore(max(1, settings.ocr_batch_concurrency))
 
-        # Usar datos extraídos o valores por defecto
-        expense_name = extracted.get("merchant_name") or "Gasto sin nombre"
-        expense_amount = extracted.get("total_amount") if extracted.get("total_amount") else 0.01  # Mínimo 0.01
+    async def process_file(index: int, file: UploadFile) -> Dict:
+        line = {"index": index, "filename": file.filename}
 
-        # NUEVO: Mapear categoría sugerida a category_id en la BD
-        category_id = None
-        if suggested_category and suggested_category != "Sin categoría" and suggested_category != "Otros":
-            try:
-                # Buscar categoría en la BD por nombre
-                category_result = db.table("categories")\
-                    .select("id")\
-                    .eq("name", suggested_category)\
-                    .eq("is_system", True)\
-                    .limit(1)\
-                    .execute()
-
-                if category_result.data and len(category_result.data) > 0:
-                    category_id = category_result.data[0]["id"]
-            except Exception as e:
-                print(f"Error al buscar categoría: {e}")
-                # Si falla, dejamos category_id como None
+        if not (file.content_type or "").startswith('image/'):
+            return {**line, "success": False, "status_code": 400, "error": "El archivo debe ser una imagen"}
 
-        # Validar y limpiar fecha
-        expense_date = None
-        raw_date = extracted.get("date")
-        if raw_date:
+        async with semaphore:
             try:
-                # Intentar parsear la fecha para validar que sea válida
-                if isinstance(raw_date, str):
-                    # Verificar que sea un formato ISO válido o convertible
-                    parsed_date = datetime.fromisoformat(raw_date.replace('Z', '+00:00'))
-                    expense_date = parsed_date.isoformat()
-                else:
-                    expense_date = datetime.now().isoformat()
-            except (ValueError, AttributeError):
-                # Si la fecha es inválida, usar fecha actual
-                expense_date = datetime.now().isoformat()
-        else:
-            expense_date = datetime.now().isoformat()
-
-        # Preparar datos del expense
-        expense_data = {
-            "user_id": temp_user_id,
-            "project_id": project_id,
-            "category_id": category_id,  # Ya está mapeado arriba
-            "name": expense_name,
-            "description": f"Escaneado automáticamente - {extracted.get('merchant_address', '')}".strip(),
-            "amount": str(expense_amount),
-            "date": expense_date,
-            # Datos OCR adicionales
-            "merchant_name": extracted.get("merchant_name"),
-            "merchant_address": extracted.get("merchant_address"),
-            "tax_amount": str(extracted.get("tax_amount")) if extracted.get("tax_amount") else None,
-            "payment_method": extracted.get("payment_method"),
-            "rfc": extracted.get("rfc"),
-            "is_deductible": deductible_info.get("deductible", False),
-            "has_invoice": False,
-        }
-
-        # PASO 4: Subir imagen del recibo a Storage
-        file_extension = file.content_type.split('/')[-1] if file.content_type else 'jpg'
-        receipt_url = await storage_service.upload_receipt_image(
-            db=db,
-            image_bytes=image_bytes,
-            file_extension=file_extension
-        )
-
-        # PASO 5: Insertar expense en Supabase
-        result = db.table("expenses").insert(expense_data).execute()
-
-        if not result.data:
-            raise HTTPException(status_code=400, detail="Error al crear gasto desde OCR")
-
-        expense_id = result.data[0]["id"]
+                # La imagen se lee hasta tener turno para no cargar todo el lote en memoria
+                with await upload_intake.receive(file) as upload:
+                    result = await receipt_pipeline.scan_and_create_expense(
+                        db=db,
+                        image_bytes=upload.buffer,
+                        content_type=file.content_type,
+                        project_id=project_id
+                    )
+            except UploadTooLargeError as e:
+                result = {"success": False, "status_code": 413, "error": str(e)}
+            except Exception as e:
+                result = {"success": False, "status_code": 500, "error": f"Error al procesar recibo: {str(e)}"}
 
-        # PASO 6: Guardar imagen del recibo en tabla receipts
-        if receipt_url:
-            receipt_data = {
-                "expense_id": expense_id,
-                "image_url": receipt_url,
-                "ocr_text": ocr_result["full_text"],
-                "ocr_data": extracted  # Guardar datos estructurados como JSONB
-            }
-            db.table("receipts").insert(receipt_data).execute()
+        if not result.get("success"):
+            return {**line, "success": False, "status_code": result.get("status_code", 500), "error": result.get("error")}
 
-        # PASO 7: Retornar respuesta completa con datos mejorados
+        ocr_data = result["ocr_data"]
         return {
+            **line,
             "success": True,
-            "message": "Expense creado automáticamente desde recibo",
-            "expense_id": expense_id,
-            "expense": result.data[0],
-            "receipt_url": receipt_url,
-            "ocr_data": {
-                "extracted": extracted,
-                "full_text": ocr_result["full_text"],
-                "confidence": enhanced_data['overall_confidence'],  # Confidence mejorado
-                "rfc_validation": rfc_validation,
-                "tax_breakdown": tax_breakdown,
-                "suggested_category": suggested_category,
-                "category_confidence": category_confidence,
-                "deductible_info": deductible_info,
-                # Confidence scores detallados
-                "confidence_breakdown": {
-                    "merchant": enhanced_data['merchant_confidence'],
-                    "rfc": enhanced_data['rfc_confidence'],
-                    "amount": enhanced_data['amount_confidence'],
-                    "date": enhanced_data['date_confidence'],
-                    "category": enhanced_data['category_confidence'],
-                    "overall": enhanced_data['overall_confidence'],
-                },
-                "processing_method": enhanced_data['processing_method']
-            }
+            "expense_id": result["expense_id"],
+            "expense": result["expense"],
+            "receipt_url": result["receipt_url"],
+            "suggested_category": ocr_data["suggested_category"],
+            "confidence": ocr_data["confidence"],
+            "cache_hit": ocr_data.get("cache_hit", False),
         }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al procesar recibo y crear expense: {str(e)}")
+    async def stream_results():
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(process_file(i, f)) for i, f in enumerate(files)]
+        succeeded = 0
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                succeeded += 1 if line["success"] else 0
+                yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+            yield json.dumps({
+                "done": True,
+                "total": len(tasks),
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            }) + "\n"
+        finally:
+            # Si el cliente se desconecta, no seguir procesando el lote
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
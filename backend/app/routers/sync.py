@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from app.config import settings
+from app.database import get_admin_db
+from app.schemas.sync import SyncPushRequest
+from app.services.sync_service import InvalidSyncTokenError, sync_service
+from supabase import AsyncClient
+
+router = APIRouter()
+
+# TODO: Obtener user_id del token JWT
+TEMP_USER_ID = "00000000-0000-0000-0000-000000000000"
+
+
+@router.get("/", response_model=dict)
+async def pull_changes(
+    since: Optional[str] = None,
+    limit: int = Query(settings.sync_page_size, ge=1, le=settings.sync_page_size),
+    db: AsyncClient = Depends(get_admin_db)
+):
+    """
+    Cambios de gastos, recibos y comentarios desde `since`
+
+    - **since**: `next_token` de la respuesta anterior. Sin él solo se
+      devuelve el token actual: pedirlo *antes* de descargar todo con GET
+      /api/expenses, así lo que cambie durante la descarga llega en el
+      siguiente pull (si se pide después, eso se pierde)
+    - Los borrados llegan como `op: "delete"` sin `data`
+    - Con `has_more` hay que pedir otra vez con el nuevo token
+    - 410: el token es más viejo que el log conservado; volver a descargar todo
+    """
+    try:
+        result = await sync_service.pull(db, TEMP_USER_ID, since=since, limit=limit)
+
+        if result.get("resync_required"):
+            raise HTTPException(
+                status_code=410,
+                detail="El token es demasiado antiguo; vuelve a descargar los datos y empieza sin since"
+            )
+
+        return {
+            "success": True,
+            "data": result["changes"],
+            "count": len(result["changes"]),
+            "next_token": result["next_token"],
+            "has_more": result["has_more"]
+        }
+
+    except InvalidSyncTokenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener cambios: {str(e)}")
+
+@router.post("/", response_model=dict)
+async def push_operations(
+    request: SyncPushRequest,
+    db: AsyncClient = Depends(get_admin_db)
+):
+    """
+    Aplicar la cola de operaciones offline en un solo request
+
+    Se aplican en orden y cada una tiene su resultado (`applied`,
+    `duplicate`, `conflict`, `not_found`, `forbidden`, `invalid`, `error`):
+    una que falla no detiene a las demás. Con `base_updated_at`, un update o
+    delete sobre un registro que cambió en el servidor regresa `conflict` con
+    la versión actual en `data`.
+    """
+    if len(request.operations) > settings.sync_max_operations:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {settings.sync_max_operations} operaciones por request"
+        )
+
+    try:
+        results = await sync_service.push(db, TEMP_USER_ID, request.operations)
+
+        return {
+            "success": True,
+            "data": results,
+            "count": len(results)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al aplicar operaciones: {str(e)}")
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field, model_validator
+from datetime import date
+from typing import Literal, Optional
+from uuid import UUID
+from decimal import Decimal
+
+BudgetPeriod = Literal["daily", "weekly", "monthly", "yearly"]
+
+class BudgetBase(BaseModel):
+    amount: Decimal = Field(..., gt=0, decimal_places=2)
+    period: BudgetPeriod
+    start_date: date
+    end_date: Optional[date] = None
+    category_id: Optional[UUID] = None  # None = todas las categorías
+    project_id: Optional[UUID] = None  # None = gastos del usuario en todos sus proyectos
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.end_date and self.end_date < self.start_date:
+            raise ValueError("end_date debe ser posterior o igual a start_date")
+        return self
+
+class BudgetCreate(BudgetBase):
+    pass
+
+class BudgetUpdate(BaseModel):
+    amount: Optional[Decimal] = Field(None, gt=0, decimal_places=2)
+    period: Optional[BudgetPeriod] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    category_id: Optional[UUID] = None
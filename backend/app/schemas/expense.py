@@ -46,6 +46,7 @@ class ExpenseBase(BaseModel):
 
 class ExpenseCreate(ExpenseBase):
     receipts: Optional[List[str]] = []  # URLs de imágenes
+    category_name: Optional[str] = None  # Alternativa a category_id ("Comida")
     # Datos OCR opcionales
     merchant_name: Optional[str] = None
     merchant_address: Optional[str] = None
@@ -72,6 +73,7 @@ class ExpenseUpdate(BaseModel):
     amount: Optional[Decimal] = Field(None, gt=0)
     date: Optional[datetime] = None
     category_id: Optional[UUID] = None
+    category_name: Optional[str] = None  # Alternativa a category_id
 
 class ExpenseResponse(ExpenseBase):
     id: UUID
@@ -89,6 +91,9 @@ class ExpenseResponse(ExpenseBase):
     has_invoice: bool
     invoice_uuid: Optional[str]
 
+    # Importación (CSV, XLSX, OFX)
+    external_id: Optional[str] = None
+
     # ML predictions
     category_confidence: Optional[Decimal]
     is_recurring: bool
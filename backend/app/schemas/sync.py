@@ -0,0 +1,62 @@
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+from uuid import UUID
+from decimal import Decimal
+from app.schemas.expense import CommentBase, ExpenseBase
+
+SyncEntity = Literal["expense", "receipt", "comment"]
+SyncAction = Literal["create", "update", "delete"]
+
+class SyncOperation(BaseModel):
+    """Una operación de la cola offline del cliente"""
+    op_id: str = Field(..., min_length=1, max_length=100)  # Id del cliente, regresa en el resultado
+    entity: SyncEntity
+    action: SyncAction
+    id: UUID  # Lo genera el cliente al crear: reintentar no duplica
+    data: Dict[str, Any] = {}
+    base_updated_at: Optional[datetime] = None  # updated_at que vio el cliente (None = sin chequeo de conflicto)
+
+class SyncPushRequest(BaseModel):
+    operations: List[SyncOperation]
+
+# Lo que acepta `data` en cada operación (campos de más = operación inválida)
+
+class SyncExpenseCreate(ExpenseBase):
+    model_config = ConfigDict(extra="forbid")
+
+    merchant_name: Optional[str] = None
+    merchant_address: Optional[str] = None
+    tax_amount: Optional[Decimal] = None
+    payment_method: Optional[str] = None
+    rfc: Optional[str] = None
+
+class SyncExpenseUpdate(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    project_id: Optional[UUID] = None
+    name: Optional[str] = Field(None, min_length=1, max_length=255)
+    description: Optional[str] = None
+    amount: Optional[Decimal] = Field(None, gt=0, decimal_places=2)
+    date: Optional[datetime] = None
+    category_id: Optional[UUID] = None
+    merchant_name: Optional[str] = None
+    merchant_address: Optional[str] = None
+    tax_amount: Optional[Decimal] = None
+    payment_method: Optional[str] = None
+    rfc: Optional[str] = None
+
+class SyncCommentCreate(CommentBase):
+    model_config = ConfigDict(extra="forbid")
+
+    expense_id: UUID
+
+class SyncCommentUpdate(CommentBase):
+    model_config = ConfigDict(extra="forbid")
+
+class SyncReceiptCreate(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    expense_id: UUID
+    image_url: str  # Imagen ya subida a Storage
+    thumbnail_url: Optional[str] = None
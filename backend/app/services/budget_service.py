@@ -0,0 +1,75 @@
+"""
+Presupuestos: consumo del periodo actual y alertas de umbral
+
+El consumo de todos los presupuestos activos de un usuario o proyecto sale de
+una sola llamada a `budget_status` (database_schema.sql, sección
+PRESUPUESTOS): los de proyecto suman el rollup diario, así que no dependen
+del número de gastos.
+
+Las alertas (80% y 100%) no se calculan aquí al leer: las registra en
+`budget_alerts` el trigger de expenses en cada insert o update, solo para los
+presupuestos del proyecto y la categoría de los gastos escritos. Al crear o
+editar un presupuesto se evalúa solo ese.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional
+
+from supabase import AsyncClient
+
+
+class BudgetService:
+    """Consumo y alertas de presupuestos, calculados en la BD"""
+
+    async def status(self, db: AsyncClient, user_id: Optional[str] = None, project_id: Optional[str] = None,
+                     budget_ids: Optional[List[str]] = None, as_of: Optional[date] = None) -> List[Dict]:
+        """
+        Presupuestos activos al día `as_of` (default: hoy) con su periodo
+        actual, gastado, restante y porcentaje
+
+        Args:
+            user_id: Presupuestos del usuario
+            project_id: Presupuestos del proyecto
+            budget_ids: Solo estos presupuestos
+        """
+        result = await db.rpc("budget_status", {
+            "p_user_id": str(user_id) if user_id else None,
+            "p_project_id": str(project_id) if project_id else None,
+            "p_budget_ids": [str(budget_id) for budget_id in budget_ids] if budget_ids else None,
+            "p_as_of": as_of.isoformat() if as_of else None,
+        }).execute()
+        return result.data or []
+
+    async def evaluate_alerts(self, db: AsyncClient, budget_ids: List[str]) -> List[Dict]:
+        """
+        Registra los umbrales cruzados por estos presupuestos; devuelve solo
+        las alertas nuevas. `db` tiene que ser el cliente con service key
+        (get_admin_db): budget_evaluate_alerts no se expone a anon ni
+        authenticated
+        """
+        result = await db.rpc("budget_evaluate_alerts", {
+            "p_budget_ids": [str(budget_id) for budget_id in budget_ids],
+        }).execute()
+        return result.data or []
+
+    async def alerts(self, db: AsyncClient, user_id: Optional[str] = None, project_id: Optional[str] = None,
+                     include_acknowledged: bool = False, limit: int = 50) -> List[Dict]:
+        """Alertas más recientes primero, con los datos de su presupuesto"""
+        query = db.table("budget_alerts")\
+            .select("*, budget:budgets!inner(id, user_id, project_id, category_id, period, amount)")\
+            .order("created_at", desc=True)\
+            .limit(limit)
+
+        if user_id:
+            query = query.eq("budget.user_id", str(user_id))
+        if project_id:
+            query = query.eq("budget.project_id", str(project_id))
+        if not include_acknowledged:
+            query = query.is_("acknowledged_at", "null")
+
+        result = await query.execute()
+        return result.data or []
+
+
+# Singleton
+budget_service = BudgetService()
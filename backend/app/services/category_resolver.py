@@ -0,0 +1,154 @@
+"""
+Resolución de categorías nombre -> id con cache en memoria
+
+Cada recibo escaneado buscaba su categoría sugerida en la tabla `categories`
+(un round trip a Supabase por scan) aunque las categorías del sistema casi
+nunca cambian. CategoryResolver carga de una vez las del sistema y, por
+usuario, las personalizadas (`categories.user_id`), y las sirve desde
+memoria. La comparación de nombres ignora mayúsculas y acentos
+("Educacion" = "Educación").
+
+Invalidación:
+- TTL (CATEGORY_CACHE_TTL_SECONDS): cambios hechos directo en la BD se ven
+  a más tardar al vencer el TTL
+- Versión: `invalidate()` sube la versión y todas las entradas cargadas con
+  una versión anterior se vuelven a leer en el siguiente uso
+"""
+
+import asyncio
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+from supabase import AsyncClient
+
+from app.config import settings
+
+CATEGORY_FIELDS = "id, name, icon, color, user_id, is_system"
+
+
+def normalize_category_name(name: str) -> str:
+    """'Educación ' -> 'educacion'"""
+    decomposed = unicodedata.normalize("NFKD", name.strip().casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class _Entry:
+    """Categorías de un alcance (sistema o un usuario) con su versión y hora de carga"""
+
+    __slots__ = ("categories", "by_name", "ids", "loaded_at", "version")
+
+    def __init__(self, categories: List[Dict], version: int):
+        self.categories = categories
+        self.by_name = {normalize_category_name(c["name"]): c["id"] for c in categories}
+        self.ids = {c["id"] for c in categories}
+        self.loaded_at = time.monotonic()
+        self.version = version
+
+
+class CategoryResolver:
+    """Cache de categorías del sistema y por usuario"""
+
+    SYSTEM = "system"
+
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = asyncio.Lock()
+
+        self.hits = 0
+        self.loads = 0
+
+    async def resolve(self, db: AsyncClient, name: Optional[str], user_id: Optional[str] = None) -> Optional[str]:
+        """
+        category_id para un nombre de categoría
+
+        Las categorías del usuario tienen prioridad sobre las del sistema con
+        el mismo nombre.
+
+        Returns:
+            id o None si no existe (sin consultar la BD mientras el cache
+            esté vigente)
+        """
+        if not name:
+            return None
+
+        key = normalize_category_name(name)
+        if user_id:
+            category_id = (await self._entry(db, user_id)).by_name.get(key)
+            if category_id:
+                return category_id
+        return (await self._entry(db, self.SYSTEM)).by_name.get(key)
+
+    async def exists(self, db: AsyncClient, category_id: str, user_id: Optional[str] = None) -> bool:
+        """Si el id es una categoría del sistema o del usuario"""
+        category_id = str(category_id)
+        if category_id in (await self._entry(db, self.SYSTEM)).ids:
+            return True
+        return bool(user_id) and category_id in (await self._entry(db, user_id)).ids
+
+    async def list(self, db: AsyncClient, user_id: Optional[str] = None) -> List[Dict]:
+        """Categorías del sistema seguidas de las del usuario"""
+        categories = list((await self._entry(db, self.SYSTEM)).categories)
+        if user_id:
+            categories += (await self._entry(db, user_id)).categories
+        return categories
+
+    def invalidate(self, user_id: Optional[str] = None) -> int:
+        """
+        Marca como vencidas las categorías de un usuario (o todas si no se
+        indica usuario)
+
+        Returns:
+            Versión nueva del cache
+        """
+        if user_id:
+            self._entries.pop(user_id, None)
+        else:
+            self.version += 1
+        return self.version
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "ttl_seconds": self.ttl_seconds,
+            "scopes": len(self._entries),
+            "hits": self.hits,
+            "loads": self.loads,
+        }
+
+    async def _entry(self, db: AsyncClient, scope: str) -> _Entry:
+        entry = self._entries.get(scope)
+        if entry is not None and self._fresh(entry):
+            self.hits += 1
+            return entry
+
+        # Una sola carga a la vez: si llegan varios scans con el cache
+        # vencido, solo el primero consulta la BD
+        async with self._lock:
+            entry = self._entries.get(scope)
+            if entry is not None and self._fresh(entry):
+                self.hits += 1
+                return entry
+
+            entry = _Entry(await self._load(db, scope), self.version)
+            self._entries[scope] = entry
+            self.loads += 1
+            return entry
+
+    def _fresh(self, entry: _Entry) -> bool:
+        return entry.version == self.version and time.monotonic() - entry.loaded_at < self.ttl_seconds
+
+    async def _load(self, db: AsyncClient, scope: str) -> List[Dict]:
+        query = db.table("categories").select(CATEGORY_FIELDS)
+        if scope == self.SYSTEM:
+            query = query.eq("is_system", True)
+        else:
+            query = query.eq("user_id", scope)
+        return (await query.order("name").execute()).data or []
+
+
+# Singleton
+category_resolver = CategoryResolver(ttl_seconds=settings.category_cache_ttl_seconds)
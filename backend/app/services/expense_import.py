@@ -0,0 +1,528 @@
+"""
+Importación masiva de gastos desde archivos (CSV, XLSX, OFX)
+
+Para migrar años de gastos de hojas de cálculo o estados de cuenta sin pasar
+por `POST /api/expenses` fila por fila:
+
+- Lee el archivo como stream (CSV por renglones, XLSX en modo read-only de
+  openpyxl, OFX por bloques <STMTTRN>): la memoria depende del tamaño del
+  lote, no del número de filas (solo se guarda un hash corto por fila sin id)
+- Valida cada fila contra `ExpenseCreate` y junta los errores por fila
+- Escribe por lotes con upsert sobre (user_id, project_id, external_id):
+  volver a importar el mismo archivo al mismo proyecto no duplica gastos
+
+`external_id` es la clave de deduplicación: la columna de id del archivo si
+existe (referencia, folio, FITID en OFX) o, si no, un hash de fecha, monto,
+nombre y descripción más el número de repetición dentro del archivo (dos
+cafés iguales el mismo día siguen siendo dos gastos).
+
+Igual que los demás servicios, no lanza HTTPException: retorna un dict con
+`success` y, si el archivo no se puede leer, `error`.
+"""
+
+import asyncio
+import csv
+import hashlib
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import openpyxl
+from postgrest.types import CountMethod, ReturnMethod
+from pydantic import ValidationError
+from supabase import AsyncClient
+
+from app.config import settings
+from app.schemas.expense import ExpenseCreate
+from app.services.category_resolver import category_resolver, normalize_category_name
+from app.services.expense_summary import DEFAULT_TIMEZONE
+
+FORMATS = ("csv", "xlsx", "ofx")
+
+# Encabezados aceptados por campo (se comparan sin mayúsculas ni acentos)
+COLUMN_ALIASES = {
+    "external_id": ("external_id", "id", "referencia", "folio", "fitid", "numero de referencia"),
+    "name": ("name", "nombre", "concepto", "gasto"),
+    "description": ("description", "descripcion", "detalle", "notas", "memo"),
+    "amount": ("amount", "monto", "importe", "cargo", "total", "retiro"),
+    "date": ("date", "fecha", "fecha de operacion", "fecha operacion"),
+    "category_id": ("category_id",),
+    "category_name": ("category", "category_name", "categoria"),
+    "merchant_name": ("merchant_name", "comercio", "establecimiento"),
+    "payment_method": ("payment_method", "metodo de pago", "forma de pago"),
+    "rfc": ("rfc",),
+    "tax_amount": ("tax_amount", "iva"),
+}
+_HEADER_FIELDS = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+DATE_FORMATS = (
+    "%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d-%m-%Y", "%d/%m/%y",
+    "%d.%m.%Y", "%Y/%m/%d",
+)
+
+# DD/MM/AAAA sin hora (el formato más común en exportaciones de bancos
+# mexicanos): se arma el datetime directo, strptime es varias veces más lento
+_DMY_DATE = re.compile(r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})")
+_OFX_BLOCK = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.IGNORECASE | re.DOTALL)
+_OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+_OFX_READ_BYTES = 64 * 1024
+
+# Fechas sin zona (casi todas las de bancos): hora local, la misma zona del
+# rollup diario. Como UTC, un gasto del día 1 a medianoche caería en el mes
+# anterior en resúmenes y presupuestos
+LOCAL_TIMEZONE = ZoneInfo(DEFAULT_TIMEZONE)
+# "123,45" / "1,5": coma decimal aunque el archivo no sea separado por `;`
+_COMMA_DECIMAL = re.compile(r"-?\d+,\d{1,2}")
+# "1.234" en un archivo con coma decimal: punto de miles
+_THOUSANDS_DOT = re.compile(r"-?\d{1,3}\.\d{3}")
+
+
+class ImportRowError(ValueError):
+    """Fila que no se puede importar (se reporta y se sigue con la siguiente)"""
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """'gastos.xlsx' -> 'xlsx' (None si no es un formato soportado)"""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in FORMATS:
+        return extension
+    if extension == "qfx":
+        return "ofx"
+    if content_type == "text/csv":
+        return "csv"
+    return None
+
+
+def parse_amount(value, decimal_comma: bool = False) -> Decimal:
+    """
+    '$1,234.50' / '-1234.5' / '(1,234.50)' -> Decimal('1234.50')
+
+    El gasto es el valor absoluto (ver `parse_signed_amount`).
+    """
+    return abs(parse_signed_amount(value, decimal_comma))
+
+
+def parse_signed_amount(value, decimal_comma: bool = False) -> Decimal:
+    """
+    '$1,234.50' -> Decimal('1234.50'); '-1234.5' / '(1,234.50)' -> negativo
+    '1.234,50' / '123,45' -> coma decimal
+
+    Con los dos separadores, el último es el decimal. Con solo una coma
+    seguida de 1 o 2 dígitos, es decimal; si no, la coma es de miles. Con
+    `decimal_comma` (CSV separado por `;`) una coma sola es decimal y el
+    punto es de miles ("1.234" = 1234). Un monto que no se puede leer sin
+    adivinar ("1.234" sin esa pista, "1,23,4") o con más de dos decimales
+    ("12,3456", "1,234" con coma decimal) es error de la fila, no un monto
+    1000 veces mayor o menor ni uno redondeado.
+    """
+    if isinstance(value, (int, float, Decimal)):
+        amount = Decimal(str(value))
+    else:
+        text = str(value or "").strip().replace("$", "").replace(" ", "")
+        # Formato contable: (1,234.50) es negativo
+        if text.startswith("(") and text.endswith(")"):
+            text = "-" + text[1:-1]
+
+        if "," in text and "." in text:
+            decimal = "," if text.rfind(",") > text.rfind(".") else "."
+        elif text.count(",") == 1 and (decimal_comma or _COMMA_DECIMAL.fullmatch(text)):
+            decimal = ","
+        elif text.count(".") == 1 and not (decimal_comma and _THOUSANDS_DOT.fullmatch(text)):
+            decimal = "."
+        else:
+            # Solo separadores de miles ("1,234", "1.234.567")
+            decimal = "," if "." in text else "."
+        thousands = "." if decimal == "," else ","
+        integer, has_fraction, fraction = text.partition(decimal)
+        groups = integer.split(thousands)
+        if thousands in fraction or any(len(group) != 3 for group in groups[1:]):
+            raise ImportRowError(f"Monto ambiguo: {value!r}")
+        if decimal == "." and len(groups) == 1 and len(fraction) == 3 and not decimal_comma:
+            raise ImportRowError(f"Monto ambiguo: {value!r} (¿separador de miles o decimal?)")
+        if len(fraction) > 2:
+            raise ImportRowError(f"Monto con más de dos decimales: {value!r}")
+
+        try:
+            amount = Decimal("".join(groups) + (f".{fraction}" if has_fraction else ""))
+        except InvalidOperation:
+            raise ImportRowError(f"Monto inválido: {value!r}")
+    return amount.quantize(Decimal("0.01"))
+
+
+def parse_date(value) -> datetime:
+    """
+    ISO, DD/MM/AAAA (y variantes) o un datetime de Excel
+
+    Devuelve la fecha como viene: sin zona si el archivo no la trae (ver
+    `localize`).
+    """
+    if isinstance(value, datetime):
+        return value
+    text = str(value or "").strip()
+    match = _DMY_DATE.fullmatch(text)
+    if match:
+        day, month, year = map(int, match.groups())
+        try:
+            return datetime(year, month, day)
+        except ValueError:
+            raise ImportRowError(f"Fecha inválida: {value!r}")
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise ImportRowError(f"Fecha inválida: {value!r}")
+
+
+def localize(value: datetime) -> datetime:
+    """Fecha sin zona -> hora local (LOCAL_TIMEZONE); con zona, igual"""
+    return value.replace(tzinfo=LOCAL_TIMEZONE) if value.tzinfo is None else value
+
+
+def _open_text(file: IO[bytes]) -> io.TextIOWrapper:
+    """Texto de un archivo binario: UTF-8 (con o sin BOM) o, si no, Windows-1252"""
+    sample = file.read(64 * 1024)
+    file.seek(0)
+    try:
+        sample.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Un caracter multibyte cortado al final de la muestra sigue siendo UTF-8
+        encoding = "utf-8-sig" if e.start >= len(sample) - 3 else "cp1252"
+    return io.TextIOWrapper(file, encoding=encoding, newline="")
+
+
+def _map_header(header) -> List[Optional[str]]:
+    return [_HEADER_FIELDS.get(normalize_category_name(str(column or ""))) for column in header]
+
+
+def iter_csv_rows(file: IO[bytes]) -> Iterator[Tuple[int, Dict]]:
+    """(número de renglón, campos) por cada fila del CSV (`,`, `;` o tab)"""
+    text = _open_text(file)
+    sample = text.read(64 * 1024)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    # Separado por `;` = exportación con coma decimal ("1.234,50")
+    decimal_comma = dialect.delimiter == ";"
+
+    try:
+        reader = csv.reader(text, dialect)
+        fields = _map_header(next(reader, []))
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            values = {
+                field: cell.strip() for field, cell in zip(fields, row) if field and cell.strip()
+            }
+            if decimal_comma:
+                values["_decimal_comma"] = True
+            yield reader.line_num, values
+    finally:
+        # El archivo es de quien lo abrió: no cerrarlo junto con el wrapper
+        text.detach()
+
+
+def iter_xlsx_rows(file: IO[bytes]) -> Iterator[Tuple[int, Dict]]:
+    """Filas de la primera hoja (read-only: openpyxl no carga el libro completo)"""
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        fields = _map_header(next(rows, ()))
+        for row_number, row in enumerate(rows, start=2):
+            values = {
+                field: value.strip() if isinstance(value, str) else value
+                for field, value in zip(fields, row)
+                if field and value is not None and value != ""
+            }
+            if values:
+                yield row_number, values
+    finally:
+        workbook.close()
+
+
+def iter_ofx_rows(file: IO[bytes]) -> Iterator[Tuple[int, Dict]]:
+    """
+    Transacciones de un estado de cuenta OFX/QFX (SGML 1.x o XML 2.x)
+
+    El número de fila es el de la transacción en el archivo. Los depósitos
+    (monto positivo) no son gastos: se reportan con `_skip` para contarlos
+    sin importarlos.
+    """
+    text = _open_text(file)
+    try:
+        yield from _ofx_transactions(text)
+    finally:
+        text.detach()
+
+
+def _ofx_transactions(text: io.TextIOWrapper) -> Iterator[Tuple[int, Dict]]:
+    buffer = ""
+    number = 0
+    while True:
+        chunk = text.read(_OFX_READ_BYTES)
+        buffer += chunk
+        last_end = 0
+        for match in _OFX_BLOCK.finditer(buffer):
+            last_end = match.end()
+            number += 1
+            tags = {tag.upper(): value.strip() for tag, value in _OFX_FIELD.findall(match.group(1))}
+            amount = tags.get("TRNAMT", "")
+            row = {
+                "external_id": tags.get("FITID"),
+                "name": tags.get("NAME") or tags.get("MEMO") or tags.get("PAYEE"),
+                "description": tags.get("MEMO"),
+                "amount": amount,
+                # 20250115120000[-6:CST] -> 2025-01-15
+                "date": f"{tags.get('DTPOSTED', '')[:8]}",
+            }
+            if amount and not amount.startswith("-"):
+                row["_skip"] = "Depósito (no es gasto)"
+            yield number, {field: value for field, value in row.items() if value}
+        buffer = buffer[last_end:]
+        if not chunk:
+            break
+
+
+def _is_credit(values: Dict) -> bool:
+    """
+    Monto positivo en un estado de cuenta con signo (CSV/XLSX): es un abono.
+    Un monto ilegible no es abono; el error lo reporta la fila
+    """
+    try:
+        return "amount" in values and parse_signed_amount(values["amount"], bool(values.get("_decimal_comma"))) > 0
+    except ImportRowError:
+        return False
+
+
+PARSERS: Dict[str, Callable[[IO[bytes]], Iterator[Tuple[int, Dict]]]] = {
+    "csv": iter_csv_rows,
+    "xlsx": iter_xlsx_rows,
+    "ofx": iter_ofx_rows,
+}
+
+
+def _take(rows: Iterator[Tuple[int, Dict]], size: int) -> List[Tuple[int, Dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            break
+    return chunk
+
+
+class ExpenseImporter:
+    """Importa gastos por lotes con upsert sobre (user_id, project_id, external_id)"""
+
+    def __init__(self, chunk_size: int = 500, max_errors: int = 1000):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+
+    async def import_file(
+        self,
+        db: AsyncClient,
+        file: IO[bytes],
+        file_format: str,
+        project_id: str,
+        user_id: str,
+        chunk_size: Optional[int] = None,
+        dry_run: bool = False,
+        signed_amounts: bool = False,
+        on_chunk: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """
+        Importa los gastos de un archivo
+
+        Args:
+            db: Cliente async de Supabase
+            file: Archivo binario abierto (se lee una sola vez, en orden)
+            file_format: csv | xlsx | ofx
+            project_id: Proyecto al que se asignan todos los gastos
+            user_id: Dueño de los gastos (y de sus categorías)
+            chunk_size: Filas por upsert (default: EXPENSE_IMPORT_CHUNK_SIZE)
+            dry_run: Solo validar, sin escribir
+            signed_amounts: Montos con signo (estado de cuenta en CSV o
+                XLSX): los negativos son cargos y los positivos, abonos que
+                se omiten, igual que los depósitos en OFX. Sin él se ignora
+                el signo: en una hoja de gastos todas las filas son gastos,
+                aunque algunas vengan en negativo
+            on_chunk: Se llama con el reporte parcial después de cada lote
+
+        Returns:
+            Reporte con filas leídas, importadas, duplicadas, omitidas y
+            errores por fila (`row` = renglón del archivo)
+        """
+        if file_format not in PARSERS:
+            return {"success": False, "error": f"Formato no soportado: {file_format}. Usa {', '.join(FORMATS)}"}
+
+        chunk_size = chunk_size or self.chunk_size
+        report = {
+            "success": True,
+            "format": file_format,
+            "dry_run": dry_run,
+            "rows": 0,
+            "imported": 0,
+            "duplicates": 0,
+            "skipped": 0,
+            "failed": 0,
+            "errors": [],
+            "errors_truncated": 0,
+        }
+        occurrences: Dict[str, int] = {}
+
+        try:
+            rows = PARSERS[file_format](file)
+            while True:
+                # Parsear en un hilo: un lote de XLSX u OFX no bloquea el event loop
+                chunk = await asyncio.to_thread(_take, rows, chunk_size)
+                if not chunk:
+                    break
+
+                valid: List[Tuple[int, Dict]] = []
+                for row_number, values in chunk:
+                    report["rows"] += 1
+                    if values.get("_skip") or (signed_amounts and _is_credit(values)):
+                        report["skipped"] += 1
+                        continue
+                    try:
+                        valid.append((row_number, await self._build_row(
+                            db, values, project_id, user_id, occurrences
+                        )))
+                    except (ImportRowError, ValidationError) as e:
+                        self._add_error(report, row_number, e)
+
+                if valid and not dry_run:
+                    await self._write_chunk(db, valid, report)
+                elif valid:
+                    report["imported"] += len(valid)
+
+                if on_chunk:
+                    on_chunk(report)
+
+        except Exception as e:
+            # Archivo ilegible (XLSX corrupto, CSV binario...): reportar lo que se alcanzó a importar
+            report["success"] = False
+            report["error"] = f"Error al importar: {str(e)}"
+
+        return report
+
+    async def _build_row(
+        self,
+        db: AsyncClient,
+        values: Dict,
+        project_id: str,
+        user_id: str,
+        occurrences: Dict[str, int]
+    ) -> Dict:
+        """Fila del archivo -> fila de expenses, validada con ExpenseCreate"""
+        if "amount" not in values:
+            raise ImportRowError("Falta el monto")
+        if "date" not in values:
+            raise ImportRowError("Falta la fecha")
+
+        name = values.get("name") or values.get("merchant_name") or values.get("description")
+        decimal_comma = bool(values.get("_decimal_comma"))
+        expense = ExpenseCreate(
+            name=str(name or "")[:255],
+            description=values.get("description"),
+            amount=parse_amount(values["amount"], decimal_comma),
+            date=parse_date(values["date"]),
+            project_id=project_id,
+            category_id=values.get("category_id"),
+            category_name=values.get("category_name"),
+            merchant_name=values.get("merchant_name"),
+            payment_method=values.get("payment_method"),
+            rfc=values.get("rfc"),
+            tax_amount=parse_amount(values["tax_amount"], decimal_comma) if values.get("tax_amount") else None,
+        )
+
+        # Categoría: un id que no existe haría fallar el lote completo por la FK
+        category_id = str(expense.category_id) if expense.category_id else None
+        if category_id and not await category_resolver.exists(db, category_id, user_id):
+            raise ImportRowError(f"Categoría no encontrada: {category_id}")
+        if category_id is None and expense.category_name:
+            category_id = await category_resolver.resolve(db, expense.category_name, user_id)
+            if category_id is None:
+                raise ImportRowError(f"Categoría no encontrada: {expense.category_name}")
+
+        # Todas las filas llevan las mismas columnas (el upsert por lote usa
+        # las de la primera); las que no vienen en el archivo van en NULL
+        row = {
+            "user_id": user_id,
+            "project_id": str(expense.project_id),
+            "category_id": category_id,
+            "name": expense.name,
+            "description": expense.description,
+            "amount": str(expense.amount),
+            "date": localize(expense.date).isoformat(),
+            "merchant_name": expense.merchant_name,
+            "payment_method": expense.payment_method,
+            "rfc": expense.rfc.upper() if expense.rfc else None,
+            "tax_amount": str(expense.tax_amount) if expense.tax_amount is not None else None,
+            "external_id": str(values["external_id"]) if values.get("external_id") else None,
+        }
+        if row["external_id"] is None:
+            # La fecha de la clave es la del archivo (sin zona si no la trae),
+            # así la clave no cambia respecto a importaciones anteriores
+            row["external_id"] = self._row_key({**row, "date": expense.date.isoformat()}, occurrences)
+        return row
+
+    @staticmethod
+    def _row_key(row: Dict, occurrences: Dict[str, int]) -> str:
+        """Clave para filas sin id: hash del contenido + número de repetición"""
+        content = "|".join(str(row[field] or "") for field in ("date", "amount", "name", "description"))
+        digest = hashlib.blake2b(content.encode(), digest_size=12).hexdigest()
+        occurrences[digest] = occurrences.get(digest, 0) + 1
+        return f"import:{digest}:{occurrences[digest]}"
+
+    async def _write_chunk(self, db: AsyncClient, valid: List[Tuple[int, Dict]], report: Dict) -> None:
+        rows = [row for _, row in valid]
+        try:
+            # ON CONFLICT DO NOTHING: `count` son las filas nuevas; el resto ya existía
+            result = await db.table("expenses")\
+                .upsert(
+                    rows,
+                    on_conflict="user_id,project_id,external_id",
+                    ignore_duplicates=True,
+                    returning=ReturnMethod.minimal,
+                    count=CountMethod.exact
+                )\
+                .execute()
+            inserted = result.count if result.count is not None else len(rows)
+            report["imported"] += inserted
+            report["duplicates"] += len(rows) - inserted
+        except Exception as e:
+            # Falla el lote completo (p. ej. project_id inexistente): se reporta en su primer renglón
+            report["failed"] += len(rows)
+            self._add_error(report, valid[0][0], f"Lote de {len(rows)} filas (renglones {valid[0][0]}-{valid[-1][0]}): {str(e)}", count=False)
+
+    def _add_error(self, report: Dict, row_number: int, error, count: bool = True) -> None:
+        if count:
+            report["failed"] += 1
+        if isinstance(error, ValidationError):
+            error = "; ".join(
+                f"{'.'.join(str(part) for part in item['loc']) or 'fila'}: {item['msg']}"
+                for item in error.errors()
+            )
+        # Con límite: un archivo con 100k filas malas no debe llenar la memoria
+        if len(report["errors"]) < self.max_errors:
+            report["errors"].append({"row": row_number, "error": str(error)})
+        else:
+            report["errors_truncated"] += 1
+
+
+# Singleton
+expense_importer = ExpenseImporter(
+    chunk_size=settings.expense_import_chunk_size,
+    max_errors=settings.expense_import_max_errors
+)
@@ -0,0 +1,111 @@
+"""
+Búsqueda de gastos por texto (GET /api/expenses/search)
+
+La búsqueda corre en la BD con `expense_search` (database_schema.sql,
+sección BÚSQUEDA): tsvector en español sin acentos sobre nombre, comercio,
+RFC, descripción y OCR de los recibos (índice GIN), y trigramas para
+fragmentos de RFC. Aquí solo se interpreta lo que escribe el usuario:
+
+- Meses ("farmacia enero", "renta marzo 2024") y años sueltos ("2024") se
+  vuelven un rango de fechas, no texto: casi nunca aparecen en el gasto.
+  Un mes sin año es el más reciente: en marzo, "enero" es el de este año y
+  "noviembre" el del año pasado
+- Un token con forma de pedazo de RFC ("CCO86", "860523", "8605231N4") es
+  un fragmento de RFC
+- El resto va como texto con la sintaxis de websearch ("frase", -excluir, or)
+"""
+
+import re
+from datetime import date, datetime
+from typing import Dict
+from zoneinfo import ZoneInfo
+
+from supabase import AsyncClient
+
+MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+DEFAULT_TIMEZONE = "America/Mexico_City"
+
+_YEAR = re.compile(r"^(19|20)\d{2}$")
+# RFC: 3-4 letras, fecha AAMMDD y homoclave. Fragmento = inicio con al
+# menos 2 dígitos de la fecha, o la fecha completa con o sin homoclave (así
+# "500mg" o "1500" siguen siendo texto)
+_RFC_FRAGMENT = re.compile(r"^([A-ZÑ&]{3,4}\d{2,6}[A-Z\d]{0,3}|\d{6}[A-Z\d]{0,3})$")
+_TOKENS = re.compile(r'-?"[^"]*"?|\S+')
+
+
+def _month_range(month: int, year: int) -> Dict:
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return {"date_from": date(year, month, 1), "date_to": date.fromordinal(next_month.toordinal() - 1)}
+
+
+def parse_search_query(query: str, today: date) -> Dict:
+    """
+    Separa la búsqueda en texto, fragmento de RFC y rango de fechas
+
+    Returns:
+        {"text": str | None, "rfc": str | None, "date_from": date | None, "date_to": date | None}
+    """
+    tokens = _TOKENS.findall(query.strip())
+    words, rfc, month, year = [], None, None, None
+
+    for index, token in enumerate(tokens):
+        plain = token.lower()
+        if plain in MONTHS and month is None:
+            month = MONTHS[plain]
+        elif _YEAR.match(token) and year is None:
+            year = int(token)
+        elif plain == "de" and month and index + 1 < len(tokens) and _YEAR.match(tokens[index + 1]):
+            continue  # "enero de 2024"
+        elif rfc is None and _RFC_FRAGMENT.match(token.upper()):
+            rfc = token.upper()
+        else:
+            words.append(token)
+
+    parsed = {"text": " ".join(words) or None, "rfc": rfc, "date_from": None, "date_to": None}
+    if month:
+        if year is None:
+            year = today.year if month <= today.month else today.year - 1
+        parsed.update(_month_range(month, year))
+    elif year:
+        parsed.update({"date_from": date(year, 1, 1), "date_to": date(year, 12, 31)})
+    return parsed
+
+
+class ExpenseSearchService:
+    """Búsqueda rankeada y paginada de gastos"""
+
+    async def search(self, db: AsyncClient, query: str, project_id: str, limit: int = 20, offset: int = 0,
+                     timezone: str = DEFAULT_TIMEZONE) -> Dict:
+        """
+        Gastos que coinciden con `query`, más relevantes primero (después
+        los más recientes)
+
+        Returns:
+            {"data": gastos con `rank`, "next_offset": int | None, "query": búsqueda interpretada}
+        """
+        parsed = parse_search_query(query, today=datetime.now(ZoneInfo(timezone)).date())
+
+        result = await db.rpc("expense_search", {
+            "p_query": parsed["text"],
+            "p_project_id": str(project_id),
+            "p_rfc": parsed["rfc"],
+            "p_from": parsed["date_from"].isoformat() if parsed["date_from"] else None,
+            "p_to": parsed["date_to"].isoformat() if parsed["date_to"] else None,
+            "p_timezone": timezone,
+            "p_limit": limit + 1,
+            "p_offset": offset,
+        }).execute()
+        rows = result.data or []
+
+        return {
+            "data": rows[:limit],
+            "next_offset": offset + limit if len(rows) > limit else None,
+            "query": parsed,
+        }
+
+
+# Singleton
+expense_search = ExpenseSearchService()
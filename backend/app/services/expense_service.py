@@ -0,0 +1,55 @@
+"""
+Escrituras de expenses que tocan más de una tabla
+
+`create_with_receipts` llama a la función `create_expense_with_receipts`
+(database_schema.sql): el expense y todos sus recibos se insertan en un solo
+round trip y una sola transacción. Antes eran 1 + N inserts desde el
+backend, y si fallaba uno de los recibos el expense quedaba a medias.
+"""
+
+from typing import Dict, List, Optional
+
+from supabase import AsyncClient
+
+
+class ExpenseService:
+    """Creación atómica de expenses con sus recibos"""
+
+    # Columnas de receipts que acepta la función
+    RECEIPT_FIELDS = ("image_url", "thumbnail_url", "ocr_text", "ocr_data")
+
+    async def create_with_receipts(
+        self,
+        db: AsyncClient,
+        expense_data: Dict,
+        receipts: Optional[List[Dict]] = None
+    ) -> Dict:
+        """
+        Crea un expense y sus recibos en una transacción
+
+        Args:
+            db: Cliente async de Supabase
+            expense_data: Columnas del expense (como en un insert)
+            receipts: Recibos a ligar (`image_url` requerido)
+
+        Returns:
+            Expense creado, con sus recibos en `receipts`
+
+        Raises:
+            postgrest.APIError: Si la función falla (no se guarda nada)
+        """
+        receipts_data = [
+            {field: receipt[field] for field in self.RECEIPT_FIELDS if receipt.get(field) is not None}
+            for receipt in receipts or []
+        ]
+
+        result = await db.rpc("create_expense_with_receipts", {
+            "p_expense": expense_data,
+            "p_receipts": receipts_data,
+        }).execute()
+
+        return result.data
+
+
+# Singleton
+expense_service = ExpenseService()
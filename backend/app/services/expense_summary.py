@@ -0,0 +1,74 @@
+"""
+Resúmenes de gastos para el dashboard (Balance Card, Resumen por Categoría)
+
+Antes la app pedía páginas completas de `GET /api/expenses` y sumaba en el
+teléfono: lento con miles de gastos e incompleto si no bajaba todas las
+páginas. Ahora los totales se calculan en la BD con las funciones
+`expense_summary_*` (database_schema.sql, sección RESÚMENES) y solo viajan
+los resultados agrupados. En la zona horaria default leen el rollup diario
+`expense_daily_totals`, así que su costo depende de los días del rango y no
+del número de gastos.
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from supabase import AsyncClient
+
+PERIODS = ("day", "week", "month")
+DEFAULT_TIMEZONE = "America/Mexico_City"
+
+
+class ExpenseSummaryService:
+    """Totales por proyecto y rango de fechas, agrupados en la BD"""
+
+    async def totals(self, db: AsyncClient, project_id: str, date_from: Optional[date] = None,
+                     date_to: Optional[date] = None, timezone: str = DEFAULT_TIMEZONE) -> Dict:
+        """Conteo, total, promedio, IVA y total deducible del rango"""
+        result = await db.rpc("expense_summary_totals", self._params(project_id, date_from, date_to, timezone)).execute()
+        return result.data
+
+    async def by_category(self, db: AsyncClient, project_id: str, date_from: Optional[date] = None,
+                          date_to: Optional[date] = None, timezone: str = DEFAULT_TIMEZONE) -> List[Dict]:
+        """
+        Total por categoría, de mayor a menor, con su porcentaje del total
+        (`category_id` None = gastos sin categoría)
+        """
+        result = await db.rpc("expense_summary_by_category", self._params(project_id, date_from, date_to, timezone)).execute()
+        rows = result.data or []
+
+        grand_total = sum(Decimal(str(row["total"])) for row in rows)
+        for row in rows:
+            row["percentage"] = float(round(Decimal(str(row["total"])) * 100 / grand_total, 2)) if grand_total else 0.0
+        return rows
+
+    async def by_period(self, db: AsyncClient, project_id: str, period: str = "month",
+                        date_from: Optional[date] = None, date_to: Optional[date] = None,
+                        timezone: str = DEFAULT_TIMEZONE) -> List[Dict]:
+        """Total por día, semana (desde el lunes) o mes; solo periodos con gastos"""
+        if period not in PERIODS:
+            raise ValueError(f"Periodo no válido: {period}. Usa {', '.join(PERIODS)}")
+
+        params = {**self._params(project_id, date_from, date_to, timezone), "p_period": period}
+        result = await db.rpc("expense_summary_by_period", params).execute()
+        return result.data or []
+
+    async def by_member(self, db: AsyncClient, project_id: str, date_from: Optional[date] = None,
+                        date_to: Optional[date] = None, timezone: str = DEFAULT_TIMEZONE) -> List[Dict]:
+        """Total por miembro del proyecto (quién registró el gasto)"""
+        result = await db.rpc("expense_summary_by_member", self._params(project_id, date_from, date_to, timezone)).execute()
+        return result.data or []
+
+    @staticmethod
+    def _params(project_id: str, date_from: Optional[date], date_to: Optional[date], timezone: str) -> Dict:
+        return {
+            "p_project_id": str(project_id),
+            "p_from": date_from.isoformat() if date_from else None,
+            "p_to": date_to.isoformat() if date_to else None,
+            "p_timezone": timezone,
+        }
+
+
+# Singleton
+expense_summary = ExpenseSummaryService()
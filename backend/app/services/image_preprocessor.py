@@ -0,0 +1,125 @@
+"""
+Preprocesamiento de imágenes de recibos antes de OCR y Storage
+
+Las fotos del teléfono llegan de 4-8 MB (12 MP). Para leer un ticket no hace
+falta tanta resolución ni color, así que antes de mandarlas a Document AI y a
+Supabase Storage:
+1. Se endereza según EXIF (la foto llega "acostada" si no)
+2. Se pasa a escala de grises
+3. Se reduce a una resolución adecuada para OCR
+4. Se re-codifica como JPEG
+"""
+
+import asyncio
+import io
+import time
+from typing import Dict
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.config import settings
+from app.services.upload_intake import ImageBuffer, open_buffer
+
+
+class ImagePreprocessor:
+    """Reduce el peso de las fotos de recibos sin perder legibilidad"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_dimension: int = 2000,
+        grayscale: bool = True,
+        jpeg_quality: int = 85
+    ):
+        self.enabled = enabled
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+        self.jpeg_quality = jpeg_quality
+
+    async def process(self, image_bytes: ImageBuffer, mime_type: str) -> Dict:
+        """
+        Preprocesa una imagen (el trabajo de CPU corre fuera del event loop)
+
+        Returns:
+            Dict con `image_bytes`, `mime_type` y `stats` (bytes ahorrados,
+            tiempo de CPU agregado, dimensiones)
+        """
+        if not self.enabled or not (mime_type or "").startswith("image/"):
+            return self._unchanged(image_bytes, mime_type, "deshabilitado" if not self.enabled else "no es imagen")
+
+        return await asyncio.to_thread(self._process_sync, image_bytes, mime_type)
+
+    def _process_sync(self, image_bytes: ImageBuffer, mime_type: str) -> Dict:
+        cpu_start = time.thread_time()
+
+        try:
+            # Leer directo del buffer del upload (bytes o mmap), sin copiarlo
+            with open_buffer(image_bytes) as source:
+                image = Image.open(source)
+                original_size = image.size
+
+                # En JPEG, decodificar directo a escala reducida (mucho más rápido
+                # que decodificar 12 MP y después reducir)
+                image.draft("L" if self.grayscale else "RGB", (self.max_dimension, self.max_dimension))
+
+                image = ImageOps.exif_transpose(image)
+
+                if self.grayscale:
+                    image = image.convert("L")
+                elif image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+
+                image.thumbnail((self.max_dimension, self.max_dimension), Image.Resampling.LANCZOS)
+
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            processed = output.getvalue()
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+            # Formato que Pillow no puede leer: mandar la imagen original
+            return self._unchanged(image_bytes, mime_type, f"no se pudo procesar: {str(e)}")
+
+        cpu_ms = (time.thread_time() - cpu_start) * 1000
+
+        # Si ya venía más ligera que el resultado, conservar la original
+        if len(processed) >= len(image_bytes):
+            result = self._unchanged(image_bytes, mime_type, "la original ya es más ligera")
+            result["stats"]["cpu_ms"] = round(cpu_ms, 2)
+            return result
+
+        return {
+            "image_bytes": processed,
+            "mime_type": "image/jpeg",
+            "stats": {
+                "applied": True,
+                "original_bytes": len(image_bytes),
+                "processed_bytes": len(processed),
+                "bytes_saved": len(image_bytes) - len(processed),
+                "cpu_ms": round(cpu_ms, 2),
+                "original_size": list(original_size),
+                "processed_size": list(image.size),
+            }
+        }
+
+    @staticmethod
+    def _unchanged(image_bytes: ImageBuffer, mime_type: str, reason: str) -> Dict:
+        return {
+            "image_bytes": image_bytes,
+            "mime_type": mime_type,
+            "stats": {
+                "applied": False,
+                "reason": reason,
+                "original_bytes": len(image_bytes),
+                "processed_bytes": len(image_bytes),
+                "bytes_saved": 0,
+                "cpu_ms": 0.0,
+            }
+        }
+
+
+# Singleton
+image_preprocessor = ImagePreprocessor(
+    enabled=settings.image_preprocess_enabled,
+    max_dimension=settings.image_max_dimension,
+    grayscale=settings.image_grayscale,
+    jpeg_quality=settings.image_jpeg_quality
+)
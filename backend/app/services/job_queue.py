@@ -0,0 +1,155 @@
+"""
+Cola de trabajos en proceso para flujos largos (OCR + creación de expense)
+
+El endpoint responde `202 Accepted` con un job id en cuanto recibe el upload,
+y un pool de workers (tareas asyncio en el mismo proceso) corre el flujo.
+El estado se consulta con `GET /api/ocr/jobs/{id}`.
+
+Los trabajos viven en memoria del worker de uvicorn: si el proceso se
+reinicia, los pendientes se pierden y el cliente debe reintentar.
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+
+
+class JobQueueFullError(Exception):
+    """La cola llegó a su límite de trabajos pendientes"""
+
+
+class JobQueue:
+    """Cola asyncio con un pool fijo de workers y registro de estado por trabajo"""
+
+    def __init__(self, workers: int, max_pending: int, retention_seconds: int):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+
+        self._jobs: Dict[str, Dict] = {}
+        self._handlers: Dict[str, Callable[..., Awaitable[Dict]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def submit(self, handler: Callable[..., Awaitable[Dict]], stages: List[str], **payload) -> Dict:
+        """
+        Encola un trabajo
+
+        Args:
+            handler: Corrutina `handler(on_stage=..., **payload)` que retorna
+                un dict con `success` (mismo contrato que los servicios)
+            stages: Etapas que reportará el handler (para calcular progreso)
+            **payload: Argumentos para el handler
+
+        Returns:
+            Registro público del trabajo
+
+        Raises:
+            JobQueueFullError: Si ya hay `max_pending` trabajos en espera
+        """
+        self._ensure_workers()
+        self._prune()
+
+        job_id = str(uuid.uuid4())
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "stages": stages,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            raise JobQueueFullError(f"Hay {self.max_pending} trabajos pendientes")
+
+        self._jobs[job_id] = job
+        self._handlers[job_id] = lambda on_stage: handler(on_stage=on_stage, **payload)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Estado público de un trabajo (None si no existe o ya expiró)"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != "stages"}
+
+    def stats(self) -> Dict:
+        counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job["status"]] += 1
+        return {"workers": self.workers, "max_pending": self.max_pending, **counts}
+
+    def _ensure_workers(self) -> None:
+        # Los workers se arrancan en el primer submit (ya dentro del event loop)
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker_tasks = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = self._jobs.get(job_id)
+        handler = self._handlers.pop(job_id, None)
+        if job is None or handler is None:
+            return
+
+        stages = job["stages"]
+
+        def on_stage(stage: str) -> None:
+            job["stage"] = stage
+            if stage in stages:
+                job["progress"] = round(stages.index(stage) / len(stages), 2)
+
+        job["status"] = "running"
+        job["started_at"] = time.time()
+
+        try:
+            result = await handler(on_stage)
+        except Exception as e:
+            result = {"success": False, "error": f"Error inesperado: {str(e)}"}
+
+        job["finished_at"] = time.time()
+        if result.get("success"):
+            job["status"] = "completed"
+            job["progress"] = 1.0
+            job["result"] = result
+        else:
+            job["status"] = "failed"
+            job["error"] = result.get("error")
+
+    def _prune(self) -> None:
+        """Olvida los trabajos terminados hace más de `retention_seconds`"""
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Singleton
+job_queue = JobQueue(
+    workers=settings.ocr_job_workers,
+    max_pending=settings.ocr_job_max_pending,
+    retention_seconds=settings.ocr_job_retention_seconds
+)
@@ -0,0 +1,266 @@
+"""
+Base de conocimiento de comercios y categorías
+
+Un solo catálogo (app/data/merchants.json, o MERCHANT_CATALOG_PATH) para el
+post-procesador, OCRService y mexico_utils. Se carga una vez al arrancar y se
+compila en expresiones regulares factorizadas como trie (búsqueda exacta) y
+en un índice de trigramas (búsqueda aproximada), así que las búsquedas
+cuestan O(texto) sin importar si hay 40 o 5,000 comercios.
+
+Recarga en caliente: si el archivo cambia (mtime), la siguiente búsqueda
+después de MERCHANT_CATALOG_RELOAD_SECONDS lo vuelve a compilar en segundo
+plano; también se puede forzar con POST /api/ocr/merchants/reload. El índice
+nuevo se construye aparte y se reemplaza de un jalón, así que las búsquedas en
+curso nunca ven un catálogo a medias. Si el archivo nuevo es inválido se
+conserva el anterior.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.keyword_matcher import KeywordMatcher
+from app.utils.trigram_index import TrigramIndex
+
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().parent.parent / "data" / "merchants.json"
+
+
+class MerchantIndex:
+    """
+    Catálogo compilado (inmutable)
+
+    El valor de cada palabra clave en los buscadores es el índice de su
+    entrada, así que el menor índice encontrado respeta el orden del archivo
+    (los primeros comercios tienen prioridad).
+    """
+
+    def __init__(self, merchants: List[Dict], category_keywords: Dict[str, List[str]], version=None):
+        self.version = version
+        self.merchants = merchants
+        self.categories = list(category_keywords)
+
+        # Palabras clave de cada comercio, buscadas en el texto del recibo
+        self.merchant_keywords = KeywordMatcher(
+            (keyword.upper(), index)
+            for index, merchant in enumerate(merchants)
+            for keyword in merchant["keywords"]
+        )
+        # Nombres canónicos y alias ("GUADALAJARA" por "FARMACIA GUADALAJARA"),
+        # buscados en el nombre de comercio ya extraído
+        self.merchant_names = KeywordMatcher(
+            (name.upper(), index)
+            for index, merchant in enumerate(merchants)
+            for name in [merchant["name"], *merchant["aliases"]]
+        )
+        # Nombres y palabras clave normalizados, para textos con errores de OCR
+        self.fuzzy_names = TrigramIndex(
+            (name, index)
+            for index, merchant in enumerate(merchants)
+            for name in [merchant["name"], *merchant["keywords"]]
+        )
+        # Palabras que sugieren una categoría sin identificar al comercio
+        self.category_keywords = KeywordMatcher(
+            (keyword.upper(), index)
+            for index, keywords in enumerate(category_keywords.values())
+            for keyword in keywords
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MerchantIndex":
+        """Valida y compila el contenido del archivo"""
+        merchants = []
+        for position, merchant in enumerate(data.get("merchants", [])):
+            name = (merchant.get("name") or "").strip()
+            category = (merchant.get("category") or "").strip()
+            if not name or not category:
+                raise ValueError(f"Comercio #{position} sin name o category")
+
+            merchants.append({
+                "name": name,
+                "category": category,
+                "confidence": float(merchant.get("confidence", 0.9)),
+                "keywords": [keyword for keyword in merchant.get("keywords") or [name.lower()] if keyword],
+                "aliases": [alias for alias in merchant.get("aliases") or [] if alias],
+            })
+
+        category_keywords = data.get("category_keywords", {})
+        if not isinstance(category_keywords, dict):
+            raise ValueError("category_keywords debe ser un objeto {categoría: [palabras]}")
+
+        return cls(merchants, category_keywords, version=data.get("version"))
+
+
+class MerchantCatalog:
+    """Catálogo con recarga en caliente"""
+
+    def __init__(self, path: str, reload_seconds: float = 30):
+        self.path = Path(path)
+        self.reload_seconds = reload_seconds
+
+        self._index: Optional[MerchantIndex] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+        self.loaded_at: Optional[float] = None
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    # ========================================
+    # CARGA
+    # ========================================
+    def load(self) -> Dict:
+        """
+        (Re)compila el catálogo desde el archivo
+
+        Raises:
+            ValueError/OSError si el archivo no se puede leer y no hay un
+            catálogo anterior que conservar
+        """
+        with self._lock:
+            mtime = None
+            try:
+                mtime = os.stat(self.path).st_mtime
+                with open(self.path, encoding="utf-8") as f:
+                    index = MerchantIndex.from_dict(json.load(f))
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+                if self._index is None:
+                    raise
+                # No reintentar la misma versión inválida en cada revisión
+                self._mtime = mtime
+                print(f"Error al recargar catálogo de comercios, se conserva el anterior: {e}")
+                return self.stats()
+
+            if self._index is not None:
+                self.reloads += 1
+            self._index = index
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+            self.loaded_at = time.time()
+            self.last_error = None
+
+        return self.stats()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Recarga si el archivo cambió (revisa como mucho cada `reload_seconds`)
+
+        Compilar un catálogo grande tarda (~1 s con 10k comercios), así que la
+        recarga corre en un hilo aparte y mientras tanto se sigue usando el
+        índice anterior.
+        """
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.reload_seconds:
+            return False
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+
+        if self._index is not None and mtime == self._mtime:
+            return False
+
+        if self._index is None:
+            self.load()
+        elif not self._lock.locked():
+            threading.Thread(target=self.load, name="merchant-catalog-reload", daemon=True).start()
+        return True
+
+    @property
+    def index(self) -> MerchantIndex:
+        """Índice vigente (carga o recarga si hace falta)"""
+        self.reload_if_changed()
+        return self._index
+
+    # ========================================
+    # BÚSQUEDAS
+    # ========================================
+    def match_text(self, text_upper: str) -> Optional[Dict]:
+        """Comercio cuyas palabras clave aparecen en el texto del recibo"""
+        index = self.index
+        position = index.merchant_keywords.min_value(text_upper)
+        return index.merchants[position] if position is not None else None
+
+    def match_merchant_name(self, merchant_name: str) -> Optional[Dict]:
+        """
+        Comercio a partir de un nombre ya extraído ("OXXO", "Walmart Express")
+
+        Solo por nombre canónico o alias: las palabras clave son para el texto
+        del recibo y algunas son muy cortas ("comer" está en "Comercializadora").
+        """
+        if not merchant_name:
+            return None
+
+        index = self.index
+        position = index.merchant_names.min_value(merchant_name.upper())
+        return index.merchants[position] if position is not None else None
+
+    def fuzzy_match(self, candidates: Iterable[Optional[str]], threshold: float) -> Optional[Tuple[Dict, float]]:
+        """
+        Comercio más parecido a alguno de los textos (renglones del
+        encabezado, merchant de Document AI), tolerando errores de OCR
+
+        Returns:
+            (comercio, similitud 0-1) o None si nada pasa el umbral
+        """
+        index = self.index
+        best = None
+        for text in candidates:
+            if not text:
+                continue
+            found = index.fuzzy_names.best_match(text, threshold)
+            # Mayor similitud; en empate, el primero del catálogo
+            if found and (best is None or (-found[1], found[0]) < (-best[1], best[0])):
+                best = found
+
+        if best is None:
+            return None
+        position, similarity = best
+        return index.merchants[position], similarity
+
+    def category_from_keywords(self, text_upper: str) -> Optional[str]:
+        """Categoría sugerida por palabras genéricas (farmacia, gasolina...)"""
+        index = self.index
+        position = index.category_keywords.min_value(text_upper)
+        return index.categories[position] if position is not None else None
+
+    def category_for_merchant(self, merchant_name: str) -> Optional[str]:
+        """Categoría de un nombre de comercio (None si no se reconoce)"""
+        merchant = self.match_merchant_name(merchant_name)
+        if merchant:
+            return merchant["category"]
+        return self.category_from_keywords(merchant_name.upper()) if merchant_name else None
+
+    def stats(self) -> Dict:
+        index = self._index
+        return {
+            "path": str(self.path),
+            "version": index.version if index else None,
+            "merchants": len(index.merchants) if index else 0,
+            "keywords": index.merchant_keywords.size if index else 0,
+            "fuzzy_names": len(index.fuzzy_names) if index else 0,
+            "categories": len(index.categories) if index else 0,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
+
+
+def _build_merchant_catalog() -> MerchantCatalog:
+    catalog = MerchantCatalog(
+        path=settings.merchant_catalog_path or str(DEFAULT_CATALOG_PATH),
+        reload_seconds=settings.merchant_catalog_reload_seconds
+    )
+    catalog.load()
+    return catalog
+
+
+# Singleton
+merchant_catalog = _build_merchant_catalog()
@@ -0,0 +1,239 @@
+"""
+Backends de OCR intercambiables para OCRService
+
+- DocumentAIBackend: llama a Google Document AI (producción)
+- RecordingBackend: envuelve a otro backend y guarda cada `documentai.Document`
+  en disco, con el SHA-256 de la imagen como nombre
+- ReplayBackend: sirve documentos grabados con latencia sintética, sin red ni
+  cuota de Document AI (para benchmarks y profiling)
+
+Los backends son síncronos (como el cliente de Document AI): OCRService los
+corre en su pool de hilos con el límite de concurrencia.
+
+Se elige con OCR_BACKEND = documentai | record | replay.
+"""
+
+from abc import ABC, abstractmethod
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from google.api_core.client_options import ClientOptions
+from google.cloud import documentai_v1 as documentai
+
+from app.config import settings
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """Llave de las grabaciones: SHA-256 de los bytes de la imagen"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class OCRBackend(ABC):
+    """Interfaz: convierte una imagen en un `documentai.Document`"""
+
+    name = "base"
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Identifica qué respuestas da el backend (entra en la llave del cache
+        de OCR): dos backends que pueden responder distinto a la misma
+        imagen no comparten resultados cacheados
+        """
+        return self.name
+
+    @abstractmethod
+    def process_document(self, image_bytes: bytes, mime_type: str) -> documentai.Document:
+        ...
+
+
+class DocumentAIBackend(OCRBackend):
+    """Google Document AI Receipt Parser"""
+
+    name = "documentai"
+
+    def __init__(self):
+        # Configurar la variable de entorno para las credenciales
+        if settings.google_application_credentials:
+            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = settings.google_application_credentials
+
+        # El cliente se crea en el primer uso
+        self._client = None
+        self._client_lock = threading.Lock()
+
+        # Configurar el processor
+        self.processor_name = documentai.DocumentProcessorServiceClient.processor_path(
+            settings.google_project_id,
+            settings.document_ai_location,
+            settings.document_ai_processor_id
+        )
+
+    @property
+    def client(self) -> documentai.DocumentProcessorServiceClient:
+        """Cliente de Document AI (se crea al primer uso)"""
+        with self._client_lock:
+            if self._client is None:
+                opts = ClientOptions(api_endpoint=f"{settings.document_ai_location}-documentai.googleapis.com")
+                self._client = documentai.DocumentProcessorServiceClient(client_options=opts)
+        return self._client
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.name}:{settings.document_ai_processor_id}"
+
+    def process_document(self, image_bytes: bytes, mime_type: str) -> documentai.Document:
+        # Crear documento para procesar
+        # El request de protobuf necesita `bytes` (un upload grande llega como mmap)
+        raw_document = documentai.RawDocument(
+            content=image_bytes if isinstance(image_bytes, bytes) else bytes(image_bytes),
+            mime_type=mime_type
+        )
+
+        # Configurar request
+        request = documentai.ProcessRequest(
+            name=self.processor_name,
+            raw_document=raw_document
+        )
+
+        return self.client.process_document(request=request).document
+
+
+class RecordingBackend(OCRBackend):
+    """Pasa cada imagen a otro backend y graba la respuesta en `directory`"""
+
+    name = "record"
+
+    def __init__(self, inner: OCRBackend, directory: str):
+        self.inner = inner
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def cache_key(self) -> str:
+        # Con un hit del cache no se llamaría al backend y no se grabaría nada
+        return f"{self.name}:{self.inner.cache_key}"
+
+    def process_document(self, image_bytes: bytes, mime_type: str) -> documentai.Document:
+        document = self.inner.process_document(image_bytes, mime_type)
+
+        path = self.directory / f"{image_hash(image_bytes)}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(documentai.Document.to_json(document), encoding="utf-8")
+        tmp_path.replace(path)
+
+        return document
+
+
+class ReplayBackend(OCRBackend):
+    """
+    Sirve documentos grabados por RecordingBackend
+
+    Args:
+        directory: Directorio con `<sha256>.json` (None = solo `documents`)
+        latency_ms: Latencia sintética por llamada (bloquea el hilo, igual
+            que el cliente real)
+        jitter_ms: Variación aleatoria +/- sobre la latencia
+        strict: Si es False, una imagen sin grabación recibe una grabación
+            elegida de forma determinista por su hash (útil para cargar con
+            imágenes arbitrarias); si es True, falla
+        documents: Grabaciones en memoria adicionales {hash: Document}
+    """
+
+    name = "replay"
+
+    # Documentos parseados que se mantienen en memoria
+    MAX_PARSED = 256
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        strict: bool = False,
+        documents: Optional[Dict[str, documentai.Document]] = None
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.strict = strict
+
+        self._paths: Dict[str, Path] = {}
+        if directory:
+            self._paths = {path.stem: path for path in sorted(Path(directory).glob("*.json"))}
+
+        self._documents = dict(documents or {})
+        self._keys: List[str] = sorted(set(self._paths) | set(self._documents))
+        self._parsed: "OrderedDict[str, documentai.Document]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def cache_key(self) -> str:
+        # El juego de grabaciones: sin `strict`, una imagen desconocida recibe
+        # una grabación según cuántas haya
+        fixtures = hashlib.sha256("\n".join(self._keys).encode()).hexdigest()[:16]
+        return f"{self.name}:{fixtures}:{'strict' if self.strict else 'any'}"
+
+    def process_document(self, image_bytes: bytes, mime_type: str) -> documentai.Document:
+        key = image_hash(image_bytes)
+
+        if key not in self._documents and key not in self._paths:
+            if self.strict or not self._keys:
+                raise LookupError(f"No hay grabación para la imagen {key[:12]}")
+            key = self._keys[int(key, 16) % len(self._keys)]
+
+        document = self._load(key)
+
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+        return document
+
+    def _load(self, key: str) -> documentai.Document:
+        if key in self._documents:
+            return self._documents[key]
+
+        with self._lock:
+            document = self._parsed.get(key)
+            if document is not None:
+                self._parsed.move_to_end(key)
+                return document
+
+        document = documentai.Document.from_json(
+            self._paths[key].read_text(encoding="utf-8"),
+            ignore_unknown_fields=True
+        )
+
+        with self._lock:
+            self._parsed[key] = document
+            if len(self._parsed) > self.MAX_PARSED:
+                self._parsed.popitem(last=False)
+
+        return document
+
+
+def build_ocr_backend() -> OCRBackend:
+    """Backend según OCR_BACKEND"""
+    if settings.ocr_backend == "replay":
+        return ReplayBackend(
+            directory=settings.ocr_recordings_dir,
+            latency_ms=settings.ocr_replay_latency_ms,
+            jitter_ms=settings.ocr_replay_jitter_ms,
+            strict=settings.ocr_replay_strict
+        )
+
+    if settings.ocr_backend == "record":
+        return RecordingBackend(DocumentAIBackend(), settings.ocr_recordings_dir)
+
+    if settings.ocr_backend != "documentai":
+        raise ValueError(f"OCR_BACKEND desconocido: {settings.ocr_backend}")
+
+    return DocumentAIBackend()
@@ -0,0 +1,204 @@
+"""
+Cache de resultados de OCR direccionado por contenido
+
+La llave es el SHA-256 de los bytes de la imagen + el backend de OCR (el
+processor de Document AI, o el juego de grabaciones con OCR_BACKEND=replay),
+así que reintentos del móvil y re-escaneos del mismo ticket no vuelven a pagar
+una llamada a Document AI, y un resultado de replay nunca se sirve como si
+fuera de Document AI (ni al revés) con el cache persistente.
+
+Dos niveles:
+- Memoria (LRU, con límite en bytes)
+- SQLite local opcional (persiste entre reinicios)
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.services.ocr_service import ocr_service
+
+
+class OCRResultCache:
+    """Cache LRU en memoria con nivel persistente opcional en SQLite"""
+
+    def __init__(self, max_bytes: int, db_path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+
+        # llave -> (JSON serializado, tamaño). Se guarda serializado para medir
+        # tamaño y para que nadie modifique la entrada cacheada
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+                "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(image_bytes: bytes, backend_key: str) -> str:
+        """SHA-256 de backend + bytes de la imagen"""
+        digest = hashlib.sha256()
+        digest.update(backend_key.encode())
+        digest.update(b"\0")
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Busca en memoria y después en disco (promoviendo a memoria)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        payload = entry[0] if entry is not None else None
+
+        if payload is None and self._db is not None:
+            payload = await asyncio.to_thread(self._disk_get, key)
+            if payload is not None:
+                self.disk_hits += 1
+                self._memory_set(key, payload)
+
+        if payload is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(payload)
+
+    async def set(self, key: str, result: Dict) -> None:
+        """Guarda un resultado en ambos niveles"""
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        self._memory_set(key, payload)
+
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, payload)
+
+    def stats(self) -> Dict:
+        """Contadores de hit/miss y ocupación"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "persistent": self._db is not None,
+        }
+
+    def _memory_set(self, key: str, payload: str) -> None:
+        size = len(payload.encode())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._entries[key] = (payload, size)
+            self._size += size
+
+            # Evictar los menos usados hasta caber en el límite
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM ocr_results WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _disk_set(self, key: str, payload: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, result) VALUES (?, ?)",
+                (key, payload)
+            )
+            self._db.commit()
+
+
+class CachedOCRService:
+    """
+    Capa delante de OCRService
+
+    Misma interfaz que `scan_receipt_from_bytes`; agrega `cache_hit` al
+    resultado. Uploads idénticos simultáneos comparten una sola llamada.
+    """
+
+    def __init__(self, ocr_service, cache: OCRResultCache):
+        self.ocr_service = ocr_service
+        self.cache = cache
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def backend_key(self) -> str:
+        # Se lee en cada llamada: el backend se puede cambiar en caliente
+        # (benchmarks/ocr_concurrency.py pone un ReplayBackend)
+        return self.ocr_service.backend.cache_key
+
+    async def scan_receipt_from_bytes(self, image_bytes: bytes, mime_type: str = "image/jpeg") -> Dict:
+        key = self.cache.make_key(image_bytes, self.backend_key)
+
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return {**cached, "cache_hit": True}
+
+        # Si el mismo recibo ya se está escaneando, esperar ese resultado.
+        # El escaneo corre en su propia tarea para que, si el primer cliente
+        # se desconecta, los demás sigan recibiendo el resultado.
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._scan_and_store(key, image_bytes, mime_type))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        result = await asyncio.shield(task)
+        return {**result, "cache_hit": False}
+
+    async def _scan_and_store(self, key: str, image_bytes: bytes, mime_type: str) -> Dict:
+        result = await self.ocr_service.scan_receipt_from_bytes(
+            image_bytes=image_bytes,
+            mime_type=mime_type
+        )
+        # Solo se cachean escaneos exitosos
+        if result.get("success"):
+            await self.cache.set(key, result)
+        return result
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+def _build_cached_ocr_service() -> CachedOCRService:
+    cache = OCRResultCache(
+        max_bytes=settings.ocr_cache_max_bytes,
+        db_path=settings.ocr_cache_path or None
+    )
+    return CachedOCRService(ocr_service, cache)
+
+
+# Singleton
+cached_ocr_service = _build_cached_ocr_service()
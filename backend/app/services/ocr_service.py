@@ -1,28 +1,45 @@
 from google.cloud import documentai_v1 as documentai
-from google.api_core.client_options import ClientOptions
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, List
 from datetime import datetime
-import os
+import asyncio
 from app.config import settings
+from app.services.ocr_backends import OCRBackend, build_ocr_backend
+from app.services.merchant_catalog import merchant_catalog
 
 class OCRService:
     """Servicio de OCR para escanear recibos con Google Document AI Receipt Parser"""
 
-    def __init__(self):
-        # Configurar la variable de entorno para las credenciales
-        if settings.google_application_credentials:
-            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = settings.google_application_credentials
+    def __init__(self, backend: Optional[OCRBackend] = None):
+        # Backend que convierte la imagen en un documentai.Document
+        # (Document AI en producción; grabaciones para benchmarks)
+        self.backend = backend or build_ocr_backend()
+
+        # Los backends son síncronos: cada llamada corre en un pool dedicado
+        # para no bloquear el event loop, y el semáforo limita cuántas
+        # llamadas hay en vuelo al mismo tiempo
+        self.max_concurrency = max(1, settings.ocr_max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="ocr"
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
 
-        # Configurar cliente de Document AI
-        opts = ClientOptions(api_endpoint=f"{settings.document_ai_location}-documentai.googleapis.com")
-        self.client = documentai.DocumentProcessorServiceClient(client_options=opts)
+    async def _process_document(self, image_bytes: bytes, mime_type: str) -> documentai.Document:
+        """
+        Ejecuta el backend sin bloquear el event loop
 
-        # Configurar el processor
-        self.processor_name = self.client.processor_path(
-            settings.google_project_id,
-            settings.document_ai_location,
-            settings.document_ai_processor_id
-        )
+        Espera turno en el semáforo (máximo `ocr_max_concurrency` llamadas en
+        vuelo) y corre la llamada bloqueante en el pool de OCR.
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                self.backend.process_document,
+                image_bytes,
+                mime_type
+            )
 
     async def scan_receipt(self, image_path: str) -> Dict:
         """
@@ -34,12 +51,16 @@ class OCRService:
         Returns:
             Dict con toda la información extraída estructurada
         """
-        # Leer imagen
-        with open(image_path, 'rb') as image_file:
-            content = image_file.read()
+        # Leer imagen (fuera del event loop)
+        content = await asyncio.to_thread(self._read_file, image_path)
 
         return await self.scan_receipt_from_bytes(content)
 
+    @staticmethod
+    def _read_file(image_path: str) -> bytes:
+        with open(image_path, 'rb') as image_file:
+            return image_file.read()
+
     async def scan_receipt_from_bytes(self, image_bytes: bytes, mime_type: str = "image/jpeg") -> Dict:
         """
         Escanea un recibo desde bytes (para uploads)
@@ -52,21 +73,8 @@ class OCRService:
             Dict con datos estructurados del recibo + confidence scores
         """
         try:
-            # Crear documento para procesar
-            raw_document = documentai.RawDocument(
-                content=image_bytes,
-                mime_type=mime_type
-            )
-
-            # Configurar request
-            request = documentai.ProcessRequest(
-                name=self.processor_name,
-                raw_document=raw_document
-            )
-
-            # Procesar documento
-            result = self.client.process_document(request=request)
-            document = result.document
+            # Procesar documento (no bloquea el event loop)
+            document = await self._process_document(image_bytes, mime_type)
 
             # Extraer datos estructurados del receipt parser
             extracted_data = self._extract_receipt_data(document)
@@ -288,79 +296,12 @@ class OCRService:
     def _suggest_category(self, merchant_name: str) -> Optional[str]:
         """
         Sugiere categoría basada en el nombre del comercio
-        Optimizado para comercios mexicanos
+        (catálogo compartido de comercios mexicanos)
         """
         if not merchant_name:
             return None
 
-        merchant_upper = merchant_name.upper()
-
-        # Mapeo de comercios comunes a categorías
-        merchant_categories = {
-            # Alimentos y bebidas
-            'OXXO': 'Comida',
-            'SEVEN ELEVEN': 'Comida',
-            '7-ELEVEN': 'Comida',
-            'EXTRA': 'Comida',
-            'CIRCLE K': 'Comida',
-            'STARBUCKS': 'Comida',
-            'MCDONALD': 'Comida',
-            'BURGER KING': 'Comida',
-            'SUBWAY': 'Comida',
-            'KFC': 'Comida',
-            'DOMINOS': 'Comida',
-            'PIZZA HUT': 'Comida',
-
-            # Supermercados
-            'WALMART': 'Supermercado',
-            'SORIANA': 'Supermercado',
-            'CHEDRAUI': 'Supermercado',
-            'BODEGA AURRERA': 'Supermercado',
-            'LA COMER': 'Supermercado',
-            'COSTCO': 'Supermercado',
-            'SAMS': 'Supermercado',
-
-            # Transporte
-            'UBER': 'Transporte',
-            'DIDI': 'Transporte',
-            'BEAT': 'Transporte',
-            'CABIFY': 'Transporte',
-            'PEMEX': 'Transporte',
-            'CHEVRON': 'Transporte',
-            'BP': 'Transporte',
-
-            # Entretenimiento
-            'NETFLIX': 'Entretenimiento',
-            'SPOTIFY': 'Entretenimiento',
-            'CINEPOLIS': 'Entretenimiento',
-            'CINEMEX': 'Entretenimiento',
-
-            # Ropa
-            'ZARA': 'Ropa',
-            'H&M': 'Ropa',
-            'LIVERPOOL': 'Ropa',
-            'PALACIO': 'Ropa',
-            'SUBURBIA': 'Ropa',
-
-            # Tecnología
-            'AMAZON': 'Tecnología',
-            'MERCADO LIBRE': 'Tecnología',
-            'BEST BUY': 'Tecnología',
-
-            # Salud
-            'FARMACIA': 'Salud',
-            'BENAVIDES': 'Salud',
-            'GUADALAJARA': 'Salud',
-            'DEL AHORRO': 'Salud',
-        }
-
-        # Buscar match
-        for merchant_key, category in merchant_categories.items():
-            if merchant_key in merchant_upper:
-                return category
-
-        # Default
-        return 'Otros'
+        return merchant_catalog.category_for_merchant(merchant_name) or 'Otros'
 
 
 # Singleton
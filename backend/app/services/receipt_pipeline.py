@@ -0,0 +1,332 @@
+"""
+Pipeline de recibos: escanear un recibo y crear el expense
+
+Flujo compartido por `/api/ocr/scan-and-create-expense` y `/api/ocr/scan-batch`.
+Igual que OCRService, no lanza HTTPException: retorna un dict con `success`
+y, si falla, `error` + `status_code` para que el router responda.
+
+Las etapas corren según sus dependencias, no una tras otra:
+
+    preprocessing ─┬─ ocr ─ postprocessing ─ category ─┬─ insert
+                   └─ upload ─────────────────────────┘
+
+La subida a Storage solo necesita la imagen, así que corre a la par del OCR
+y la latencia total se acerca a la de la rama más larga (normalmente OCR).
+Si el expense no se llega a crear, la imagen subida se borra para no dejarla
+huérfana. El expense y su recibo se guardan juntos en una transacción
+(expense_service.create_with_receipts). Cada respuesta incluye `timings`:
+inicio y duración de cada etapa.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, Optional
+
+from supabase import AsyncClient
+
+from app.services.category_resolver import category_resolver
+from app.services.expense_service import expense_service
+from app.services.image_preprocessor import image_preprocessor
+from app.services.ocr_cache import cached_ocr_service
+from app.services.ocr_postprocessor import ocr_postprocessor
+from app.services.storage_service import storage_service
+from app.services.upload_intake import ImageBuffer
+from app.utils.mexico_utils import (
+    validate_rfc,
+    is_deductible,
+    extract_iva_from_total
+)
+
+
+class StageTimer:
+    """Inicio y duración de cada etapa, relativos al inicio del flujo (ms)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = {
+                "start_ms": round((start - self.started) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+
+    async def run(self, name: str, awaitable: Awaitable):
+        with self.stage(name):
+            return await awaitable
+
+    def summary(self) -> Dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": self.stages,
+        }
+
+
+class ReceiptPipeline:
+    """Escanea un recibo, sube la imagen y crea el expense con sus datos OCR"""
+
+    # Etapas del camino principal, en orden (se reportan a `on_stage`). La
+    # subida a Storage corre en paralelo y no se reporta por separado:
+    # `insert` espera a que termine y guarda el expense con su recibo
+    STAGES = ["preprocessing", "ocr", "postprocessing", "category", "insert"]
+
+    async def scan_and_create_expense(
+        self,
+        db: AsyncClient,
+        image_bytes: ImageBuffer,
+        content_type: str,
+        project_id: str,
+        on_stage: Optional[Callable[[str], None]] = None
+    ) -> Dict:
+        """
+        Flujo completo de automatización para un recibo
+
+        Args:
+            db: Cliente async de Supabase
+            image_bytes: Bytes de la imagen del recibo (o mmap, ver upload_intake)
+            content_type: Tipo MIME de la imagen
+            project_id: UUID del proyecto donde crear el expense
+            on_stage: Callback opcional que recibe el nombre de cada etapa
+                (ver STAGES) al empezarla
+
+        Returns:
+            Dict con el expense creado y los datos OCR, o `success: False`
+            con `error` y `status_code`
+        """
+        report = on_stage or (lambda stage: None)
+        timer = StageTimer()
+        upload_task: Optional[asyncio.Future] = None
+
+        async def fail(status_code: int, error: str) -> Dict:
+            # El expense no se creó: no dejar la imagen huérfana en Storage
+            if upload_task is not None:
+                await self._discard_upload(db, upload_task)
+            return {"success": False, "status_code": status_code, "error": error}
+
+        try:
+            # PASO 0: Preprocesar imagen (enderezar, grises, reducir); la
+            # versión ligera es la que va a Document AI y a Storage
+            report("preprocessing")
+            with timer.stage("preprocessing"):
+                preprocessed = await image_preprocessor.process(image_bytes, content_type or "image/jpeg")
+            image_bytes = preprocessed["image_bytes"]
+            content_type = preprocessed["mime_type"]
+
+            # PASO 1: Subir imagen a Storage en segundo plano (solo depende de
+            # la imagen) mientras se escanea con Document AI (o cache)
+            file_extension = content_type.split('/')[-1] if content_type else 'jpg'
+            upload_task = asyncio.ensure_future(timer.run("upload", storage_service.upload_receipt_image(
+                db=db,
+                image_bytes=image_bytes,
+                file_extension=file_extension
+            )))
+
+            report("ocr")
+            ocr_result = await timer.run("ocr", cached_ocr_service.scan_receipt_from_bytes(
+                image_bytes=image_bytes,
+                mime_type=content_type or "image/jpeg"
+            ))
+
+            if not ocr_result.get("success"):
+                return await fail(400, ocr_result.get("error"))
+
+            # PASO 2: Post-procesamiento INTELIGENTE (nivel enterprise)
+            report("postprocessing")
+            with timer.stage("postprocessing"):
+                enhanced_data = ocr_postprocessor.process(ocr_result, ocr_result["full_text"])
+
+            # Usar datos mejorados en lugar de los originales
+            extracted = {
+                **ocr_result["extracted_data"],
+                'merchant_name': enhanced_data['merchant_name'],
+                'rfc': enhanced_data['rfc'],
+                'total_amount': enhanced_data['total_amount'],
+                'date': enhanced_data['date'],
+            }
+
+            # TODO: Obtener user_id del token JWT
+            temp_user_id = "00000000-0000-0000-0000-000000000000"
+
+            # Sugerir categoría (usar el mejorado del post-processor)
+            suggested_category = enhanced_data['suggested_category']
+            category_confidence = enhanced_data['category_confidence']
+
+            # Mapear categoría sugerida a category_id (cache de categorías): en cuanto se
+            # conoce la categoría, mientras se calculan RFC, IVA y deducibilidad
+            report("category")
+            category_task = asyncio.ensure_future(timer.run("category", self._find_category_id(
+                db, suggested_category, temp_user_id
+            )))
+
+            # PASO 3: Post-procesamiento adicional con utilidades de México
+            # Validar RFC si existe
+            rfc_validation = {"valid": False, "error": "No se encontró RFC"}
+            if extracted.get("rfc"):
+                rfc_validation = validate_rfc(extracted["rfc"])
+
+            # Calcular/validar IVA
+            tax_breakdown = None
+            if extracted.get("total_amount"):
+                total = Decimal(str(extracted["total_amount"]))
+                if extracted.get("tax_amount"):
+                    tax = Decimal(str(extracted["tax_amount"]))
+                    subtotal = total - tax
+                    tax_breakdown = {
+                        "subtotal": float(subtotal),
+                        "iva": float(tax),
+                        "total": float(total)
+                    }
+                else:
+                    tax_breakdown = extract_iva_from_total(total)
+
+            # Verificar deducibilidad
+            has_rfc = rfc_validation.get("valid", False)
+            deductible_info = is_deductible(
+                category=suggested_category,
+                has_rfc=has_rfc,
+                has_invoice=False,
+                merchant_type=extracted.get("merchant_name")
+            )
+
+            # PASO 4: Preparar datos para crear expense
+            # Usar datos extraídos o valores por defecto
+            expense_name = extracted.get("merchant_name") or "Gasto sin nombre"
+            expense_amount = extracted.get("total_amount") if extracted.get("total_amount") else 0.01  # Mínimo 0.01
+
+            # Validar y limpiar fecha
+            expense_date = None
+            raw_date = extracted.get("date")
+            if raw_date:
+                try:
+                    # Intentar parsear la fecha para validar que sea válida
+                    if isinstance(raw_date, str):
+                        # Verificar que sea un formato ISO válido o convertible
+                        parsed_date = datetime.fromisoformat(raw_date.replace('Z', '+00:00'))
+                        expense_date = parsed_date.isoformat()
+                    else:
+                        expense_date = datetime.now().isoformat()
+                except (ValueError, AttributeError):
+                    # Si la fecha es inválida, usar fecha actual
+                    expense_date = datetime.now().isoformat()
+            else:
+                expense_date = datetime.now().isoformat()
+
+            category_id = await category_task
+
+            # Preparar datos del expense
+            expense_data = {
+                "user_id": temp_user_id,
+                "project_id": project_id,
+                "category_id": category_id,  # Ya está mapeado arriba
+                "name": expense_name,
+                "description": f"Escaneado automáticamente - {extracted.get('merchant_address', '')}".strip(),
+                "amount": str(expense_amount),
+                "date": expense_date,
+                # Datos OCR adicionales
+                "merchant_name": extracted.get("merchant_name"),
+                "merchant_address": extracted.get("merchant_address"),
+                "tax_amount": str(extracted.get("tax_amount")) if extracted.get("tax_amount") else None,
+                "payment_method": extracted.get("payment_method"),
+                "rfc": extracted.get("rfc"),
+                "is_deductible": deductible_info.get("deductible", False),
+                "has_invoice": False,
+            }
+
+            # PASO 5: Esperar la subida y guardar el expense con su recibo
+            # en una sola transacción
+            report("insert")
+            receipt_url = await upload_task
+            receipts = []
+            if receipt_url:
+                receipts.append({
+                    "image_url": receipt_url,
+                    "ocr_text": ocr_result["full_text"],
+                    # Guardar datos estructurados como JSONB, con las pistas
+                    # originales de Document AI para poder re-extraer después
+                    "ocr_data": {
+                        **extracted,
+                        "docai_hints": ocr_postprocessor.docai_hints(ocr_result["extracted_data"]),
+                    }
+                })
+            created = await timer.run("insert", expense_service.create_with_receipts(db, expense_data, receipts))
+
+            if not created:
+                return await fail(400, "Error al crear gasto desde OCR")
+
+            expense_id = created["id"]
+
+            # PASO 6: Retornar respuesta completa con datos mejorados
+            return {
+                "success": True,
+                "message": "Expense creado automáticamente desde recibo",
+                "expense_id": expense_id,
+                "expense": created,
+                "receipt_url": receipt_url,
+                "ocr_data": {
+                    "extracted": extracted,
+                    "full_text": ocr_result["full_text"],
+                    "confidence": enhanced_data['overall_confidence'],  # Confidence mejorado
+                    "rfc_validation": rfc_validation,
+                    "tax_breakdown": tax_breakdown,
+                    "suggested_category": suggested_category,
+                    "category_confidence": category_confidence,
+                    "deductible_info": deductible_info,
+                    # Confidence scores detallados
+                    "confidence_breakdown": {
+                        "merchant": enhanced_data['merchant_confidence'],
+                        "rfc": enhanced_data['rfc_confidence'],
+                        "amount": enhanced_data['amount_confidence'],
+                        "date": enhanced_data['date_confidence'],
+                        "category": enhanced_data['category_confidence'],
+                        "overall": enhanced_data['overall_confidence'],
+                    },
+                    "processing_method": enhanced_data['processing_method'],
+                    "cache_hit": ocr_result.get("cache_hit", False),
+                    "preprocessing": preprocessed["stats"],
+                },
+                "timings": timer.summary(),
+            }
+
+        except asyncio.CancelledError:
+            # Cliente desconectado (scan-batch): limpiar la subida sin bloquear la cancelación
+            if upload_task is not None:
+                asyncio.ensure_future(self._discard_upload(db, upload_task))
+            raise
+        except Exception as e:
+            return await fail(500, f"Error al procesar recibo y crear expense: {str(e)}")
+
+    @staticmethod
+    async def _find_category_id(db: AsyncClient, suggested_category: str, user_id: str) -> Optional[str]:
+        """category_id de la categoría sugerida (None si no existe o falla)"""
+        if not suggested_category or suggested_category in ("Sin categoría", "Otros"):
+            return None
+
+        try:
+            # Desde el cache en memoria: solo consulta la BD al vencer el TTL
+            return await category_resolver.resolve(db, suggested_category, user_id=user_id)
+        except Exception as e:
+            print(f"Error al buscar categoría: {e}")
+            # Si falla, dejamos category_id como None
+            return None
+
+    @staticmethod
+    async def _discard_upload(db: AsyncClient, upload_task: asyncio.Future) -> None:
+        """Espera la subida en curso y borra la imagen si llegó a subirse"""
+        try:
+            receipt_url = await upload_task
+        except Exception:
+            return
+        if receipt_url:
+            await storage_service.delete_receipt_image(db, receipt_url)
+
+
+# Singleton
+receipt_pipeline = ReceiptPipeline()
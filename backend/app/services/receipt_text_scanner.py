@@ -0,0 +1,183 @@
+"""
+Escaneo de una sola pasada sobre el texto de un recibo
+
+Antes, cada extractor del post-procesador recorría el texto por su cuenta
+(RFC con una llamada a `text.upper()` por patrón, montos, fechas, merchant y
+categoría), compilando las regex en cada llamada. Aquí todos los patrones se
+compilan una vez en una regex maestra que recorre el texto en mayúsculas una
+sola vez y emite candidatos con su posición; los extractores solo consumen
+esos candidatos.
+
+La razón social es la excepción: distingue mayúsculas y casi nunca hace
+falta, así que se busca sobre el texto original solo si se pide.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+
+# Número con separador de miles y centavos opcionales: 1,234.56
+_AMOUNT = r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?'
+
+# Formato, largo y prioridad de cada patrón de fecha (en orden de prioridad)
+DATE_FORMATS = {
+    'date_dmy': '%d/%m/%Y',       # DD/MM/YYYY
+    'date_dmy_dash': '%d-%m-%Y',  # DD-MM-YYYY
+    'date_ymd': '%Y-%m-%d',       # YYYY-MM-DD
+}
+_DATE_LENGTH = 10
+
+# Regex maestra sobre el texto en mayúsculas.
+#
+# Cada alternativa consume un solo carácter "ancla" y verifica el resto con
+# lookarounds, así que los candidatos de un tipo nunca tapan a los de otro
+# (en "TOTAL 15/01/2024" salen el monto y la fecha). Las anclas son
+# caracteres poco frecuentes ("$", "/", "-", T, I) o el inicio de palabra
+# del RFC: el motor descarta rápido el resto de las posiciones, que es lo que
+# hace que una pasada cueste menos que un patrón por campo.
+MASTER_PATTERN = re.compile(
+    # Montos: "$ 1,234.56", "TOTAL: 1,234.56", "IMPORTE $1,234.56"
+    r'\$(?=\s*(?P<amount>' + _AMOUNT + r'))'
+    r'|T(?=OTAL[:\s]*\$?\s*(?P<amount_total>' + _AMOUNT + r'))'
+    r'|I(?=MPORTE[:\s]*\$?\s*(?P<amount_importe>' + _AMOUNT + r'))'
+    # Fechas, ancladas en el primer separador
+    r'|/(?<=\d\d/)(?=\d\d/\d{4})(?P<date_dmy>)'
+    r'|-(?:(?<=\d\d-)(?=\d\d-\d{4})(?P<date_dmy_dash>)(?:(?<=\d{4}-)(?=\d\d-\d\d)(?P<date_ymd_also>))?'
+    r'|(?<=\d{4}-)(?=\d\d-\d\d)(?P<date_ymd>))'
+    # RFC: 3-4 letras, fecha AAMMDD y homoclave, con guiones opcionales
+    r'|(?P<rfc_first>[A-ZÑ&])(?<=\b.)(?=(?P<rfc_name>[A-ZÑ&]{2,3})-?(?P<rfc_date>\d{6})-?(?P<rfc_key>[A-Z0-9]{3})\b)'
+)
+
+_AMOUNT_GROUPS = frozenset({'amount', 'amount_total', 'amount_importe'})
+
+# Patrón de fecha -> distancia del separador (ancla) al inicio de la fecha
+_DATE_OFFSETS = {'date_dmy': 2, 'date_dmy_dash': 2, 'date_ymd': 4}
+
+# Razón social: "... S.A. DE C.V." o "... S. DE R.L." (sobre el texto original)
+COMPANY_PATTERN = re.compile(
+    r'([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑa-záéíóúñ\s&.,-]{2,50})\s*'
+    r'(?:S\.?\s*A\.?|S\.?\s*DE\s*R\.?\s*L\.?|S\.?\s*A\.?\s*DE\s*C\.?\s*V\.?)'
+)
+
+# RFC persona moral (12 caracteres) y persona física (13 caracteres)
+RFC_MORAL_PATTERN = re.compile(r'[A-ZÑ&]{3}\d{6}[A-Z0-9]{3}')
+RFC_FISICA_PATTERN = re.compile(r'[A-ZÑ&]{4}\d{6}[A-Z0-9]{3}')
+
+
+# Candidatos: (posición, valor). Son tuplas simples porque un recibo largo
+# produce miles de montos y construir objetos por cada uno se nota.
+Candidate = Tuple[int, str]
+# Fechas: (prioridad del formato, posición, valor, formato de strptime), así
+# `sorted()` las deja en el orden en que se deben probar
+DateCandidate = Tuple[int, int, str, str]
+
+
+class ScannedText:
+    """
+    Resultado del escaneo: el texto, su versión en mayúsculas y los
+    candidatos de cada campo en orden de aparición
+    """
+
+    __slots__ = ('text', 'text_upper', 'rfcs', 'amounts', 'dates', '_company', '_company_scanned')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.text_upper = text.upper()
+        self.rfcs: List[Candidate] = []
+        self.amounts: List[Candidate] = []
+        self.dates: List[DateCandidate] = []
+        self._company: Optional[Candidate] = None
+        self._company_scanned = False
+
+    @property
+    def company(self) -> Optional[Candidate]:
+        """
+        Primera razón social (S.A. DE C.V., S. DE R.L.)
+
+        Es el único patrón que distingue mayúsculas, así que corre sobre el
+        texto original y solo cuando alguien lo pide (el merchant casi
+        siempre sale antes del catálogo o de Document AI).
+        """
+        if not self._company_scanned:
+            match = COMPANY_PATTERN.search(self.text)
+            if match:
+                self._company = (match.start(1), match.group(1).strip())
+            self._company_scanned = True
+        return self._company
+
+
+class ReceiptTextScanner:
+    """Recorre el texto una vez y agrupa los candidatos por campo"""
+
+    _date_priority = {name: index for index, name in enumerate(DATE_FORMATS)}
+
+    def scan(self, text: str) -> ScannedText:
+        scanned = ScannedText(text or "")
+        text_upper = scanned.text_upper
+
+        # Fin del último candidato por formato de fecha: como con finditer,
+        # dos fechas del mismo formato no se traslapan
+        date_ends = {name: 0 for name in DATE_FORMATS}
+        add_amount = scanned.amounts.append
+
+        for match in MASTER_PATTERN.finditer(text_upper):
+            # Último grupo cerrado: identifica la alternativa que coincidió
+            kind = match.lastgroup
+
+            # Los montos son, por mucho, los candidatos más frecuentes
+            if kind in _AMOUNT_GROUPS:
+                add_amount((match.start(), match[kind]))
+                continue
+
+            anchor = match.start()
+            if kind == 'rfc_key':
+                scanned.rfcs.append((
+                    anchor,
+                    match['rfc_first'] + match['rfc_name'] + match['rfc_date'] + match['rfc_key']
+                ))
+            else:
+                names = [kind]
+                if kind == 'date_ymd_also':
+                    names = ['date_dmy_dash', 'date_ymd']
+
+                for name in names:
+                    start = anchor - _DATE_OFFSETS[name]
+                    if start < date_ends[name]:
+                        continue
+                    date_ends[name] = start + _DATE_LENGTH
+                    scanned.dates.append((
+                        self._date_priority[name],
+                        start,
+                        text_upper[start:start + _DATE_LENGTH],
+                        DATE_FORMATS[name]
+                    ))
+
+        return scanned
+
+
+def is_valid_rfc(rfc: Optional[str]) -> bool:
+    """Valida formato básico de RFC mexicano (acepta guiones y espacios)"""
+    if not rfc:
+        return False
+
+    rfc = rfc.upper().replace('-', '').replace(' ', '')
+
+    if len(rfc) == 12:
+        return RFC_MORAL_PATTERN.fullmatch(rfc) is not None
+
+    if len(rfc) == 13:
+        return RFC_FISICA_PATTERN.fullmatch(rfc) is not None
+
+    return False
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """'1,234.56' -> 1234.56"""
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return None
+
+
+# Singleton
+receipt_text_scanner = ReceiptTextScanner()
@@ -1,7 +1,8 @@
-from supabase import Client
+from supabase import AsyncClient
 from typing import Optional
 import uuid
 from datetime import datetime
+from app.services.upload_intake import ImageBuffer, open_buffer
 
 class StorageService:
     """Servicio para manejar uploads a Supabase Storage"""
@@ -10,41 +11,72 @@ class StorageService:
 
     @staticmethod
     async def upload_receipt_image(
-        db: Client,
-        image_bytes: bytes,
+        db: AsyncClient,
+        image_bytes: ImageBuffer,
         file_extension: str = "jpg"
     ) -> Optional[str]:
         """
         Sube una imagen de recibo a Supabase Storage
 
+        Con el cliente async la subida no bloquea el event loop, así que
+        puede hacerse a la par del OCR.
+
         Args:
-            db: Cliente de Supabase
-            image_bytes: Bytes de la imagen
+            db: Cliente async de Supabase
+            image_bytes: Bytes de la imagen (o el mmap de un upload grande,
+                que se envía por bloques sin copiarlo)
             file_extension: Extensión del archivo (jpg, png, etc.)
 
         Returns:
             URL pública de la imagen subida
         """
         try:
-            # Generar nombre único para el archivo
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            file_name = f"receipt_{timestamp}_{unique_id}.{file_extension}"
+            return await StorageService._upload(db, image_bytes, file_extension)
+        except Exception as e:
+            print(f"Error al subir imagen: {str(e)}")
+            return None
+
+    @staticmethod
+    async def delete_receipt_image(db: AsyncClient, public_url: str) -> bool:
+        """
+        Borra una imagen subida con upload_receipt_image (p. ej. si el
+        expense no se llegó a crear y la imagen quedaría huérfana)
 
-            # Subir a Supabase Storage
-            result = db.storage.from_(StorageService.BUCKET_NAME).upload(
+        Returns:
+            True si se borró
+        """
+        # Las imágenes se guardan en la raíz del bucket: el nombre es el final de la URL
+        file_name = public_url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+        try:
+            await db.storage.from_(StorageService.BUCKET_NAME).remove([file_name])
+            return True
+        except Exception as e:
+            print(f"Error al borrar imagen {file_name}: {str(e)}")
+            return False
+
+    @staticmethod
+    async def _upload(db: AsyncClient, image_bytes: ImageBuffer, file_extension: str) -> str:
+        # Generar nombre único para el archivo
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        unique_id = str(uuid.uuid4())[:8]
+        file_name = f"receipt_{timestamp}_{unique_id}.{file_extension}"
+
+        # Subir a Supabase Storage (storage3 acepta bytes o un archivo abierto)
+        if isinstance(image_bytes, bytes):
+            await db.storage.from_(StorageService.BUCKET_NAME).upload(
                 file_name,
                 image_bytes,
                 file_options={"content-type": f"image/{file_extension}"}
             )
+        else:
+            with open_buffer(image_bytes) as content:
+                await db.storage.from_(StorageService.BUCKET_NAME).upload(
+                    file_name,
+                    content,
+                    file_options={"content-type": f"image/{file_extension}"}
+                )
 
-            # Obtener URL pública
-            public_url = db.storage.from_(StorageService.BUCKET_NAME).get_public_url(file_name)
-
-            return public_url
-
-        except Exception as e:
-            print(f"Error al subir imagen: {str(e)}")
-            return None
+        # Obtener URL pública
+        return await db.storage.from_(StorageService.BUCKET_NAME).get_public_url(file_name)
 
 storage_service = StorageService()
@@ -0,0 +1,174 @@
+"""
+Sincronización offline (GET/POST /api/sync)
+
+La app trabaja sin red y, al reconectarse, antes bajaba todos los gastos de
+nuevo y reenviaba su cola de cambios un request a la vez. Ahora:
+
+- GET: trae solo lo que cambió desde su token. Los triggers de expenses,
+  receipts y comments escriben `sync_changes` (database_schema.sql, sección
+  SINCRONIZACIÓN) con borrados como tombstones, y `sync_pull` entrega cada
+  registro una vez por página con sus datos actuales
+- POST: manda toda la cola en un request. `sync_push` aplica cada operación
+  en su propio savepoint y devuelve un resultado por operación: `applied`,
+  `duplicate` (ya existía: reintento), `conflict` (cambió desde
+  `base_updated_at`; trae la versión del servidor), `not_found`,
+  `forbidden`, `error`. Las que no pasan validación aquí son `invalid` y no
+  llegan a la BD.
+
+El token es opaco para el cliente (base64 del txid y el id del último
+cambio entregado): solo se devuelve tal cual en `since=`.
+"""
+
+import base64
+import binascii
+import json
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, ValidationError
+from supabase import AsyncClient
+
+from app.schemas.sync import (
+    SyncCommentCreate, SyncCommentUpdate, SyncExpenseCreate, SyncExpenseUpdate, SyncOperation, SyncReceiptCreate,
+)
+
+# Esquema de `data` por (entidad, acción); las que no están no llevan datos
+DATA_SCHEMAS = {
+    ("expense", "create"): SyncExpenseCreate,
+    ("expense", "update"): SyncExpenseUpdate,
+    ("comment", "create"): SyncCommentCreate,
+    ("comment", "update"): SyncCommentUpdate,
+    ("receipt", "create"): SyncReceiptCreate,
+}
+SUPPORTED_OPERATIONS = set(DATA_SCHEMAS) | {("expense", "delete"), ("comment", "delete"), ("receipt", "delete")}
+
+
+class InvalidSyncTokenError(ValueError):
+    """Token que no se generó con encode_token (o alterado)"""
+
+
+def encode_token(txid: str, change_id: int) -> str:
+    payload = json.dumps({"x": str(txid), "i": int(change_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Dict:
+    """
+    Returns:
+        {"txid": str, "id": int}
+
+    Raises:
+        InvalidSyncTokenError: Si el token no es válido
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        txid, change_id = str(payload["x"]), int(payload["i"])
+        if not txid.isdigit() or change_id < 0:
+            raise ValueError(token)
+        return {"txid": txid, "id": change_id}
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidSyncTokenError("Token de sincronización inválido")
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'data'}: {item['msg']}" for item in error.errors()
+    )
+
+
+class SyncService:
+    """Cambios por token y aplicación de la cola offline, en la BD"""
+
+    async def pull(self, db: AsyncClient, user_id: str, since: Optional[str] = None, limit: int = 500) -> Dict:
+        """
+        Cambios de gastos, recibos y comentarios de los proyectos del usuario
+        desde `since` (None = solo el token actual; se pide antes de una
+        descarga completa para no perder lo que cambie mientras tanto)
+
+        Returns:
+            {"changes": [{entity, id, expense_id, op: upsert | delete, data}],
+             "next_token": str, "has_more": bool}
+            o {"resync_required": True} si el token es anterior al log conservado
+
+        Raises:
+            InvalidSyncTokenError: Si `since` no es válido
+        """
+        position = decode_token(since) if since else {"txid": None, "id": 0}
+
+        result = await db.rpc("sync_pull", {
+            "p_user_id": str(user_id),
+            "p_since_txid": position["txid"],
+            "p_since_id": position["id"],
+            "p_limit": limit,
+        }).execute()
+        pulled = result.data or {}
+
+        if pulled.get("resync_required"):
+            return {"resync_required": True}
+        return {
+            "changes": pulled["changes"],
+            "next_token": encode_token(pulled["txid"], pulled["id"]),
+            "has_more": pulled["has_more"],
+        }
+
+    async def push(self, db: AsyncClient, user_id: str, operations: List[SyncOperation]) -> List[Dict]:
+        """
+        Aplica la cola en orden, en una sola llamada a la BD
+
+        Returns:
+            [{op_id, status, data?, error?}] en el mismo orden que `operations`
+        """
+        results: List[Optional[Dict]] = [None] * len(operations)
+        pending, pending_index = [], []
+
+        for index, operation in enumerate(operations):
+            try:
+                payload = self._payload(operation)
+            except ValueError as e:
+                results[index] = {"op_id": operation.op_id, "status": "invalid", "error": str(e)}
+                continue
+            pending.append(payload)
+            pending_index.append(index)
+
+        if pending:
+            response = await db.rpc("sync_push", {"p_user_id": str(user_id), "p_ops": pending}).execute()
+            for index, applied in zip(pending_index, response.data or []):
+                results[index] = applied
+
+        return results
+
+    @staticmethod
+    def _payload(operation: SyncOperation) -> Dict:
+        """
+        Operación validada como la espera `sync_apply_operation`
+
+        Raises:
+            ValueError: Si la operación no existe o `data` no es válido
+        """
+        key = (operation.entity, operation.action)
+        if key not in SUPPORTED_OPERATIONS:
+            raise ValueError(f"Operación no soportada: {operation.action} de {operation.entity}")
+
+        data = {}
+        schema: Optional[type[BaseModel]] = DATA_SCHEMAS.get(key)
+        if schema:
+            try:
+                # exclude_unset: en update, una llave presente con null sí borra el campo
+                data = schema.model_validate(operation.data).model_dump(mode="json", exclude_unset=True)
+            except ValidationError as e:
+                raise ValueError(_validation_message(e))
+            if not data:
+                raise ValueError("No hay datos para actualizar")
+
+        return {
+            "op_id": operation.op_id,
+            "entity": operation.entity,
+            "action": operation.action,
+            "id": str(operation.id),
+            "data": data,
+            "base_updated_at": operation.base_updated_at.isoformat() if operation.base_updated_at else None,
+        }
+
+
+# Singleton
+sync_service = SyncService()
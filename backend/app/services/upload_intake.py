@@ -0,0 +1,261 @@
+"""
+Recepción de imágenes subidas con memoria acotada
+
+`await file.read()` copia el archivo completo a un `bytes` que vive durante
+todo el flujo (preprocesamiento, OCR, Storage y respuesta): unos cuantos
+uploads de 20 MB en paralelo disparan la memoria del worker.
+
+En su lugar:
+- Se rechaza con 413 lo que pase de OCR_UPLOAD_MAX_BYTES por archivo
+  (UploadIntake) o de OCR_UPLOAD_MAX_REQUEST_BYTES por request
+  (UploadSizeLimitMiddleware, antes de leer el cuerpo completo)
+- Hasta OCR_UPLOAD_SPOOL_BYTES el archivo se lee a memoria (un solo `bytes`)
+- Arriba de eso se queda en el archivo temporal donde Starlette ya lo guardó
+  y se mapea con mmap: las páginas las maneja el sistema operativo y no
+  cuentan como memoria del proceso
+
+En ambos casos hay un solo buffer. El preprocesamiento, los backends de OCR
+(hash, cache) y StorageService lo leen a través de `open_buffer`, que no lo
+copia.
+"""
+
+import io
+import json
+import mmap
+import os
+import tempfile
+from typing import BinaryIO, Dict, Optional, Union
+
+from fastapi import HTTPException, UploadFile
+
+from app.config import settings
+
+# bytes (archivo chico) o mmap (archivo en disco)
+ImageBuffer = Union[bytes, mmap.mmap]
+
+
+class UploadTooLargeError(Exception):
+    """El archivo pasa del tamaño máximo permitido"""
+
+
+class _BufferReader(io.RawIOBase):
+    """Lector de solo lectura sobre un buffer, sin copiarlo"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = max(0, min(len(target), len(self._view) - self._position))
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        # Soltar la vista para que el mmap se pueda cerrar
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def open_buffer(buffer) -> BinaryIO:
+    """
+    Archivo de solo lectura sobre el buffer (para Pillow, httpx, etc.)
+
+    Para `bytes` es un BytesIO (CPython no copia el contenido); para un mmap
+    es un BufferedReader que lee por bloques.
+    """
+    if isinstance(buffer, bytes):
+        return io.BytesIO(buffer)
+    return io.BufferedReader(_BufferReader(buffer))
+
+
+class ReceivedUpload:
+    """Archivo recibido: un solo buffer para todo el flujo del recibo"""
+
+    def __init__(self, buffer: ImageBuffer, content_type: str, filename: Optional[str], spooled: bool):
+        self.buffer = buffer
+        self.content_type = content_type
+        self.filename = filename
+        self.spooled = spooled
+        self.size = len(buffer)
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap) and not self.buffer.closed:
+            try:
+                self.buffer.close()
+            except BufferError:
+                # Alguien sigue leyendo: se libera cuando suelte la vista
+                pass
+
+    def __enter__(self) -> "ReceivedUpload":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class UploadIntake:
+    """Lee UploadFile con límite de tamaño y sin duplicar archivos grandes"""
+
+    CHUNK_BYTES = 1024 * 1024
+
+    def __init__(self, max_bytes: int, spool_bytes: int):
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+
+        self.received = 0
+        self.spooled = 0
+        self.rejected = 0
+
+    async def receive(self, file: UploadFile) -> ReceivedUpload:
+        """
+        Lee el archivo subido
+
+        Raises:
+            UploadTooLargeError: Si pasa de `max_bytes`
+        """
+        if file.size is not None and file.size > self.max_bytes:
+            self.rejected += 1
+            raise UploadTooLargeError(self._too_large_message())
+
+        if file.size is not None and file.size <= self.spool_bytes:
+            buffer, spooled = await file.read(), False
+        elif file.size is not None and hasattr(file.file, "fileno"):
+            # Starlette ya lo guardó en un archivo temporal: mapearlo tal cual
+            buffer, spooled = self._map(file.file), True
+        else:
+            buffer, spooled = await self._stream(file)
+
+        self.received += 1
+        self.spooled += spooled
+        return ReceivedUpload(buffer, file.content_type or "", file.filename, spooled)
+
+    async def _stream(self, file: UploadFile):
+        """Lectura por bloques cuando no se conoce el tamaño de antemano"""
+        chunks = []
+        size = 0
+        spool = None
+
+        try:
+            while True:
+                chunk = await file.read(self.CHUNK_BYTES)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > self.max_bytes:
+                    self.rejected += 1
+                    raise UploadTooLargeError(self._too_large_message())
+
+                if spool is None and size > self.spool_bytes:
+                    spool = tempfile.TemporaryFile()
+                    spool.writelines(chunks)
+                    chunks = []
+                if spool is not None:
+                    spool.write(chunk)
+                else:
+                    chunks.append(chunk)
+
+            if spool is None:
+                return b"".join(chunks), False
+            spool.flush()
+            return self._map(spool), True
+        finally:
+            if spool is not None:
+                # mmap conserva su propio descriptor: el archivo ya no hace falta
+                spool.close()
+
+    @staticmethod
+    def _map(file) -> ImageBuffer:
+        file.flush()
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _too_large_message(self) -> str:
+        return f"El archivo pasa del máximo de {self.max_bytes / (1024 * 1024):.0f} MB"
+
+    def stats(self) -> Dict:
+        return {
+            "received": self.received,
+            "spooled": self.spooled,
+            "rejected": self.rejected,
+            "max_bytes": self.max_bytes,
+            "spool_bytes": self.spool_bytes,
+        }
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rechaza con 413 los requests cuyo cuerpo pase de `max_bytes`
+
+    Revisa Content-Length antes de leer nada y, si no viene (chunked), cuenta
+    los bytes conforme llegan, para no guardar en disco un cuerpo que de
+    todos modos se va a rechazar.
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefix: str = "/"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send) -> None:
+        body = json.dumps({"detail": self._detail()}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _detail(self) -> str:
+        return f"El request pasa del máximo de {self.max_bytes / (1024 * 1024):.0f} MB"
+
+
+# Singleton
+upload_intake = UploadIntake(
+    max_bytes=settings.ocr_upload_max_bytes,
+    spool_bytes=settings.ocr_upload_spool_bytes
+)
@@ -0,0 +1,50 @@
+"""
+ETags y GET condicional (If-None-Match -> 304 Not Modified)
+
+La app móvil vuelve a pedir el mismo gasto o la misma lista cada vez que
+una pantalla toma foco. Con un ETag el cliente manda `If-None-Match` y, si
+nada cambió, el servidor responde 304 sin cuerpo: no se serializa ni se
+transfiere el gasto otra vez.
+
+Los ETag son fuertes y salen de datos que la BD ya mantiene (`updated_at`
+del gasto, que los triggers actualizan también cuando cambian recibos o
+comentarios; las listas, de los contadores de `list_versions`), no del
+cuerpo de la respuesta, así que se pueden comparar antes de hacer la
+consulta completa.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+# El cliente puede guardar la respuesta, pero debe revalidarla siempre
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """ETag fuerte a partir de los valores que identifican una versión"""
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Si el ETag actual está en If-None-Match
+
+    Comparación débil (RFC 9110): `W/"x"` coincide con `"x"`. `*` coincide
+    con cualquier versión.
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified(etag: str) -> Response:
+    """304 sin cuerpo con el mismo ETag"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
@@ -185,53 +185,11 @@ def parse_mexican_amount(amount_str: str) -> Optional[float]:
     except:
         return None
 
-# Diccionario de comercios comunes y sus categorías sugeridas
-MERCHANT_CATEGORIES = {
-    # Comida
-    'OXXO': 'Comida',
-    'SEVEN ELEVEN': 'Comida',
-    'STARBUCKS': 'Comida',
-    'MCDONALD': 'Comida',
-    'BURGER KING': 'Comida',
-    'DOMINOS': 'Comida',
-    'SUBWAY': 'Comida',
-
-    # Supermercados
-    'WALMART': 'Compras',
-    'SORIANA': 'Compras',
-    'CHEDRAUI': 'Compras',
-    'COSTCO': 'Compras',
-    'SAMS CLUB': 'Compras',
-
-    # Transporte
-    'UBER': 'Transporte',
-    'DIDI': 'Transporte',
-    'CABIFY': 'Transporte',
-
-    # Entretenimiento
-    'NETFLIX': 'Entretenimiento',
-    'SPOTIFY': 'Entretenimiento',
-    'CINEPOLIS': 'Entretenimiento',
-    'CINEMEX': 'Entretenimiento',
-
-    # Tiendas
-    'LIVERPOOL': 'Compras',
-    'PALACIO DE HIERRO': 'Compras',
-    'SUBURBIA': 'Compras',
-
-    # Tech/Online
-    'AMAZON': 'Compras',
-    'MERCADO LIBRE': 'Compras',
-}
-
 def suggest_category_from_merchant(merchant_name: str) -> Optional[str]:
     """
     Sugiere una categoría basada en el nombre del comercio
+    (catálogo compartido, ver app/services/merchant_catalog.py)
     """
-    merchant_upper = merchant_name.upper()
-
-    for key, category in MERCHANT_CATEGORIES.items():
-        if key in merchant_upper:
-            return category
+    from app.services.merchant_catalog import merchant_catalog
 
-    return None
+    return merchant_catalog.category_for_merchant(merchant_name)
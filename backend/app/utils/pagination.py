@@ -0,0 +1,83 @@
+"""
+Paginación por cursor (keyset) para listas ordenadas por (date DESC, id)
+
+Con OFFSET, PostgreSQL lee y descarta todas las filas anteriores (la página
+N cuesta N veces la 1) y, si alguien inserta un gasto mientras se pagina,
+las filas se recorren y se saltan o repiten. Con keyset cada página empieza
+justo después de la última fila vista:
+
+    date <= d  AND  (date < d  OR  (date = d AND id > i))
+
+PostgreSQL no usa un OR como límite de un recorrido de índice, así que el
+`date <= d` (redundante) es el que hace que, con el índice (project_id, date
+DESC, id), el recorrido empiece en el cursor sin importar qué tan profunda
+sea la página; el OR solo descarta las filas de la fecha del cursor que ya
+se vieron. `id` desempata gastos con la misma
+fecha, así que el orden es total y estable.
+
+El cursor es opaco para el cliente (base64 de la fecha y el id de la última
+fila): solo se devuelve tal cual en `cursor=`.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Dict, List
+from uuid import UUID
+
+
+class InvalidCursorError(ValueError):
+    """Cursor que no se generó con encode_cursor (o alterado)"""
+
+
+def encode_cursor(row: Dict) -> str:
+    """Cursor que apunta después de `row` (necesita `date` e `id`)"""
+    payload = json.dumps({"d": row["date"], "i": str(row["id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """
+    Returns:
+        {"date": ..., "id": ...} de la última fila de la página anterior
+
+    Raises:
+        InvalidCursorError: Si el cursor no es válido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Validar ambos valores: van dentro del filtro de PostgREST
+        datetime.fromisoformat(payload["d"])
+        return {"date": payload["d"], "id": str(UUID(payload["i"]))}
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursorError("Cursor inválido")
+
+
+def keyset_filter(after: Dict) -> str:
+    """
+    Filtro `or` de PostgREST para las filas después de `after` en el orden
+    (date DESC, id ASC). Va junto con `.lte("date", after["date"])`, que es
+    el límite que usa el índice
+
+    Los valores van entre comillas porque la fecha trae `:` y `+`, que
+    PostgREST reserva en expresiones lógicas.
+    """
+    date, expense_id = after["date"], after["id"]
+    return f'date.lt."{date}",and(date.eq."{date}",id.gt."{expense_id}")'
+
+
+def page(rows: List[Dict], limit: int) -> Dict:
+    """
+    Recorta una consulta hecha con `limit + 1` filas
+
+    Returns:
+        {"data": filas de la página, "next_cursor": cursor o None}
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "data": rows,
+        "next_cursor": encode_cursor(rows[-1]) if has_more and rows else None,
+    }
+
@@ -0,0 +1,169 @@
+"""
+Índice invertido de trigramas para búsqueda aproximada de nombres
+
+Para textos de OCR con errores ("0XXO", "WAL MART", "CHEDRAVI") donde la
+búsqueda exacta de subcadenas falla. En lugar de comparar contra cada nombre
+del catálogo (distancia de edición par a par), cada nombre se parte en
+trigramas de caracteres y se indexa trigrama -> nombres. Una consulta solo
+toca las listas de los trigramas que aparecen en el texto, así que el costo
+depende del texto y no del tamaño del catálogo.
+
+Antes de sacar trigramas, texto y nombres se normalizan igual: mayúsculas,
+sin acentos, sin espacios ni puntuación y con los caracteres que el OCR suele
+confundir unificados (0/O, 1/I, 5/S, 8/B, V/U).
+
+El índice solo propone candidatos (comparten trigramas con el texto); cada
+uno se califica contra ventanas de palabras seguidas del texto de largo
+parecido al nombre, con Dice sobre los trigramas en orden. Compartir
+trigramas sueltos no basta: "FARMACIA LA CIMA" comparte ALA, LAC y ACI con
+"PALACIO DE HIERRO", pero ni en una ventana de su largo ni en orden forman
+el nombre.
+"""
+
+import unicodedata
+from collections import Counter
+from itertools import chain
+from typing import Dict, Generic, Iterable, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Largo de las ventanas del texto que se comparan con un nombre, relativo al
+# nombre: "AHORRO" solo no se compara con "DEL AHORRO"
+WINDOW_MIN_RATIO = 0.75
+WINDOW_MAX_RATIO = 4 / 3
+
+# Confusiones típicas del OCR en nombres de comercios
+_CONFUSABLES = str.maketrans({
+    "0": "O",
+    "1": "I",
+    "|": "I",
+    "5": "S",
+    "8": "B",
+    "V": "U",
+})
+
+
+def normalize(text: str) -> str:
+    """'Wal Mart' -> 'WALMART', '0XXO' -> 'OXXO', 'Cinépolis' -> 'CINEPOLIS'"""
+    text = unicodedata.normalize("NFKD", text.upper())
+    text = "".join(char for char in text if char.isalnum() or char in "&|")
+    return text.translate(_CONFUSABLES)
+
+
+def trigrams(normalized: str) -> Set[str]:
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+
+def trigram_sequence(normalized: str) -> List[str]:
+    """Trigramas en el orden en que aparecen (con repetidos)"""
+    return [normalized[i:i + 3] for i in range(len(normalized) - 2)]
+
+
+def ordered_dice(a: List[str], b: List[str]) -> float:
+    """
+    Dice sobre trigramas en orden: 2 * LCS / (|a| + |b|)
+
+    Simétrica (un texto más largo que el nombre baja la similitud) y solo
+    cuenta trigramas compartidos que aparecen en el mismo orden.
+    """
+    if not a or not b:
+        return 0.0
+    previous = [0] * (len(b) + 1)
+    for gram in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if gram == other else max(previous[j + 1], current[j]))
+        previous = current
+    return 2 * previous[-1] / (len(a) + len(b))
+
+
+class TrigramIndex(Generic[T]):
+    """
+    Índice de nombres (normalizados) -> valor
+
+    La similitud es la mejor `ordered_dice` entre el nombre y una ventana de
+    palabras seguidas del texto de largo parecido (3/4 a 4/3 del nombre), así
+    que un renglón de encabezado con más cosas ("0XXO TIENDA 1234") sigue
+    encontrando el nombre sin que el resto del renglón cuente.
+
+    Ejemplo:
+        index = TrigramIndex([("CHEDRAUI", 0), ("SORIANA", 1)])
+        index.best_match("TIENDAS CHEDRAVI SUC 12")  # (0, 1.0)
+    """
+
+    def __init__(self, names: Iterable[Tuple[str, T]], min_length: int = 4):
+        # Nombres muy cortos ("BP", "KFC") dan demasiados falsos positivos
+        self._postings: Dict[str, List[int]] = {}
+        self._values: List[T] = []
+        self._sizes: List[int] = []
+        self._sequences: List[List[str]] = []
+
+        for name, value in names:
+            normalized = normalize(name)
+            grams = trigrams(normalized)
+            if len(normalized) < min_length or not grams:
+                continue
+
+            entry = len(self._values)
+            self._values.append(value)
+            self._sizes.append(len(grams))
+            self._sequences.append(trigram_sequence(normalized))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(entry)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def matches(self, text: str, threshold: float, min_shared: int = 3) -> List[Tuple[T, float]]:
+        """
+        Nombres con similitud >= threshold, de mayor a menor similitud
+
+        Con min_shared, un nombre de pocos trigramas tiene que aparecer
+        completo (un solo trigrama en común no basta).
+        """
+        words = [word for word in map(normalize, text.split()) if word]
+        grams = trigrams("".join(words))
+        postings = self._postings
+        shared = Counter(chain.from_iterable(postings[gram] for gram in grams if gram in postings))
+        candidates = [
+            entry for entry, count in shared.items()
+            if count >= min(min_shared, self._sizes[entry])
+        ]
+        if not candidates:
+            return []
+
+        # Ventanas de palabras seguidas ("WAL MART" -> "WALMART"), hasta el
+        # largo máximo del nombre candidato más largo
+        longest = max(len(self._sequences[entry]) + 2 for entry in candidates)
+        windows: List[Tuple[int, List[str]]] = []
+        for start in range(len(words)):
+            joined = ""
+            for word in words[start:]:
+                joined += word
+                if len(joined) > longest * WINDOW_MAX_RATIO:
+                    break
+                windows.append((len(joined), trigram_sequence(joined)))
+
+        results = []
+        for entry in candidates:
+            sequence = self._sequences[entry]
+            length = len(sequence) + 2
+            low, high = length * WINDOW_MIN_RATIO, length * WINDOW_MAX_RATIO
+            score = max(
+                (ordered_dice(window, sequence) for size, window in windows if low <= size <= high),
+                default=0.0,
+            )
+            if score >= threshold:
+                results.append((entry, score))
+
+        # Mayor similitud primero; en empate, el que se indexó antes. Un valor
+        # puede tener varios nombres (variantes): solo cuenta el mejor
+        results.sort(key=lambda item: (-item[1], item[0]))
+        best: Dict[T, float] = {}
+        for entry, score in results:
+            best.setdefault(self._values[entry], score)
+        return list(best.items())
+
+    def best_match(self, text: str, threshold: float = 0.65) -> Optional[Tuple[T, float]]:
+        found = self.matches(text, threshold)
+        return found[0] if found else None
@@ -0,0 +1,19 @@
+"""
+Benchmarks del backend
+
+Se ejecutan desde `backend/` con `python -m benchmarks.<nombre>`. No hacen
+llamadas reales a Document AI ni a Supabase, así que si no hay `.env` se usan
+valores de relleno para poder importar la app.
+"""
+import os
+
+for _key, _value in {
+    "SUPABASE_URL": "https://benchmark.supabase.co",
+    "SUPABASE_KEY": "benchmark",
+    "SUPABASE_SERVICE_KEY": "benchmark",
+    "SECRET_KEY": "benchmark",
+    "GOOGLE_APPLICATION_CREDENTIALS": "",
+    "GOOGLE_PROJECT_ID": "benchmark",
+    "DOCUMENT_AI_PROCESSOR_ID": "benchmark",
+}.items():
+    os.environ.setdefault(_key, _value)
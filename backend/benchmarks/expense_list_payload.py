@@ -0,0 +1,215 @@
+"""
+Benchmark: bytes y latencia de una página de GET /api/expenses según la proyección
+
+Levanta un PostgREST falso en localhost que respeta `select=` (columnas,
+`*` y relaciones embebidas) con gastos realistas: recibos con `ocr_text` y
+`ocr_data` de Document AI y comentarios. Compara la proyección anterior
+(`*, receipts(*), comments(*)`) con la lista por default y con `include=`,
+midiendo los bytes de la respuesta de la API y la latencia promedio.
+
+Uso:
+    python -m benchmarks.expense_list_payload --rows 50 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import statistics
+import threading
+import time
+from urllib.parse import parse_qs
+
+import httpx
+import uvicorn
+
+from main import app
+from app.config import settings
+from app.database import Database, get_db
+from app.routers import expenses as expenses_router
+
+LEGACY_SELECT = "*, receipts(*), comments(*)"
+
+
+def make_expenses(rows: int):
+    random.seed(7)
+    expenses = []
+    for i in range(rows):
+        expense_id = f"00000000-0000-0000-0000-{i:012d}"
+        lines = [f"{random.choice(['TORTILLA', 'LECHE', 'PAN', 'REFRESCO', 'HUEVO'])} {random.randint(1, 9)} "
+                 f"${random.randint(10, 300)}.00" for _ in range(40)]
+        ocr_text = "OXXO TIENDA 1234\nRFC CCO8605231N4\nAV. REFORMA 222 CDMX\n" + "\n".join(lines)
+        expenses.append({
+            "id": expense_id,
+            "user_id": "00000000-0000-0000-0000-000000000000",
+            "project_id": "00000000-0000-0000-0000-000000000001",
+            "category_id": "00000000-0000-0000-0000-0000000000c1",
+            "name": f"OXXO {i}",
+            "description": "Compra de despensa",
+            "amount": f"{random.randint(50, 3000)}.50",
+            "date": f"2025-01-{1 + i % 28:02d}T13:45:00+00:00",
+            "merchant_name": "OXXO",
+            "merchant_address": "Av. Reforma 222, CDMX",
+            "tax_amount": "16.00",
+            "payment_method": "card",
+            "rfc": "CCO8605231N4",
+            "is_deductible": False,
+            "has_invoice": False,
+            "invoice_uuid": None,
+            "category_confidence": "0.92",
+            "is_recurring": False,
+            "is_anomaly": False,
+            "external_id": None,
+            "created_at": "2025-01-15T13:45:00+00:00",
+            "updated_at": "2025-01-15T13:45:00+00:00",
+            "categories": {"id": "00000000-0000-0000-0000-0000000000c1", "name": "Comida",
+                           "icon": "🍔", "color": "#FF6B6B", "user_id": None, "is_system": True},
+            "receipts": [{
+                "id": f"10000000-0000-0000-0000-{i:012d}",
+                "expense_id": expense_id,
+                "image_url": f"https://example.supabase.co/storage/v1/object/public/receipts/receipt_{i}.jpeg",
+                "thumbnail_url": None,
+                "ocr_text": ocr_text,
+                "ocr_data": {
+                    "merchant_name": "OXXO", "rfc": "CCO8605231N4", "total_amount": 245.5,
+                    "line_items": [{"description": line, "amount": 10.0} for line in lines],
+                    "docai_hints": {"merchant_name": "OXXO TIENDA", "total_amount": 245.5, "date": "2025-01-15"},
+                },
+                "created_at": "2025-01-15T13:45:00+00:00",
+            }],
+            "comments": [{
+                "id": f"20000000-0000-0000-{c:04d}-{i:012d}",
+                "expense_id": expense_id,
+                "user_id": "00000000-0000-0000-0000-000000000000",
+                "text": "Revisar con contabilidad si es deducible",
+                "created_at": "2025-01-15T13:45:00+00:00",
+                "updated_at": "2025-01-15T13:45:00+00:00",
+            } for c in range(3)],
+        })
+    return expenses
+
+
+def split_select(select: str):
+    """'a, b(c, d), e' -> ['a', 'b(c, d)', 'e'] (comas de primer nivel)"""
+    items, depth, current = [], 0, ""
+    for char in select:
+        if char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def project(row, select: str, embeds=("receipts", "comments", "categories")):
+    """Aplica un `select=` de PostgREST a una fila (incluye relaciones)"""
+    result = {}
+    for item in split_select(select):
+        if "(" in item:
+            head, inner = item.split("(", 1)
+            alias, _, table = head.rpartition(":")
+            value = row[table.strip()]
+            inner = inner[:-1]
+            result[(alias or table).strip()] = (
+                [project(child, inner) for child in value] if isinstance(value, list) else project(value, inner)
+            )
+        elif item == "*":
+            result.update({key: value for key, value in row.items() if key not in embeds})
+        else:
+            result[item] = row[item]
+    return result
+
+
+def fake_postgrest(expenses):
+    version = json.dumps({"count": len(expenses), "updated_at": expenses[0]["updated_at"]}).encode()
+
+    async def asgi(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if "/rpc/" in scope["path"]:
+            # Versión de la lista (expenses_list_version, para el ETag)
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": version})
+            return
+        params = parse_qs(scope["query_string"].decode())
+        limit = int(params.get("limit", ["50"])[0])
+        rows = [project(row, params["select"][0]) for row in expenses[:limit]]
+        body = json.dumps(rows).encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    return asgi
+
+
+def start_server(expenses) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(fake_postgrest(expenses), host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int):
+    response = await client.get(path)
+    response.raise_for_status()
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        (await client.get(path)).raise_for_status()
+        timings.append((time.perf_counter() - start) * 1000)
+    return len(response.content), statistics.mean(timings), statistics.quantiles(timings, n=20)[-1]
+
+
+async def main(rows: int, requests: int) -> None:
+    url = start_server(make_expenses(rows))
+    database = Database(url, settings.supabase_key, http2=False)
+    app.dependency_overrides[get_db] = lambda: database.client
+    path = f"/api/expenses/?limit={rows}"
+
+    cases = [
+        ("antes: *, receipts(*), comments(*)", path, LEGACY_SELECT),
+        ("default (lista)", path, None),
+        ("include=category", f"{path}&include=category", None),
+        ("include=category,receipts", f"{path}&include=category,receipts", None),
+    ]
+
+    print(f"Página de {rows} gastos, {requests} requests por caso\n")
+    print(f"{'caso':<38} {'bytes':>10} {'prom (ms)':>10} {'p95 (ms)':>10}")
+
+    list_select = expenses_router._list_select
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        baseline = None
+        for name, case_path, forced_select in cases:
+            if forced_select:
+                expenses_router._list_select = lambda fields, include: forced_select
+            try:
+                size, mean, p95 = await measure(client, case_path, requests)
+            finally:
+                expenses_router._list_select = list_select
+
+            baseline = baseline or (size, mean)
+            print(f"{name:<38} {size:>10,} {mean:>10.2f} {p95:>10.2f}   "
+                  f"({size / baseline[0]:.1%} bytes, {mean / baseline[1]:.1%} tiempo)")
+
+    await database.close()
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.requests))
@@ -0,0 +1,103 @@
+"""
+Benchmark: GET /api/expenses concurrente según el tamaño del pool
+
+Levanta un PostgREST falso en localhost (uvicorn, responde después de
+--latency segundos, como un round trip real a Supabase) y manda N requests
+concurrentes a /api/expenses con el cliente async de app.database, variando
+SUPABASE_HTTP_MAX_CONNECTIONS. Con 1 conexión los requests se atienden uno
+tras otro (como con el cliente síncrono anterior); con más conexiones el
+throughput debe crecer hasta el límite de concurrencia.
+
+Uso:
+    python -m benchmarks.expenses_concurrency --requests 200 --connections 1 4 16 64
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from main import app
+from app.config import settings
+from app.database import Database, get_db
+
+FAKE_EXPENSES = [
+    {"id": f"00000000-0000-0000-0000-{i:012d}", "name": f"Gasto {i}", "amount": "125.50",
+     "date": "2025-01-15T13:45:00+00:00", "receipts": [], "comments": []}
+    for i in range(20)
+]
+
+
+def fake_postgrest(latency: float):
+    """App ASGI mínima que contesta cualquier GET con una lista de gastos"""
+    body = json.dumps(FAKE_EXPENSES).encode()
+    # Versión de la lista (rpc/expenses_list_version, para el ETag)
+    version = json.dumps({"count": len(FAKE_EXPENSES), "updated_at": "2025-01-15T13:45:00+00:00"}).encode()
+
+    async def asgi(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await asyncio.sleep(latency)
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": version if "/rpc/" in scope["path"] else body})
+
+    return asgi
+
+
+def start_server(latency: float) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(
+        fake_postgrest(latency), host="127.0.0.1", port=port, log_level="error", backlog=4096
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run(url: str, connections: int, requests: int) -> float:
+    database = Database(url, settings.supabase_key, max_connections=connections,
+                        max_keepalive_connections=connections, http2=False)
+    app.dependency_overrides[get_db] = lambda: database.client
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Calentar: abrir las conexiones del pool
+        await asyncio.gather(*(client.get("/api/expenses/") for _ in range(connections)))
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get("/api/expenses/") for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    await database.close()
+    app.dependency_overrides.pop(get_db, None)
+    for response in responses:
+        response.raise_for_status()
+    return elapsed
+
+
+async def main(requests: int, connections_list, latency: float) -> None:
+    url = start_server(latency)
+    print(f"{requests} GET /api/expenses concurrentes, latencia de PostgREST {latency * 1000:.0f} ms\n")
+    print(f"{'conexiones':>10} {'tiempo (s)':>11} {'req/s':>8}")
+
+    for connections in connections_list:
+        elapsed = await run(url, connections, requests)
+        print(f"{connections:>10} {elapsed:>11.2f} {requests / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia simulada de PostgREST (s)")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.connections, args.latency))
@@ -0,0 +1,107 @@
+"""
+Benchmark: búsqueda aproximada de comercios (índice de trigramas)
+
+Construye un catálogo sintético de N comercios, genera encabezados de recibo
+con el nombre alterado como lo haría el OCR (O->0, I->1, espacios de más,
+una letra cambiada) y mide por recibo:
+- Latencia de la búsqueda aproximada sobre los renglones del encabezado
+- Aciertos (se recupera el comercio original)
+- Falsos positivos en encabezados sin comercio del catálogo
+
+Uso:
+    python -m benchmarks.merchant_fuzzy --sizes 45 1000 10000 --receipts 500
+"""
+import argparse
+import random
+import string
+import time
+
+from app.services.merchant_catalog import MerchantIndex
+
+HEADER_NOISE = [
+    "TICKET DE VENTA", "SUCURSAL CENTRO", "AV. INSURGENTES SUR 1234", "COL. DEL VALLE",
+    "MEXICO CDMX CP 03100", "TEL 55 1234 5678", "CAJERO: MARIA LOPEZ", "FOLIO 000123",
+]
+
+
+def synthetic_catalog(size: int, rng: random.Random) -> dict:
+    names = set()
+    while len(names) < size:
+        words = ["".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, 9)))
+                 for _ in range(rng.randint(1, 2))]
+        names.add(" ".join(words))
+    return {
+        "merchants": [
+            {"name": name, "category": "Compras", "confidence": 0.95, "keywords": [name.lower()]}
+            for name in sorted(names)
+        ],
+        "category_keywords": {},
+    }
+
+
+def garble(name: str, rng: random.Random) -> str:
+    """Errores típicos de OCR: confusiones, espacios y una letra cambiada"""
+    chars = list(name.replace("O", "0").replace("I", "1"))
+    if len(chars) > 5:
+        position = rng.randrange(len(chars))
+        chars[position] = rng.choice(string.ascii_uppercase)
+    if len(chars) > 4 and rng.random() < 0.5:
+        chars.insert(rng.randrange(1, len(chars)), " ")
+    return "".join(chars)
+
+
+def header(first_line: str, rng: random.Random) -> list:
+    return [first_line] + rng.sample(HEADER_NOISE, 5)
+
+
+def lookup(index: MerchantIndex, lines: list, threshold: float):
+    best = None
+    for line in lines:
+        found = index.fuzzy_names.best_match(line, threshold)
+        if found and (best is None or found[1] > best[1]):
+            best = found
+    return best
+
+
+def main(sizes, receipts: int, threshold: float) -> None:
+    print(f"{receipts} recibos por tamaño, umbral {threshold}\n")
+    print(f"{'comercios':>10} {'índice (ms)':>12} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'aciertos':>9} {'falsos +':>9}")
+
+    for size in sizes:
+        rng = random.Random(size)
+        data = synthetic_catalog(size, rng)
+
+        start = time.perf_counter()
+        index = MerchantIndex.from_dict(data)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        hits = 0
+        for _ in range(receipts):
+            position = rng.randrange(size)
+            lines = header(garble(index.merchants[position]["name"], rng), rng)
+            start = time.perf_counter()
+            found = lookup(index, lines, threshold)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += bool(found and found[0] == position)
+
+        false_positives = sum(
+            lookup(index, header("ABARROTES " + "".join(rng.choice(string.ascii_uppercase) for _ in range(6)), rng), threshold)
+            is not None
+            for _ in range(receipts)
+        )
+
+        latencies.sort()
+        print(f"{size:>10} {build_ms:>12.1f} {latencies[len(latencies) // 2]:>9.3f} "
+              f"{latencies[int(len(latencies) * 0.99)]:>9.3f} {hits / receipts:>8.1%} "
+              f"{false_positives / receipts:>8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[45, 1000, 10000])
+    parser.add_argument("--receipts", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=0.65)
+    args = parser.parse_args()
+    main(args.sizes, args.receipts, args.threshold)
@@ -0,0 +1,82 @@
+"""
+Benchmark: búsqueda de comercios en el texto de un recibo vs tamaño del catálogo
+
+Compara el recorrido original (`keyword.upper() in text_upper` por cada
+palabra clave de cada comercio) contra KeywordMatcher (una sola regex con
+todas las palabras clave) con catálogos sintéticos de distintos tamaños. El
+texto no contiene ningún comercio del catálogo (peor caso: hay que revisar
+todo).
+
+Uso:
+    python -m benchmarks.merchant_matching --sizes 36 1000 5000 --text-kb 8
+"""
+import argparse
+import random
+import string
+import time
+
+from app.utils.keyword_matcher import KeywordMatcher
+
+
+def synthetic_catalog(size: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    catalog = {}
+    while len(catalog) < size:
+        name = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(5, 12)))
+        catalog[name] = {"keywords": [name.lower(), f"{name.lower()} sa de cv"], "category": "Compras"}
+    return catalog
+
+
+def synthetic_receipt(kilobytes: int, seed: int = 11) -> str:
+    rng = random.Random(seed)
+    lines = []
+    while sum(len(line) + 1 for line in lines) < kilobytes * 1024:
+        lines.append(f"{rng.randint(1, 9)} ARTICULO {rng.randint(1000, 9999)}   ${rng.randint(1, 999)}.{rng.randint(10, 99)}")
+    return "\n".join(lines)
+
+
+def nested_loops(catalog: dict, text: str):
+    text_upper = text.upper()
+    for merchant, data in catalog.items():
+        for keyword in data["keywords"]:
+            if keyword.upper() in text_upper:
+                return merchant
+    return None
+
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(sizes, text_kb: int, repeat: int) -> None:
+    text = synthetic_receipt(text_kb)
+    print(f"Texto: {len(text) / 1024:.1f} KB, {repeat} repeticiones\n")
+    print(f"{'comercios':>10} {'loops (ms)':>12} {'regex (ms)':>14} {'construcción (ms)':>18}")
+
+    for size in sizes:
+        catalog = synthetic_catalog(size)
+        entries = list(catalog)
+
+        start = time.perf_counter()
+        matcher = KeywordMatcher(
+            (keyword.upper(), index)
+            for index, merchant in enumerate(entries)
+            for keyword in catalog[merchant]["keywords"]
+        )
+        build_ms = (time.perf_counter() - start) * 1000
+
+        loops_ms = timed(lambda: nested_loops(catalog, text), repeat)
+        regex_ms = timed(lambda: matcher.min_value(text.upper()), repeat)
+        print(f"{size:>10} {loops_ms:>12.3f} {regex_ms:>14.3f} {build_ms:>18.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[36, 1000, 5000, 10000])
+    parser.add_argument("--text-kb", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.sizes, args.text_kb, args.repeat)
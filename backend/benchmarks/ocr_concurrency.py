@@ -0,0 +1,117 @@
+"""
+Benchmark: N llamadas concurrentes a /api/ocr/scan
+
+Usa ReplayBackend (sin red ni cuota de Document AI): cada llamada bloquea un
+hilo la latencia indicada, igual que el cliente real, y regresa un documento
+grabado. Mide:
+- Tiempo de 1 scan
+- Tiempo de N scans concurrentes (debe ser ~1 scan mientras N <= OCR_MAX_CONCURRENCY)
+- Latencia de /health mientras hay scans en vuelo
+
+Con --recordings se reproducen respuestas reales grabadas con
+OCR_BACKEND=record; sin él, se usa un recibo de ejemplo. Con --profile se
+imprime el perfil (cProfile) de la corrida concurrente.
+
+Uso:
+    python -m benchmarks.ocr_concurrency --requests 8 --latency 1.5
+    python -m benchmarks.ocr_concurrency --recordings ocr_recordings --requests 50 --profile
+"""
+import argparse
+import asyncio
+import cProfile
+import pstats
+import time
+import uuid
+
+import httpx
+from google.cloud import documentai_v1 as documentai
+
+from main import app
+from app.services.ocr_backends import ReplayBackend
+from app.services.ocr_service import ocr_service
+
+RECEIPT_TEXT = """OXXO
+CADENA COMERCIAL OXXO S.A. DE C.V.
+RFC: CCO8605231N4
+FECHA: 15/01/2025
+TOTAL $125.50
+"""
+
+
+def build_backend(recordings: str, latency: float) -> ReplayBackend:
+    if recordings:
+        backend = ReplayBackend(directory=recordings, latency_ms=latency * 1000)
+        if not len(backend):
+            raise SystemExit(f"No hay grabaciones en {recordings}")
+        return backend
+
+    return ReplayBackend(
+        latency_ms=latency * 1000,
+        documents={"ejemplo": documentai.Document(text=RECEIPT_TEXT)}
+    )
+
+
+async def scan(client: httpx.AsyncClient, index: int) -> float:
+    # Bytes distintos por llamada para no pegarle al cache de OCR
+    image_bytes = b"\xff\xd8\xff\xe0fake-jpeg-" + uuid.uuid4().bytes
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/ocr/scan",
+        files={"file": (f"receipt_{index}.jpg", image_bytes, "image/jpeg")},
+    )
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def health_while_busy(client: httpx.AsyncClient, busy: asyncio.Task) -> list:
+    latencies = []
+    while not busy.done():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+    return latencies
+
+
+async def main(requests: int, latency: float, recordings: str, profile: bool) -> None:
+    ocr_service.backend = build_backend(recordings, latency)
+    profiler = cProfile.Profile() if profile else None
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single = await scan(client, 0)
+
+        if profiler:
+            profiler.enable()
+        start = time.perf_counter()
+        busy = asyncio.ensure_future(asyncio.gather(*(scan(client, i) for i in range(requests))))
+        health = await health_while_busy(client, busy)
+        durations = sorted(await busy)
+        concurrent = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+
+    print(f"Latencia simulada de Document AI: {latency:.2f}s")
+    print(f"OCR_MAX_CONCURRENCY:              {ocr_service.max_concurrency}")
+    print(f"1 scan:                           {single:.2f}s")
+    print(f"{f'{requests} scans concurrentes:':<34}{concurrent:.2f}s "
+          f"({concurrent / single:.2f}x un scan, secuencial serían {requests}x)")
+    print(f"Throughput:                       {requests / concurrent:.1f} scans/s "
+          f"(p50 {durations[len(durations) // 2]:.2f}s, p95 {durations[int(len(durations) * 0.95)]:.2f}s)")
+    if health:
+        print(f"/health durante los scans:        max {max(health) * 1000:.1f}ms "
+              f"en {len(health)} llamadas")
+
+    if profiler:
+        print()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=8, help="Scans concurrentes")
+    parser.add_argument("--latency", type=float, default=1.5, help="Latencia simulada de Document AI (s)")
+    parser.add_argument("--recordings", default="", help="Directorio con grabaciones de OCR_BACKEND=record")
+    parser.add_argument("--profile", action="store_true", help="Imprimir perfil de la corrida concurrente")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency, args.recordings, args.profile))
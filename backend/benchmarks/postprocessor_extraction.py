@@ -0,0 +1,133 @@
+"""
+Benchmark: extracción de RFC, monto, fecha y razón social en recibos largos
+
+Compara el recorrido original (una búsqueda por patrón y por campo, con
+`text.upper()` por cada patrón de RFC) contra ReceiptTextScanner (una sola
+pasada que emite candidatos para todos los campos). El texto simula recibos
+de varias páginas: renglones de artículos y, al final, totales, fecha y RFC
+(peor caso para el recorrido original, que revisa todo el texto por patrón).
+
+Uso:
+    python -m benchmarks.postprocessor_extraction --pages 1 5 20 --repeat 50
+"""
+import argparse
+import random
+import re
+import time
+from datetime import datetime
+
+from app.services.ocr_postprocessor import ocr_postprocessor
+from app.services.receipt_text_scanner import receipt_text_scanner
+
+# Patrones del recorrido original (ocr_postprocessor antes del escáner)
+LEGACY_RFC_PATTERNS = [
+    r'\b([A-ZÑ&]{3,4})-?(\d{6})-?([A-Z0-9]{3})\b',
+    r'\b([A-ZÑ&]{3,4})(\d{6})([A-Z0-9]{3})\b',
+    r'\b([A-ZÑ&]{3,4})-?(\d{6})\b',
+]
+LEGACY_AMOUNT_PATTERNS = [
+    r'(?:total|TOTAL)[:\s]*\$?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+    r'(?:importe|IMPORTE)[:\s]*\$?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+    r'\$\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+]
+LEGACY_DATE_PATTERNS = [
+    (r'(\d{2})/(\d{2})/(\d{4})', '%d/%m/%Y'),
+    (r'(\d{2})-(\d{2})-(\d{4})', '%d-%m-%Y'),
+    (r'(\d{4})-(\d{2})-(\d{2})', '%Y-%m-%d'),
+]
+LEGACY_COMPANY_PATTERN = r'([A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑa-záéíóúñ\s&.,-]{2,50})\s*(?:S\.?\s*A\.?|S\.?\s*DE\s*R\.?\s*L\.?|S\.?\s*A\.?\s*DE\s*C\.?\s*V\.?)'
+
+
+def synthetic_receipt(pages: int, seed: int = 3) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for page in range(pages):
+        lines.append(f"PAGINA {page + 1} DE {pages}")
+        for _ in range(60):
+            lines.append(
+                f"{rng.randint(1, 9)} ARTICULO {rng.randint(1000, 9999)} "
+                f"SKU-{rng.randint(100000, 999999)}   ${rng.randint(1, 999)}.{rng.randint(10, 99)}"
+            )
+    lines += [
+        "SUBTOTAL $12,345.67",
+        "IVA $1,975.31",
+        "TOTAL: $14,320.98",
+        "FECHA 15/01/2025 13:45",
+        "COMERCIALIZADORA DEL NORTE S.A. DE C.V.",
+        "RFC: CDN-860523-1N4",
+    ]
+    return "\n".join(lines)
+
+
+def legacy_fields(text: str):
+    rfc = None
+    for pattern in LEGACY_RFC_PATTERNS:
+        for match in re.finditer(pattern, text.upper()):
+            rfc = "".join(match.groups())
+            break
+        if rfc:
+            break
+
+    amounts = []
+    for pattern in LEGACY_AMOUNT_PATTERNS:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            amount = float(match.group(1).replace(',', ''))
+            if 0.01 <= amount <= 999999:
+                amounts.append(amount)
+
+    date = None
+    for pattern, date_format in LEGACY_DATE_PATTERNS:
+        for match in re.finditer(pattern, text):
+            try:
+                parsed = datetime.strptime(match.group(0), date_format)
+            except ValueError:
+                continue
+            if datetime(2020, 1, 1) <= parsed <= datetime.now():
+                date = parsed.isoformat()
+                break
+        if date:
+            break
+
+    company = re.search(LEGACY_COMPANY_PATTERN, text)
+    return rfc, max(amounts) if amounts else None, date, company.group(1).strip() if company else None
+
+
+def scanner_fields(text: str):
+    scan = receipt_text_scanner.scan(text)
+    rfc, _ = ocr_postprocessor.extract_rfc(text, scan=scan)
+    amount, _ = ocr_postprocessor.extract_total_amount(text, scan=scan)
+    date, _ = ocr_postprocessor.extract_date(text, scan=scan)
+    company = scan.company
+    return rfc, amount, date, company[1] if company else None
+
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(pages_list, repeat: int) -> None:
+    print(f"{repeat} repeticiones por tamaño\n")
+    print(f"{'páginas':>8} {'KB':>7} {'original (ms)':>14} {'una pasada (ms)':>16} {'speedup':>8} {'process (ms)':>13}")
+
+    for pages in pages_list:
+        text = synthetic_receipt(pages)
+        if legacy_fields(text) != scanner_fields(text):
+            raise SystemExit(f"Resultados distintos con {pages} páginas: "
+                             f"{legacy_fields(text)} vs {scanner_fields(text)}")
+
+        legacy_ms = timed(lambda: legacy_fields(text), repeat)
+        scanner_ms = timed(lambda: scanner_fields(text), repeat)
+        process_ms = timed(lambda: ocr_postprocessor.process({}, text), repeat)
+        print(f"{pages:>8} {len(text) / 1024:>7.1f} {legacy_ms:>14.3f} {scanner_ms:>16.3f} "
+              f"{legacy_ms / scanner_ms:>7.2f}x {process_ms:>13.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    main(args.pages, args.repeat)
@@ -0,0 +1,103 @@
+"""
+Benchmark: memoria del worker con uploads grandes concurrentes
+
+Manda N archivos de M MB a la vez a /api/ocr/scan (OCR con ReplayBackend, sin
+red) y mide el pico de memoria de Python (tracemalloc) durante la corrida,
+descontando los payloads que arma el propio cliente. Se corre dos veces:
+- en memoria: OCR_UPLOAD_SPOOL_BYTES enorme, todo se lee con un solo
+  `file.read()` (el comportamiento anterior)
+- streaming: arriba de OCR_UPLOAD_SPOOL_BYTES el archivo se mapea desde disco
+
+Los archivos no son JPEG válidos, así que el preprocesamiento los deja pasar
+tal cual: se mide lo que cuesta retener el upload durante el flujo, no la
+decodificación de Pillow.
+
+Uso:
+    python -m benchmarks.upload_memory --requests 8 --size-mb 20
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+import httpx
+from google.cloud import documentai_v1 as documentai
+
+from main import app
+from app.services.ocr_backends import ReplayBackend
+from app.services.ocr_service import ocr_service
+from app.services.upload_intake import upload_intake
+
+RECEIPT_TEXT = "OXXO\nTOTAL $125.50\n"
+BOUNDARY = "benchmark-boundary"
+CHUNK_BYTES = 64 * 1024
+
+
+async def multipart_body(filename: str, payload: bytes):
+    """
+    Cuerpo multipart en bloques de 64 KB, como lo entrega uvicorn (httpx
+    manda el archivo en un solo mensaje a la app ASGI)
+    """
+    yield (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+           f"Content-Type: image/jpeg\r\n\r\n").encode()
+    view = memoryview(payload)
+    for start in range(0, len(view), CHUNK_BYTES):
+        yield bytes(view[start:start + CHUNK_BYTES])
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def run(requests: int, size_mb: float, latency: float):
+    payloads = [b"\xff\xd8\xff\xe0fake-jpeg-" + os.urandom(int(size_mb * 1024 * 1024)) for _ in range(requests)]
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    start = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        responses = await asyncio.gather(*(
+            client.post(
+                "/api/ocr/scan",
+                content=multipart_body(f"receipt_{i}.jpg", payload),
+                headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"},
+            )
+            for i, payload in enumerate(payloads)
+        ))
+    elapsed = time.perf_counter() - start
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    for response in responses:
+        response.raise_for_status()
+    return (peak - baseline) / (1024 * 1024), elapsed
+
+
+async def main(requests: int, size_mb: float, latency: float) -> None:
+    ocr_service.backend = ReplayBackend(
+        latency_ms=latency * 1000,
+        documents={"ejemplo": documentai.Document(text=RECEIPT_TEXT)}
+    )
+    spool_bytes = upload_intake.spool_bytes
+
+    print(f"{requests} uploads concurrentes de {size_mb:.0f} MB "
+          f"(límite por archivo {upload_intake.max_bytes / (1024 * 1024):.0f} MB)\n")
+    print(f"{'modo':>10} {'pico (MB)':>10} {'por upload (MB)':>16} {'tiempo (s)':>11}")
+
+    for mode, spool in (("memoria", 1 << 62), ("streaming", spool_bytes)):
+        upload_intake.spool_bytes = spool
+        peak_mb, elapsed = await run(requests, size_mb, latency)
+        print(f"{mode:>10} {peak_mb:>10.1f} {peak_mb / requests:>16.1f} {elapsed:>11.2f}")
+
+    upload_intake.spool_bytes = spool_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=8, help="Uploads concurrentes")
+    parser.add_argument("--size-mb", type=float, default=20, help="Tamaño de cada archivo")
+    parser.add_argument("--latency", type=float, default=0.5, help="Latencia simulada de Document AI (s)")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.size_mb, args.latency))
@@ -5,6 +5,8 @@
 
 -- Extensiones necesarias
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;   -- Búsqueda por fragmentos de RFC
+CREATE EXTENSION IF NOT EXISTS unaccent;  -- Búsqueda sin acentos
 
 -- ===================================
 -- TABLA: users
@@ -93,10 +95,26 @@ CREATE TABLE expenses (
     is_recurring BOOLEAN DEFAULT FALSE,
     is_anomaly BOOLEAN DEFAULT FALSE,
 
+    -- Importación (CSV, XLSX, OFX): id de la fila en el archivo de origen,
+    -- para que volver a importar no duplique gastos
+    external_id VARCHAR(255),
+
+    -- Búsqueda de texto (sección BÚSQUEDA): nombre, comercio, RFC,
+    -- descripción y OCR de los recibos
+    search_vector TSVECTOR,
+
     -- Metadata
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    created_by UUID REFERENCES users(id)
+    created_by UUID REFERENCES users(id),
+
+    -- Clave del upsert de importaciones, por proyecto: el mismo estado de
+    -- cuenta importado en otro proyecto son gastos nuevos (NULL no choca:
+    -- los gastos capturados a mano no llevan external_id). En una base que
+    -- tiene la clave anterior (user_id, external_id):
+    --   ALTER TABLE expenses DROP CONSTRAINT expenses_user_external_id_key,
+    --       ADD CONSTRAINT expenses_user_project_external_id_key UNIQUE (user_id, project_id, external_id);
+    CONSTRAINT expenses_user_project_external_id_key UNIQUE (user_id, project_id, external_id)
 );
 
 -- ===================================
@@ -142,6 +160,27 @@ CREATE TABLE budgets (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- ===================================
+-- TABLA: budget_alerts
+-- ===================================
+-- Umbrales de un presupuesto (80% / 100%) cruzados en un periodo: una alerta
+-- por umbral y periodo. Las escribe el trigger de expenses (sección
+-- PRESUPUESTOS)
+CREATE TABLE budget_alerts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    budget_id UUID NOT NULL REFERENCES budgets(id) ON DELETE CASCADE,
+
+    period_start DATE NOT NULL,
+    threshold INTEGER NOT NULL,  -- % del presupuesto
+    amount DECIMAL(12, 2) NOT NULL,  -- Presupuesto y gastado al cruzar el umbral
+    spent DECIMAL(14, 2) NOT NULL,
+
+    acknowledged_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    CONSTRAINT budget_alerts_period_threshold_key UNIQUE (budget_id, period_start, threshold)
+);
+
 -- ===================================
 -- TABLA: goals
 -- ===================================
@@ -174,6 +213,68 @@ CREATE TABLE ml_predictions (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- ===================================
+-- TABLA: expense_daily_totals (rollup)
+-- ===================================
+-- Totales por proyecto, día y categoría que mantienen los triggers de
+-- expenses (sección ROLLUP DIARIO). Los resúmenes del dashboard leen de aquí:
+-- su costo depende de los días del rango, no del número de gastos. Sin FKs:
+-- es derivada de expenses y se limpia sola cuando sus gastos se borran.
+CREATE TABLE expense_daily_totals (
+    project_id UUID NOT NULL,
+    day DATE NOT NULL,  -- Día local en expense_rollup_timezone()
+    category_id UUID,
+    count INTEGER NOT NULL DEFAULT 0,
+    total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    tax_total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    deductible_total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+
+    -- (proyecto, día) primero: los resúmenes leen rangos de días por proyecto
+    CONSTRAINT expense_daily_totals_key UNIQUE NULLS NOT DISTINCT (project_id, day, category_id)
+);
+
+-- ===================================
+-- TABLA: list_versions (ETag de GET /api/expenses)
+-- ===================================
+-- Contadores que suben con cada sentencia que escribe gastos de un proyecto
+-- ('expenses') o categorías ('categories'). Sin FKs y sin borrar filas: la
+-- suma de los contadores nunca se repite.
+CREATE TABLE list_versions (
+    entity VARCHAR(20) NOT NULL CHECK (entity IN ('expenses', 'categories')),
+    project_id UUID,  -- expenses: el proyecto (NULL = gastos sin proyecto); categories: NULL
+    version BIGINT NOT NULL DEFAULT 0,
+
+    CONSTRAINT list_versions_key UNIQUE NULLS NOT DISTINCT (entity, project_id)
+);
+
+-- ===================================
+-- TABLA: sync_changes (log de cambios para GET /api/sync)
+-- ===================================
+-- Un renglón por cambio a expenses, receipts o comments; los escriben
+-- triggers (sección SINCRONIZACIÓN). El orden es (txid, id): txid es la
+-- transacción que hizo el cambio, y un token de sync apunta a una posición
+-- en ese orden.
+CREATE TABLE sync_changes (
+    id BIGSERIAL PRIMARY KEY,
+    txid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+
+    project_id UUID,  -- Proyecto y dueño del gasto (de quién es el cambio)
+    user_id UUID,
+    entity VARCHAR(20) NOT NULL CHECK (entity IN ('expense', 'receipt', 'comment')),
+    entity_id UUID NOT NULL,
+    expense_id UUID NOT NULL,  -- El gasto mismo, o el gasto del recibo o comentario
+    op VARCHAR(10) NOT NULL CHECK (op IN ('upsert', 'delete')),
+
+    changed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Hasta qué transacción se borró el log (sync_prune): un token anterior ya
+-- no puede continuar y el cliente tiene que bajar todo de nuevo
+CREATE TABLE sync_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    pruned_through XID8
+);
+
 -- ===================================
 -- ÍNDICES PARA PERFORMANCE
 -- ===================================
@@ -181,9 +282,23 @@ CREATE INDEX idx_expenses_user_id ON expenses(user_id);
 CREATE INDEX idx_expenses_project_id ON expenses(project_id);
 CREATE INDEX idx_expenses_category_id ON expenses(category_id);
 CREATE INDEX idx_expenses_date ON expenses(date);
+-- Presupuestos sin proyecto: gastos de un usuario en un rango de fechas
+CREATE INDEX idx_expenses_user_date ON expenses(user_id, date);
+-- Paginación por cursor de GET /api/expenses: (date DESC, id) por proyecto
+CREATE INDEX idx_expenses_project_date_id ON expenses(project_id, date DESC, id);
+-- Búsqueda de texto completo (expense_search: search_vector @@ query)
+CREATE INDEX idx_expenses_search ON expenses USING GIN (search_vector);
+-- Fragmentos de RFC (expense_search: rfc ILIKE '%...%')
+CREATE INDEX idx_expenses_rfc_trgm ON expenses USING GIN (rfc gin_trgm_ops);
+-- Filas del rollup que quedaron en 0 (se borran después de cada cambio)
+CREATE INDEX idx_expense_daily_totals_empty ON expense_daily_totals(project_id) WHERE count = 0;
 CREATE INDEX idx_receipts_expense_id ON receipts(expense_id);
+CREATE INDEX idx_sync_changes_project ON sync_changes(project_id, txid, id);
+CREATE INDEX idx_sync_changes_user ON sync_changes(user_id, txid, id);
+CREATE INDEX idx_sync_changes_changed_at ON sync_changes(changed_at);
 CREATE INDEX idx_comments_expense_id ON comments(expense_id);
 CREATE INDEX idx_budgets_user_id ON budgets(user_id);
+CREATE INDEX idx_budgets_project_id ON budgets(project_id);
 CREATE INDEX idx_goals_user_id ON goals(user_id);
 
 -- ===================================
@@ -216,6 +331,1316 @@ CREATE TRIGGER update_budgets_updated_at BEFORE UPDATE ON budgets
 CREATE TRIGGER update_goals_updated_at BEFORE UPDATE ON goals
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Recibos y comentarios son parte del gasto: cualquier cambio en ellos
+-- actualiza expenses.updated_at (de ahí salen los ETag de /api/expenses).
+-- Los recibos además recalculan search_vector (sección BÚSQUEDA)
+CREATE OR REPLACE FUNCTION touch_parent_expense()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE expenses SET updated_at = NOW() WHERE id = OLD.expense_id;
+    ELSE
+        UPDATE expenses SET updated_at = NOW() WHERE id = NEW.expense_id;
+        IF TG_OP = 'UPDATE' AND OLD.expense_id IS DISTINCT FROM NEW.expense_id THEN
+            UPDATE expenses SET updated_at = NOW() WHERE id = OLD.expense_id;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER touch_expense_on_comments AFTER INSERT OR UPDATE OR DELETE ON comments
+    FOR EACH ROW EXECUTE FUNCTION touch_parent_expense();
+
+-- ===================================
+-- BÚSQUEDA (GET /api/expenses/search)
+-- ===================================
+-- expenses.search_vector junta nombre, comercio y RFC (peso A), descripción
+-- (B) y el OCR de los recibos (D), en español y sin acentos: "medico"
+-- encuentra "Médico" y "farmacias" encuentra "Farmacia". Lo mantienen
+-- triggers: el de expenses al escribir esos campos y el de receipts al
+-- cambiar un recibo. Los fragmentos de RFC se buscan con ILIKE sobre el
+-- índice de trigramas (idx_expenses_rfc_trgm).
+-- En una BD con gastos, llenar una vez (por proyecto si son muchos):
+--   UPDATE expenses SET search_vector = expense_search_vector(
+--       name, description, merchant_name, rfc, expense_receipts_ocr_text(id));
+CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+ALTER TEXT SEARCH CONFIGURATION es_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+
+CREATE OR REPLACE FUNCTION expense_search_vector(
+    p_name TEXT,
+    p_description TEXT,
+    p_merchant_name TEXT,
+    p_rfc TEXT,
+    p_ocr_text TEXT
+)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('es_unaccent', COALESCE(p_name, '') || ' ' || COALESCE(p_merchant_name, '')), 'A')
+        || setweight(to_tsvector('simple', COALESCE(p_rfc, '')), 'A')
+        || setweight(to_tsvector('es_unaccent', COALESCE(p_description, '')), 'B')
+        || setweight(to_tsvector('es_unaccent', COALESCE(p_ocr_text, '')), 'D');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION expense_receipts_ocr_text(p_expense_id UUID)
+RETURNS TEXT AS $$
+    SELECT string_agg(r.ocr_text, E'\n' ORDER BY r.created_at)
+    FROM receipts r
+    WHERE r.expense_id = p_expense_id;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION expense_search_vector_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Un gasto nuevo todavía no tiene recibos
+    NEW.search_vector := expense_search_vector(
+        NEW.name, NEW.description, NEW.merchant_name, NEW.rfc,
+        CASE WHEN TG_OP = 'UPDATE' THEN expense_receipts_ocr_text(NEW.id) END
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER expense_search_vector BEFORE INSERT OR UPDATE OF name, description, merchant_name, rfc ON expenses
+    FOR EACH ROW EXECUTE FUNCTION expense_search_vector_trigger();
+
+-- Recibos: un solo UPDATE al gasto que toca updated_at (ETag) y, si cambió
+-- el OCR, recalcula search_vector
+CREATE OR REPLACE FUNCTION touch_expense_from_receipt(p_expense_id UUID, p_refresh_search BOOLEAN)
+RETURNS VOID AS $$
+BEGIN
+    IF p_refresh_search THEN
+        UPDATE expenses e
+        SET updated_at = NOW(),
+            search_vector = expense_search_vector(
+                e.name, e.description, e.merchant_name, e.rfc, expense_receipts_ocr_text(e.id)
+            )
+        WHERE e.id = p_expense_id;
+    ELSE
+        UPDATE expenses SET updated_at = NOW() WHERE id = p_expense_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION touch_expense_on_receipt_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM touch_expense_from_receipt(OLD.expense_id, OLD.ocr_text IS NOT NULL);
+    ELSIF TG_OP = 'INSERT' THEN
+        PERFORM touch_expense_from_receipt(NEW.expense_id, NEW.ocr_text IS NOT NULL);
+    ELSIF OLD.expense_id IS DISTINCT FROM NEW.expense_id THEN
+        PERFORM touch_expense_from_receipt(NEW.expense_id, TRUE);
+        PERFORM touch_expense_from_receipt(OLD.expense_id, TRUE);
+    ELSE
+        PERFORM touch_expense_from_receipt(NEW.expense_id, OLD.ocr_text IS DISTINCT FROM NEW.ocr_text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER touch_expense_on_receipts AFTER INSERT OR UPDATE OR DELETE ON receipts
+    FOR EACH ROW EXECUTE FUNCTION touch_expense_on_receipt_change();
+
+-- Búsqueda rankeada y paginada. p_query es texto libre con la sintaxis de
+-- websearch_to_tsquery ("frase exacta", -excluir, or); p_rfc, un fragmento
+-- de RFC; p_from/p_to, días locales en p_timezone (ambos incluidos). Arma
+-- la consulta solo con los filtros presentes para que el planner use el
+-- índice que corresponde (GIN, trigramas o fecha) con los valores reales
+CREATE OR REPLACE FUNCTION expense_search(
+    p_query TEXT DEFAULT NULL,
+    p_project_id UUID DEFAULT NULL,
+    p_rfc TEXT DEFAULT NULL,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_timezone TEXT DEFAULT 'America/Mexico_City',
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    name VARCHAR,
+    amount NUMERIC,
+    date TIMESTAMP WITH TIME ZONE,
+    category_id UUID,
+    project_id UUID,
+    merchant_name VARCHAR,
+    rfc VARCHAR,
+    rank REAL
+) AS $$
+DECLARE
+    v_query TSQUERY;
+    v_sql TEXT;
+BEGIN
+    IF NULLIF(trim(p_query), '') IS NOT NULL THEN
+        v_query := websearch_to_tsquery('es_unaccent', p_query);
+        -- Solo stopwords ("de la"): sin condición de texto
+        IF numnode(v_query) = 0 THEN
+            v_query := NULL;
+        END IF;
+    END IF;
+
+    IF v_query IS NULL AND NULLIF(p_rfc, '') IS NULL AND p_from IS NULL AND p_to IS NULL THEN
+        RETURN;
+    END IF;
+
+    v_sql := 'SELECT e.id, e.name, e.amount, e.date, e.category_id, e.project_id, e.merchant_name, e.rfc, '
+        || CASE WHEN v_query IS NULL THEN '0::REAL' ELSE 'ts_rank(e.search_vector, $1)' END
+        || ' FROM expenses e WHERE TRUE';
+
+    IF v_query IS NOT NULL THEN
+        v_sql := v_sql || ' AND e.search_vector @@ $1';
+    END IF;
+    IF p_project_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND e.project_id = $2';
+    END IF;
+    IF NULLIF(p_rfc, '') IS NOT NULL THEN
+        v_sql := v_sql || ' AND e.rfc ILIKE $3';
+    END IF;
+    IF p_from IS NOT NULL THEN
+        v_sql := v_sql || ' AND e.date >= $4::TIMESTAMP AT TIME ZONE $6';
+    END IF;
+    IF p_to IS NOT NULL THEN
+        v_sql := v_sql || ' AND e.date < ($5 + 1)::TIMESTAMP AT TIME ZONE $6';
+    END IF;
+
+    v_sql := v_sql || ' ORDER BY 9 DESC, e.date DESC, e.id LIMIT $7 OFFSET $8';
+
+    RETURN QUERY EXECUTE v_sql
+    USING v_query, p_project_id,
+          '%' || replace(replace(replace(p_rfc, '\', '\\'), '%', '\%'), '_', '\_') || '%',
+          p_from, p_to, p_timezone, p_limit, p_offset;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- ===================================
+-- FUNCIONES RPC (se llaman con supabase.rpc)
+-- ===================================
+-- Crea un expense y sus recibos en una sola llamada y una sola transacción:
+-- si falla el insert de un recibo, tampoco queda el expense.
+-- p_expense: columnas de expenses (JSON); p_receipts: arreglo de recibos
+-- (image_url, thumbnail_url, ocr_text, ocr_data). Retorna el expense con
+-- sus recibos en `receipts`.
+CREATE OR REPLACE FUNCTION create_expense_with_receipts(
+    p_expense JSONB,
+    p_receipts JSONB DEFAULT '[]'::JSONB
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_expense expenses;
+    v_receipts JSONB;
+BEGIN
+    INSERT INTO expenses (
+        user_id, project_id, category_id, name, description, amount, date,
+        merchant_name, merchant_address, tax_amount, payment_method, rfc,
+        is_deductible, has_invoice, invoice_uuid, category_confidence, external_id
+    )
+    SELECT
+        e.user_id, e.project_id, e.category_id, e.name, e.description, e.amount, e.date,
+        e.merchant_name, e.merchant_address, e.tax_amount, e.payment_method, e.rfc,
+        COALESCE(e.is_deductible, FALSE), COALESCE(e.has_invoice, FALSE), e.invoice_uuid,
+        e.category_confidence, e.external_id
+    FROM jsonb_populate_record(NULL::expenses, p_expense) AS e
+    RETURNING * INTO v_expense;
+
+    WITH inserted AS (
+        INSERT INTO receipts (expense_id, image_url, thumbnail_url, ocr_text, ocr_data)
+        SELECT v_expense.id, r.image_url, r.thumbnail_url, r.ocr_text, r.ocr_data
+        FROM jsonb_populate_recordset(NULL::receipts, COALESCE(p_receipts, '[]'::JSONB)) AS r
+        RETURNING *
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(inserted)), '[]'::JSONB) INTO v_receipts FROM inserted;
+
+    -- Sin search_vector: el tsvector del OCR no va en la respuesta
+    RETURN (to_jsonb(v_expense) - 'search_vector') || jsonb_build_object('receipts', v_receipts);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reemplaza ocr_data de varios recibos en un solo UPDATE
+-- (scripts/reextract_receipts.py). Solo actualiza: un recibo que se borró
+-- entre la lectura y la escritura se salta (un upsert lo volvería a insertar,
+-- o fallaría todo el lote si su gasto también se borró).
+-- p_rows: [{id, ocr_data}]. Retorna cuántos recibos se actualizaron.
+CREATE OR REPLACE FUNCTION receipts_update_ocr_data(p_rows JSONB)
+RETURNS INTEGER AS $$
+    WITH updated AS (
+        UPDATE receipts r
+        SET ocr_data = u.ocr_data
+        FROM jsonb_to_recordset(p_rows) AS u(id UUID, ocr_data JSONB)
+        WHERE r.id = u.id
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM updated;
+$$ LANGUAGE sql;
+
+-- Solo el job (service key)
+REVOKE EXECUTE ON FUNCTION receipts_update_ocr_data(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION receipts_update_ocr_data(JSONB) TO service_role;
+
+-- Versiones de las listas (ETag de GET /api/expenses). No se usa
+-- MAX(updated_at): updated_at es el inicio de la transacción, así que una
+-- que empezó antes pero confirma después no lo sube y el cliente seguiría
+-- recibiendo 304. El contador sí: la fila queda bloqueada hasta el commit,
+-- así que otra escritura al mismo proyecto espera y suma encima, y cada
+-- commit deja un valor que nadie había visto. Cambios en recibos y
+-- comentarios cuentan porque tocan expenses.updated_at.
+CREATE OR REPLACE FUNCTION list_versions_bump(p_entity TEXT, p_project_ids UUID[])
+RETURNS VOID AS $$
+    -- En orden de proyecto: dos lotes con los mismos proyectos no se bloquean en cruz
+    INSERT INTO list_versions AS v (entity, project_id, version)
+    SELECT DISTINCT p_entity, p.project_id, 1
+    FROM unnest(p_project_ids) AS p(project_id)
+    ORDER BY p.project_id
+    ON CONFLICT ON CONSTRAINT list_versions_key DO UPDATE SET version = v.version + 1;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION list_versions_bump_expenses()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM list_versions_bump('expenses', ARRAY(SELECT n.project_id FROM new_rows n));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM list_versions_bump('expenses', ARRAY(
+            SELECT o.project_id FROM old_rows o UNION SELECT n.project_id FROM new_rows n
+        ));
+    ELSE
+        PERFORM list_versions_bump('expenses', ARRAY(SELECT o.project_id FROM old_rows o));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Renombrar o recolorear una categoría cambia las listas con include=category
+CREATE OR REPLACE FUNCTION list_versions_bump_categories()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM list_versions_bump('categories', ARRAY[NULL::UUID]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Las tablas de transición no se pueden declarar en un trigger de varios
+-- eventos: uno por evento
+CREATE TRIGGER list_versions_expenses_insert AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION list_versions_bump_expenses();
+
+CREATE TRIGGER list_versions_expenses_update AFTER UPDATE ON expenses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION list_versions_bump_expenses();
+
+CREATE TRIGGER list_versions_expenses_delete AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION list_versions_bump_expenses();
+
+CREATE TRIGGER list_versions_categories AFTER INSERT OR UPDATE OR DELETE ON categories
+    FOR EACH STATEMENT EXECUTE FUNCTION list_versions_bump_categories();
+
+-- Interna: por PostgREST cualquiera podría subir contadores (y bloquear sus filas)
+REVOKE EXECUTE ON FUNCTION list_versions_bump(TEXT, UUID[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION list_versions_bump(TEXT, UUID[]) TO service_role;
+
+-- Sin project_id, la versión de los gastos es la suma de todos los
+-- proyectos. p_category_id no afina la versión: cualquier cambio en el
+-- proyecto la sube (a lo más un 200 de más, nunca un 304 de menos).
+-- SECURITY DEFINER: list_versions no tiene políticas de RLS y con una key
+-- sujeta a RLS la suma sería siempre 0 (el ETag no cambiaría nunca)
+CREATE OR REPLACE FUNCTION expenses_list_version(
+    p_project_id UUID DEFAULT NULL,
+    p_category_id UUID DEFAULT NULL
+)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'expenses', COALESCE(SUM(version) FILTER (
+            WHERE entity = 'expenses' AND (p_project_id IS NULL OR project_id = p_project_id)
+        ), 0),
+        'categories', COALESCE(SUM(version) FILTER (WHERE entity = 'categories'), 0)
+    )
+    FROM list_versions;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- ===================================
+-- ROLLUP DIARIO (expense_daily_totals)
+-- ===================================
+-- Triggers por sentencia con tablas de transición: un lote de 500 gastos
+-- (importación, upsert) es un solo upsert agrupado al rollup, no 500.
+-- Si el rollup se desincroniza (p. ej. cambios con triggers desactivados):
+--   SELECT * FROM expense_rollup_verify();   -- diferencias
+--   SELECT expense_rollup_rebuild();         -- reconstruir
+-- (o python -m scripts.expense_rollup verify|rebuild)
+
+-- Zona horaria de los días del rollup. Los resúmenes en otra zona se
+-- calculan directo sobre expenses
+CREATE OR REPLACE FUNCTION expense_rollup_timezone()
+RETURNS TEXT AS $$
+    SELECT 'America/Mexico_City'::TEXT;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION expense_rollup_day(p_date TIMESTAMP WITH TIME ZONE)
+RETURNS DATE AS $$
+    SELECT (p_date AT TIME ZONE expense_rollup_timezone())::DATE;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Resta del rollup los gastos de p_old y suma los de p_new
+CREATE OR REPLACE FUNCTION expense_rollup_apply(p_old expenses[], p_new expenses[])
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO expense_daily_totals AS t (
+        project_id, day, category_id, count, total, tax_total, deductible_total
+    )
+    SELECT
+        d.project_id, expense_rollup_day(d.date), d.category_id,
+        SUM(d.sign),
+        SUM(d.sign * d.amount),
+        SUM(d.sign * COALESCE(d.tax_amount, 0)),
+        SUM(CASE WHEN d.is_deductible THEN d.sign * d.amount ELSE 0 END)
+    FROM (
+        SELECT o.project_id, o.date, o.category_id, o.amount, o.tax_amount, o.is_deductible, -1 AS sign
+        FROM unnest(p_old) AS o
+        UNION ALL
+        SELECT n.project_id, n.date, n.category_id, n.amount, n.tax_amount, n.is_deductible, 1 AS sign
+        FROM unnest(p_new) AS n
+    ) d
+    WHERE d.project_id IS NOT NULL
+    GROUP BY 1, 2, 3
+    -- Ediciones que no tocan montos, fechas ni categoría no escriben nada
+    HAVING SUM(d.sign) <> 0
+        OR SUM(d.sign * d.amount) <> 0
+        OR SUM(d.sign * COALESCE(d.tax_amount, 0)) <> 0
+        OR SUM(CASE WHEN d.is_deductible THEN d.sign * d.amount ELSE 0 END) <> 0
+    -- En orden de llave: dos lotes con los mismos días no se bloquean en cruz
+    ORDER BY 1, 2, 3
+    ON CONFLICT ON CONSTRAINT expense_daily_totals_key DO UPDATE SET
+        count = t.count + EXCLUDED.count,
+        total = t.total + EXCLUDED.total,
+        tax_total = t.tax_total + EXCLUDED.tax_total,
+        deductible_total = t.deductible_total + EXCLUDED.deductible_total;
+
+    DELETE FROM expense_daily_totals WHERE count = 0;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION expense_rollup_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM expense_rollup_apply(NULL, ARRAY(SELECT n::expenses FROM new_rows n));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM expense_rollup_apply(ARRAY(SELECT o::expenses FROM old_rows o), ARRAY(SELECT n::expenses FROM new_rows n));
+    ELSE
+        PERFORM expense_rollup_apply(ARRAY(SELECT o::expenses FROM old_rows o), NULL);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER expense_rollup_insert AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_trigger();
+
+CREATE TRIGGER expense_rollup_update AFTER UPDATE ON expenses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_trigger();
+
+CREATE TRIGGER expense_rollup_delete AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expense_rollup_trigger();
+
+-- Reconstruye el rollup desde expenses (un proyecto o todos). Bloquea las
+-- escrituras a expenses mientras corre para no perder cambios concurrentes
+CREATE OR REPLACE FUNCTION expense_rollup_rebuild(p_project_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    LOCK TABLE expenses IN SHARE MODE;
+
+    DELETE FROM expense_daily_totals
+    WHERE p_project_id IS NULL OR project_id = p_project_id;
+
+    INSERT INTO expense_daily_totals (
+        project_id, day, category_id, count, total, tax_total, deductible_total
+    )
+    SELECT
+        e.project_id, expense_rollup_day(e.date), e.category_id,
+        COUNT(*), SUM(e.amount), COALESCE(SUM(e.tax_amount), 0),
+        COALESCE(SUM(e.amount) FILTER (WHERE e.is_deductible), 0)
+    FROM expenses e
+    WHERE e.project_id IS NOT NULL
+      AND (p_project_id IS NULL OR e.project_id = p_project_id)
+    GROUP BY 1, 2, 3;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Filas (proyecto, día, categoría) donde el rollup no coincide con expenses
+CREATE OR REPLACE FUNCTION expense_rollup_verify(p_project_id UUID DEFAULT NULL)
+RETURNS TABLE (
+    project_id UUID,
+    day DATE,
+    category_id UUID,
+    expected_count BIGINT,
+    actual_count INTEGER,
+    expected_total NUMERIC,
+    actual_total NUMERIC
+) AS $$
+    WITH expected AS (
+        SELECT
+            e.project_id, expense_rollup_day(e.date) AS day, e.category_id,
+            COUNT(*) AS count, SUM(e.amount) AS total,
+            COALESCE(SUM(e.tax_amount), 0) AS tax_total,
+            COALESCE(SUM(e.amount) FILTER (WHERE e.is_deductible), 0) AS deductible_total
+        FROM expenses e
+        WHERE e.project_id IS NOT NULL
+          AND (p_project_id IS NULL OR e.project_id = p_project_id)
+        GROUP BY 1, 2, 3
+    ),
+    actual AS (
+        SELECT r.*
+        FROM expense_daily_totals r
+        WHERE p_project_id IS NULL OR r.project_id = p_project_id
+    )
+    SELECT
+        COALESCE(x.project_id, a.project_id), COALESCE(x.day, a.day), COALESCE(x.category_id, a.category_id),
+        x.count, a.count, x.total, a.total
+    FROM expected x
+    FULL OUTER JOIN actual a
+        ON a.project_id = x.project_id
+       AND a.day = x.day
+       AND a.category_id IS NOT DISTINCT FROM x.category_id
+    WHERE x.count IS DISTINCT FROM a.count::BIGINT
+       OR x.total IS DISTINCT FROM a.total
+       OR x.tax_total IS DISTINCT FROM a.tax_total
+       OR x.deductible_total IS DISTINCT FROM a.deductible_total
+    ORDER BY 1, 2, 3;
+$$ LANGUAGE sql STABLE;
+
+-- Internas: solo el trigger (SECURITY DEFINER) y scripts/expense_rollup.py
+-- (service key). Por PostgREST cualquiera podría mandar arreglos inventados
+-- a expense_rollup_apply o bloquear expenses con rebuild
+REVOKE EXECUTE ON FUNCTION
+    expense_rollup_apply(expenses[], expenses[]),
+    expense_rollup_rebuild(UUID),
+    expense_rollup_verify(UUID)
+FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION
+    expense_rollup_apply(expenses[], expenses[]),
+    expense_rollup_rebuild(UUID),
+    expense_rollup_verify(UUID)
+TO service_role;
+
+-- ===================================
+-- RESÚMENES (dashboard: GET /api/expenses/summary)
+-- ===================================
+-- Se calculan en la BD para que solo viajen los totales. Todas filtran por
+-- proyecto y rango de fechas (días locales en p_timezone, ambos extremos
+-- incluidos, NULL = sin límite). En la zona del rollup (la default) leen de
+-- expense_daily_totals, O(días del rango); en otra zona, o por miembro (el
+-- rollup no tiene esa dimensión), agregan expenses con condiciones de rango
+-- sobre `date` (idx_expenses_project_date_id o idx_expenses_date).
+
+CREATE OR REPLACE FUNCTION expense_summary_totals(
+    p_project_id UUID,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_timezone TEXT DEFAULT 'America/Mexico_City'
+)
+RETURNS JSONB AS $$
+BEGIN
+    IF p_timezone = expense_rollup_timezone() THEN
+        RETURN (
+            SELECT jsonb_build_object(
+                'count', COALESCE(SUM(r.count), 0),
+                'total', COALESCE(SUM(r.total), 0),
+                'average', COALESCE(ROUND(SUM(r.total) / NULLIF(SUM(r.count), 0), 2), 0),
+                'tax_total', COALESCE(SUM(r.tax_total), 0),
+                'deductible_total', COALESCE(SUM(r.deductible_total), 0),
+                -- MIN/MAX por el índice (project_id, date): O(log n)
+                'first_date', (
+                    SELECT MIN(e.date) FROM expenses e
+                    WHERE e.project_id = p_project_id
+                      AND e.date >= COALESCE(p_from::TIMESTAMP AT TIME ZONE p_timezone, '-infinity')
+                      AND e.date < COALESCE((p_to + 1)::TIMESTAMP AT TIME ZONE p_timezone, 'infinity')
+                ),
+                'last_date', (
+                    SELECT MAX(e.date) FROM expenses e
+                    WHERE e.project_id = p_project_id
+                      AND e.date >= COALESCE(p_from::TIMESTAMP AT TIME ZONE p_timezone, '-infinity')
+                      AND e.date < COALESCE((p_to + 1)::TIMESTAMP AT TIME ZONE p_timezone, 'infinity')
+                )
+            )
+            FROM expense_daily_totals r
+            WHERE r.project_id = p_project_id
+              AND r.day BETWEEN COALESCE(p_from, '-infinity') AND COALESCE(p_to, 'infinity')
+        );
+    END IF;
+
+    RETURN (
+        SELECT jsonb_build_object(
+            'count', COUNT(*),
+            'total', COALESCE(SUM(e.amount), 0),
+            'average', ROUND(COALESCE(AVG(e.amount), 0), 2),
+            'tax_total', COALESCE(SUM(e.tax_amount), 0),
+            'deductible_total', COALESCE(SUM(e.amount) FILTER (WHERE e.is_deductible), 0),
+            'first_date', MIN(e.date),
+            'last_date', MAX(e.date)
+        )
+        FROM expenses e
+        WHERE e.project_id = p_project_id
+          AND e.date >= COALESCE(p_from::TIMESTAMP AT TIME ZONE p_timezone, '-infinity')
+          AND e.date < COALESCE((p_to + 1)::TIMESTAMP AT TIME ZONE p_timezone, 'infinity')
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION expense_summary_by_category(
+    p_project_id UUID,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_timezone TEXT DEFAULT 'America/Mexico_City'
+)
+RETURNS TABLE (
+    category_id UUID,
+    name VARCHAR,
+    icon VARCHAR,
+    color VARCHAR,
+    count BIGINT,
+    total NUMERIC
+) AS $$
+BEGIN
+    IF p_timezone = expense_rollup_timezone() THEN
+        RETURN QUERY
+        SELECT r.category_id, c.name, c.icon, c.color, SUM(r.count)::BIGINT, SUM(r.total)
+        FROM expense_daily_totals r
+        LEFT JOIN categories c ON c.id = r.category_id
+        WHERE r.project_id = p_project_id
+          AND r.day BETWEEN COALESCE(p_from, '-infinity') AND COALESCE(p_to, 'infinity')
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 6 DESC;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT e.category_id, c.name, c.icon, c.color, COUNT(*), SUM(e.amount)
+    FROM expenses e
+    LEFT JOIN categories c ON c.id = e.category_id
+    WHERE e.project_id = p_project_id
+      AND e.date >= COALESCE(p_from::TIMESTAMP AT TIME ZONE p_timezone, '-infinity')
+      AND e.date < COALESCE((p_to + 1)::TIMESTAMP AT TIME ZONE p_timezone, 'infinity')
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 6 DESC;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- p_period: day | week (inicia en lunes) | month
+CREATE OR REPLACE FUNCTION expense_summary_by_period(
+    p_project_id UUID,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_timezone TEXT DEFAULT 'America/Mexico_City',
+    p_period TEXT DEFAULT 'month'
+)
+RETURNS TABLE (
+    period_start DATE,
+    count BIGINT,
+    total NUMERIC
+) AS $$
+BEGIN
+    IF p_timezone = expense_rollup_timezone() THEN
+        RETURN QUERY
+        SELECT date_trunc(p_period, r.day::TIMESTAMP)::DATE, SUM(r.count)::BIGINT, SUM(r.total)
+        FROM expense_daily_totals r
+        WHERE r.project_id = p_project_id
+          AND r.day BETWEEN COALESCE(p_from, '-infinity') AND COALESCE(p_to, 'infinity')
+        GROUP BY 1
+        ORDER BY 1;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT date_trunc(p_period, e.date AT TIME ZONE p_timezone)::DATE, COUNT(*), SUM(e.amount)
+    FROM expenses e
+    WHERE e.project_id = p_project_id
+      AND e.date >= COALESCE(p_from::TIMESTAMP AT TIME ZONE p_timezone, '-infinity')
+      AND e.date < COALESCE((p_to + 1)::TIMESTAMP AT TIME ZONE p_timezone, 'infinity')
+    GROUP BY 1
+    ORDER BY 1;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION expense_summary_by_member(
+    p_project_id UUID,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_timezone TEXT DEFAULT 'America/Mexico_City'
+)
+RETURNS TABLE (
+    user_id UUID,
+    full_name VARCHAR,
+    avatar_url TEXT,
+    count BIGINT,
+    total NUMERIC
+) AS $$
+    SELECT e.user_id, u.full_name, u.avatar_url, COUNT(*), SUM(e.amount)
+    FROM expenses e
+    LEFT JOIN users u ON u.id = e.user_id
+    WHERE e.project_id = p_project_id
+      AND e.date >= COALESCE(p_from::TIMESTAMP AT TIME ZONE p_timezone, '-infinity')
+      AND e.date < COALESCE((p_to + 1)::TIMESTAMP AT TIME ZONE p_timezone, 'infinity')
+    GROUP BY e.user_id, u.full_name, u.avatar_url
+    ORDER BY SUM(e.amount) DESC;
+$$ LANGUAGE sql STABLE;
+
+-- ===================================
+-- PRESUPUESTOS (GET /api/budgets, alertas 80% / 100%)
+-- ===================================
+-- Un presupuesto con proyecto cuenta los gastos de todos los miembros del
+-- proyecto; sin proyecto, los del usuario en todos sus proyectos. Con
+-- categoría, solo los de esa categoría. Los periodos se cuentan desde
+-- start_date (mensual desde el 15 = del 15 al 14) en días locales de
+-- expense_rollup_timezone(), igual que el rollup.
+
+-- Umbrales de alerta (% del monto del presupuesto)
+CREATE OR REPLACE FUNCTION budget_alert_thresholds()
+RETURNS INTEGER[] AS $$
+    SELECT ARRAY[80, 100];
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Periodo del presupuesto que contiene p_as_of (p_as_of >= p_start)
+CREATE OR REPLACE FUNCTION budget_period(
+    p_start DATE,
+    p_period TEXT,
+    p_as_of DATE,
+    OUT period_start DATE,
+    OUT period_end DATE
+) AS $$
+DECLARE
+    v_step INTEGER;
+    v_periods INTEGER;
+BEGIN
+    IF p_period = 'daily' THEN
+        period_start := p_as_of;
+        period_end := p_as_of;
+        RETURN;
+    ELSIF p_period = 'weekly' THEN
+        period_start := p_start + (p_as_of - p_start) / 7 * 7;
+        period_end := period_start + 6;
+        RETURN;
+    END IF;
+
+    -- Mensual y anual: periodos completos en meses. Sumar meses recorta al
+    -- fin de mes (31 ene + 1 mes = 28 feb), así que se corrige si se pasó
+    v_step := CASE p_period WHEN 'monthly' THEN 1 ELSE 12 END;
+    v_periods := ((EXTRACT(YEAR FROM p_as_of) - EXTRACT(YEAR FROM p_start)) * 12
+                  + EXTRACT(MONTH FROM p_as_of) - EXTRACT(MONTH FROM p_start))::INTEGER / v_step;
+    IF (p_start + make_interval(months => v_periods * v_step))::DATE > p_as_of THEN
+        v_periods := v_periods - 1;
+    END IF;
+
+    period_start := (p_start + make_interval(months => v_periods * v_step))::DATE;
+    period_end := (p_start + make_interval(months => (v_periods + 1) * v_step))::DATE - 1;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Consumo del periodo actual de los presupuestos activos al día p_as_of
+-- (default: hoy), de un usuario, de un proyecto o por id, en una consulta.
+-- Los de proyecto suman el rollup diario; los de usuario, sus gastos
+CREATE OR REPLACE FUNCTION budget_status(
+    p_user_id UUID DEFAULT NULL,
+    p_project_id UUID DEFAULT NULL,
+    p_budget_ids UUID[] DEFAULT NULL,
+    p_as_of DATE DEFAULT NULL
+)
+RETURNS TABLE (
+    budget_id UUID,
+    user_id UUID,
+    project_id UUID,
+    category_id UUID,
+    period VARCHAR,
+    amount NUMERIC,
+    start_date DATE,
+    end_date DATE,
+    period_start DATE,
+    period_end DATE,
+    spent NUMERIC,
+    remaining NUMERIC,
+    percentage NUMERIC
+) AS $$
+    WITH active AS (
+        SELECT b.*, bp.period_start, LEAST(bp.period_end, b.end_date) AS period_end
+        FROM budgets b
+        CROSS JOIN LATERAL (SELECT COALESCE(p_as_of, expense_rollup_day(NOW())) AS as_of) d
+        CROSS JOIN LATERAL budget_period(b.start_date, b.period, d.as_of) bp
+        WHERE b.start_date <= d.as_of
+          AND (b.end_date IS NULL OR b.end_date >= d.as_of)
+          AND (p_user_id IS NULL OR b.user_id = p_user_id)
+          AND (p_project_id IS NULL OR b.project_id = p_project_id)
+          AND (p_budget_ids IS NULL OR b.id = ANY(p_budget_ids))
+    ),
+    consumption AS (
+        SELECT a.*, CASE
+            WHEN a.project_id IS NOT NULL THEN (
+                SELECT COALESCE(SUM(r.total), 0)
+                FROM expense_daily_totals r
+                WHERE r.project_id = a.project_id
+                  AND r.day BETWEEN a.period_start AND a.period_end
+                  AND (a.category_id IS NULL OR r.category_id = a.category_id)
+            )
+            ELSE (
+                SELECT COALESCE(SUM(e.amount), 0)
+                FROM expenses e
+                WHERE e.user_id = a.user_id
+                  AND e.date >= a.period_start::TIMESTAMP AT TIME ZONE expense_rollup_timezone()
+                  AND e.date < (a.period_end + 1)::TIMESTAMP AT TIME ZONE expense_rollup_timezone()
+                  AND (a.category_id IS NULL OR e.category_id = a.category_id)
+            )
+        END AS spent
+        FROM active a
+    )
+    SELECT
+        c.id, c.user_id, c.project_id, c.category_id, c.period, c.amount,
+        c.start_date, c.end_date, c.period_start, c.period_end,
+        c.spent, c.amount - c.spent, COALESCE(ROUND(c.spent * 100 / NULLIF(c.amount, 0), 2), 0)
+    FROM consumption c
+    ORDER BY c.period_end, c.id;
+$$ LANGUAGE sql STABLE;
+
+-- Registra las alertas de los umbrales que los presupuestos dados cruzaron
+-- en su periodo actual; devuelve solo las nuevas (cada una sale una vez)
+CREATE OR REPLACE FUNCTION budget_evaluate_alerts(p_budget_ids UUID[], p_as_of DATE DEFAULT NULL)
+RETURNS SETOF budget_alerts AS $$
+    INSERT INTO budget_alerts (budget_id, period_start, threshold, amount, spent)
+    SELECT s.budget_id, s.period_start, t.threshold, s.amount, s.spent
+    FROM budget_status(p_budget_ids => p_budget_ids, p_as_of => p_as_of) s
+    CROSS JOIN unnest(budget_alert_thresholds()) AS t(threshold)
+    WHERE s.percentage >= t.threshold
+    ON CONFLICT ON CONSTRAINT budget_alerts_period_threshold_key DO NOTHING
+    RETURNING *;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+-- Re-evalúa solo los presupuestos que tocan los gastos escritos: los de su
+-- proyecto (o de su usuario, si no tienen proyecto) y su categoría (o sin
+-- categoría), cuyo periodo actual incluye el día del gasto
+CREATE OR REPLACE FUNCTION budget_alerts_for_expenses(p_expenses expenses[])
+RETURNS VOID AS $$
+DECLARE
+    v_today DATE := expense_rollup_day(NOW());
+    v_budget_ids UUID[];
+BEGIN
+    SELECT array_agg(DISTINCT b.id) INTO v_budget_ids
+    FROM (
+        SELECT DISTINCT x.project_id, x.user_id, x.category_id, expense_rollup_day(x.date) AS day
+        FROM unnest(p_expenses) AS x
+    ) w
+    JOIN budgets b
+        ON (b.project_id = w.project_id OR (b.project_id IS NULL AND b.user_id = w.user_id))
+       AND (b.category_id IS NULL OR b.category_id = w.category_id)
+    CROSS JOIN LATERAL budget_period(b.start_date, b.period, v_today) bp
+    WHERE b.start_date <= v_today
+      AND (b.end_date IS NULL OR b.end_date >= v_today)
+      AND w.day BETWEEN bp.period_start AND bp.period_end;
+
+    IF v_budget_ids IS NOT NULL THEN
+        PERFORM budget_evaluate_alerts(v_budget_ids, v_today);
+    END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION expense_budget_alerts_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM budget_alerts_for_expenses(ARRAY(SELECT n::expenses FROM new_rows n));
+    ELSE
+        -- Solo los gastos que cambiaron de monto, fecha, categoría o proyecto
+        PERFORM budget_alerts_for_expenses(ARRAY(
+            SELECT n::expenses
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            WHERE (n.amount, n.date, n.category_id, n.project_id, n.user_id)
+                  IS DISTINCT FROM (o.amount, o.date, o.category_id, o.project_id, o.user_id)
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Escriben budget_alerts para cualquier presupuesto: solo el trigger
+-- (SECURITY DEFINER) y el backend con la service key (get_admin_db, en
+-- POST/PUT /api/budgets) las llaman
+REVOKE EXECUTE ON FUNCTION
+    budget_evaluate_alerts(UUID[], DATE),
+    budget_alerts_for_expenses(expenses[])
+FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION
+    budget_evaluate_alerts(UUID[], DATE),
+    budget_alerts_for_expenses(expenses[])
+TO service_role;
+
+-- Los triggers AFTER corren en orden alfabético: expense_track_budgets_*
+-- va después de expense_rollup_*, así que ya lee el rollup actualizado
+CREATE TRIGGER expense_track_budgets_insert AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expense_budget_alerts_trigger();
+
+CREATE TRIGGER expense_track_budgets_update AFTER UPDATE ON expenses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION expense_budget_alerts_trigger();
+
+-- ===================================
+-- SINCRONIZACIÓN (GET y POST /api/sync)
+-- ===================================
+-- Triggers por sentencia que registran en sync_changes cada cambio a
+-- expenses, receipts y comments. Un cliente que se reconecta pide los
+-- cambios desde su token (sync_pull) y manda su cola de operaciones en un
+-- solo request (sync_push): el costo depende de lo que cambió, no de todo
+-- lo que tiene el proyecto.
+--
+-- Token = (txid, id) del último cambio entregado. sync_pull solo entrega
+-- cambios de transacciones ya terminadas (txid < xmin del snapshot): una
+-- transacción que empezó antes pero confirma después tiene un txid mayor
+-- que el token y llega en el siguiente pull, no se pierde.
+--
+-- Limpieza periódica (p. ej. con pg_cron):
+--   SELECT sync_prune(NOW() - INTERVAL '90 days');
+
+CREATE OR REPLACE FUNCTION sync_log_expenses()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO sync_changes (project_id, user_id, entity, entity_id, expense_id, op)
+        SELECT o.project_id, o.user_id, 'expense', o.id, o.id, 'delete'
+        FROM old_rows o;
+        RETURN NULL;
+    END IF;
+
+    -- Gasto movido de proyecto: baja en el anterior. Va antes que el upsert
+    -- (id menor): quien ve los dos registros (el dueño, o miembros de ambos
+    -- proyectos) se queda con el upsert; solo quien perdió acceso recibe la baja
+    IF TG_OP = 'UPDATE' THEN
+        INSERT INTO sync_changes (project_id, user_id, entity, entity_id, expense_id, op)
+        SELECT o.project_id, o.user_id, 'expense', o.id, o.id, 'delete'
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        WHERE o.project_id IS DISTINCT FROM n.project_id;
+    END IF;
+
+    -- Incluye los updates que solo tocan updated_at (cambios en recibos o
+    -- comentarios): el cliente necesita el updated_at nuevo para sus
+    -- siguientes ediciones
+    INSERT INTO sync_changes (project_id, user_id, entity, entity_id, expense_id, op)
+    SELECT n.project_id, n.user_id, 'expense', n.id, n.id, 'upsert'
+    FROM new_rows n;
+
+    IF TG_OP = 'UPDATE' THEN
+        -- En el proyecto nuevo también van sus recibos y comentarios (que no
+        -- cambiaron)
+        INSERT INTO sync_changes (project_id, user_id, entity, entity_id, expense_id, op)
+        SELECT n.project_id, n.user_id, child.entity, child.id, n.id, 'upsert'
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        CROSS JOIN LATERAL (
+            SELECT 'receipt' AS entity, r.id FROM receipts r WHERE r.expense_id = n.id
+            UNION ALL
+            SELECT 'comment', c.id FROM comments c WHERE c.expense_id = n.id
+        ) child
+        WHERE o.project_id IS DISTINCT FROM n.project_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Recibos y comentarios (TG_ARGV[0] = 'receipt' | 'comment') se registran
+-- con el proyecto de su gasto. Si el gasto ya no existe (se borró junto con
+-- sus hijos) no hace falta: la baja del gasto los cubre
+CREATE OR REPLACE FUNCTION sync_log_expense_children()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO sync_changes (project_id, user_id, entity, entity_id, expense_id, op)
+        SELECT e.project_id, e.user_id, TG_ARGV[0], o.id, o.expense_id, 'delete'
+        FROM old_rows o
+        JOIN expenses e ON e.id = o.expense_id;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        -- Movido a otro gasto: baja en el anterior (puede ser otro proyecto),
+        -- antes que el upsert por la misma razón que en sync_log_expenses
+        INSERT INTO sync_changes (project_id, user_id, entity, entity_id, expense_id, op)
+        SELECT e.project_id, e.user_id, TG_ARGV[0], o.id, o.expense_id, 'delete'
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        JOIN expenses e ON e.id = o.expense_id
+        WHERE o.expense_id IS DISTINCT FROM n.expense_id;
+    END IF;
+
+    INSERT INTO sync_changes (project_id, user_id, entity, entity_id, expense_id, op)
+    SELECT e.project_id, e.user_id, TG_ARGV[0], n.id, n.expense_id, 'upsert'
+    FROM new_rows n
+    JOIN expenses e ON e.id = n.expense_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER sync_log_expenses_insert AFTER INSERT ON expenses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expenses();
+
+CREATE TRIGGER sync_log_expenses_update AFTER UPDATE ON expenses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expenses();
+
+CREATE TRIGGER sync_log_expenses_delete AFTER DELETE ON expenses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expenses();
+
+CREATE TRIGGER sync_log_receipts_insert AFTER INSERT ON receipts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expense_children('receipt');
+
+CREATE TRIGGER sync_log_receipts_update AFTER UPDATE ON receipts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expense_children('receipt');
+
+CREATE TRIGGER sync_log_receipts_delete AFTER DELETE ON receipts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expense_children('receipt');
+
+CREATE TRIGGER sync_log_comments_insert AFTER INSERT ON comments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expense_children('comment');
+
+CREATE TRIGGER sync_log_comments_update AFTER UPDATE ON comments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expense_children('comment');
+
+CREATE TRIGGER sync_log_comments_delete AFTER DELETE ON comments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_log_expense_children('comment');
+
+-- Cambios para el usuario (sus proyectos y sus gastos) después del token
+-- (p_since_txid, p_since_id), a lo más p_limit. Varios cambios a la misma
+-- fila dentro de la página salen una vez, con el estado actual de la fila
+-- (recibos sin ocr_text ni ocr_data, igual que la lista). Sin token
+-- devuelve solo el token actual: el cliente lo pide antes de bajar las
+-- listas completas, así lo que cambie mientras baja llega en el siguiente
+-- pull.
+-- Returns: {changes: [{entity, id, expense_id, op, data}], txid, id, has_more}
+--          o {resync_required: true} si el token es anterior a la limpieza
+CREATE OR REPLACE FUNCTION sync_pull(
+    p_user_id UUID,
+    p_since_txid TEXT DEFAULT NULL,
+    p_since_id BIGINT DEFAULT 0,
+    p_limit INTEGER DEFAULT 500
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_horizon XID8 := pg_snapshot_xmin(pg_current_snapshot());
+    v_since XID8 := p_since_txid::XID8;
+    v_projects UUID[];
+    v_page sync_changes[];
+    v_last sync_changes;
+    v_has_more BOOLEAN;
+    v_changes JSONB;
+BEGIN
+    IF v_since IS NULL THEN
+        RETURN jsonb_build_object('changes', '[]'::JSONB, 'txid', v_horizon::TEXT, 'id', 0, 'has_more', FALSE);
+    END IF;
+
+    -- pruned_through es el último txid borrado: un token en esa misma
+    -- transacción (horizonte (X, 0) o página a medias) ya perdió cambios
+    IF v_since <= (SELECT pruned_through FROM sync_state) THEN
+        RETURN jsonb_build_object('resync_required', TRUE);
+    END IF;
+
+    v_projects := ARRAY(
+        SELECT pm.project_id FROM project_members pm WHERE pm.user_id = p_user_id
+        UNION
+        SELECT pr.id FROM projects pr WHERE pr.owner_id = p_user_id
+    );
+
+    v_page := ARRAY(
+        SELECT c
+        FROM sync_changes c
+        WHERE (c.project_id = ANY(v_projects) OR c.user_id = p_user_id)
+          AND (c.txid, c.id) > (v_since, p_since_id)
+          AND c.txid < v_horizon
+        ORDER BY c.txid, c.id
+        LIMIT p_limit + 1
+    );
+    v_has_more := cardinality(v_page) > p_limit;
+    v_page := v_page[1:p_limit];
+    v_last := v_page[cardinality(v_page)];
+
+    -- Lo que se entrega sale del estado actual de la fila tal como la ve el
+    -- usuario, no del registro: un upsert de una fila que ya no existe o que
+    -- se movió a un proyecto que no es del usuario es una baja, y una baja de
+    -- una fila que sigue visible (p. ej. la del proyecto anterior de un gasto
+    -- movido, para su dueño o para miembros de ambos proyectos) no se
+    -- entrega: su upsert viene en esta página o en una siguiente
+    SELECT COALESCE(jsonb_agg(
+        jsonb_build_object(
+            'entity', c.entity,
+            'id', c.entity_id,
+            'expense_id', c.expense_id,
+            'op', CASE WHEN row_data.data IS NULL THEN 'delete' ELSE 'upsert' END,
+            'data', row_data.data
+        ) ORDER BY c.txid, c.id
+    ), '[]'::JSONB)
+    INTO v_changes
+    FROM (
+        SELECT DISTINCT ON (p.entity, p.entity_id) p.*
+        FROM unnest(v_page) AS p
+        ORDER BY p.entity, p.entity_id, p.txid DESC, p.id DESC
+    ) c
+    CROSS JOIN LATERAL (
+        SELECT CASE c.entity
+            WHEN 'expense' THEN (
+                SELECT to_jsonb(e) - 'search_vector' FROM expenses e
+                WHERE e.id = c.entity_id AND (e.project_id = ANY(v_projects) OR e.user_id = p_user_id)
+            )
+            WHEN 'receipt' THEN (
+                SELECT to_jsonb(r) - 'ocr_text' - 'ocr_data' FROM receipts r JOIN expenses e ON e.id = r.expense_id
+                WHERE r.id = c.entity_id AND (e.project_id = ANY(v_projects) OR e.user_id = p_user_id)
+            )
+            WHEN 'comment' THEN (
+                SELECT to_jsonb(cm) FROM comments cm JOIN expenses e ON e.id = cm.expense_id
+                WHERE cm.id = c.entity_id AND (e.project_id = ANY(v_projects) OR e.user_id = p_user_id)
+            )
+        END AS data
+    ) row_data
+    WHERE c.op = 'upsert' OR row_data.data IS NULL;
+
+    -- Sin más páginas el token avanza hasta el horizonte: todo lo anterior
+    -- ya se revisó
+    RETURN jsonb_build_object(
+        'changes', v_changes,
+        'txid', CASE WHEN v_has_more THEN v_last.txid ELSE v_horizon END::TEXT,
+        'id', CASE WHEN v_has_more THEN v_last.id ELSE 0 END,
+        'has_more', v_has_more
+    );
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public;
+
+-- Aplica una operación del cliente. p_op: {entity, action, id, data,
+-- base_updated_at}. `id` lo genera el cliente al crear, así que reenviar la
+-- misma operación no duplica. Con base_updated_at (el updated_at que vio el
+-- cliente), un update o delete sobre una fila que cambió después es un
+-- conflicto y no se aplica.
+-- ¿El usuario es dueño o miembro del proyecto?
+CREATE OR REPLACE FUNCTION sync_is_project_member(p_user_id UUID, p_project_id UUID)
+RETURNS BOOLEAN AS $$
+    SELECT EXISTS (SELECT 1 FROM project_members WHERE project_id = p_project_id AND user_id = p_user_id)
+        OR EXISTS (SELECT 1 FROM projects WHERE id = p_project_id AND owner_id = p_user_id);
+$$ LANGUAGE sql STABLE;
+
+-- Returns: {status: applied | duplicate | conflict | not_found | forbidden, data}
+CREATE OR REPLACE FUNCTION sync_apply_operation(p_user_id UUID, p_op JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_entity TEXT := p_op->>'entity';
+    v_action TEXT := p_op->>'action';
+    v_id UUID := (p_op->>'id')::UUID;
+    v_data JSONB := COALESCE(p_op->'data', '{}'::JSONB);
+    v_base TIMESTAMP WITH TIME ZONE := (p_op->>'base_updated_at')::TIMESTAMP WITH TIME ZONE;
+    v_expense expenses;
+    v_comment comments;
+    v_receipt receipts;
+    v_owner UUID;
+BEGIN
+    IF v_entity = 'expense' THEN
+        SELECT * INTO v_expense FROM expenses WHERE id = v_id FOR UPDATE;
+
+        IF v_action = 'create' THEN
+            IF v_expense.id IS NOT NULL AND v_expense.user_id IS DISTINCT FROM p_user_id THEN
+                RETURN jsonb_build_object('status', 'forbidden');
+            ELSIF v_expense.id IS NOT NULL THEN
+                RETURN jsonb_build_object('status', 'duplicate', 'data', to_jsonb(v_expense) - 'search_vector');
+            ELSIF NOT sync_is_project_member(p_user_id, (v_data->>'project_id')::UUID) THEN
+                RETURN jsonb_build_object('status', 'forbidden');
+            END IF;
+            INSERT INTO expenses (
+                id, user_id, project_id, category_id, name, description, amount, date,
+                merchant_name, merchant_address, tax_amount, payment_method, rfc
+            )
+            SELECT
+                v_id, p_user_id, e.project_id, e.category_id, e.name, e.description, e.amount, e.date,
+                e.merchant_name, e.merchant_address, e.tax_amount, e.payment_method, e.rfc
+            FROM jsonb_populate_record(NULL::expenses, v_data) e
+            RETURNING * INTO v_expense;
+            RETURN jsonb_build_object('status', 'applied', 'data', to_jsonb(v_expense) - 'search_vector');
+        END IF;
+
+        IF v_expense.id IS NULL THEN
+            -- Borrar lo que ya no existe no es error
+            RETURN jsonb_build_object('status', CASE WHEN v_action = 'delete' THEN 'applied' ELSE 'not_found' END);
+        ELSIF v_expense.user_id IS DISTINCT FROM p_user_id THEN
+            RETURN jsonb_build_object('status', 'forbidden');
+        ELSIF v_base IS NOT NULL AND v_expense.updated_at IS DISTINCT FROM v_base THEN
+            RETURN jsonb_build_object('status', 'conflict', 'data', to_jsonb(v_expense) - 'search_vector');
+        ELSIF v_data ? 'project_id' AND NOT sync_is_project_member(p_user_id, (v_data->>'project_id')::UUID) THEN
+            RETURN jsonb_build_object('status', 'forbidden');
+        END IF;
+
+        IF v_action = 'delete' THEN
+            DELETE FROM expenses WHERE id = v_id;
+            RETURN jsonb_build_object('status', 'applied');
+        END IF;
+
+        UPDATE expenses x SET
+            project_id = CASE WHEN v_data ? 'project_id' THEN e.project_id ELSE x.project_id END,
+            category_id = CASE WHEN v_data ? 'category_id' THEN e.category_id ELSE x.category_id END,
+            name = CASE WHEN v_data ? 'name' THEN e.name ELSE x.name END,
+            description = CASE WHEN v_data ? 'description' THEN e.description ELSE x.description END,
+            amount = CASE WHEN v_data ? 'amount' THEN e.amount ELSE x.amount END,
+            date = CASE WHEN v_data ? 'date' THEN e.date ELSE x.date END,
+            merchant_name = CASE WHEN v_data ? 'merchant_name' THEN e.merchant_name ELSE x.merchant_name END,
+            merchant_address = CASE WHEN v_data ? 'merchant_address' THEN e.merchant_address ELSE x.merchant_address END,
+            tax_amount = CASE WHEN v_data ? 'tax_amount' THEN e.tax_amount ELSE x.tax_amount END,
+            payment_method = CASE WHEN v_data ? 'payment_method' THEN e.payment_method ELSE x.payment_method END,
+            rfc = CASE WHEN v_data ? 'rfc' THEN e.rfc ELSE x.rfc END
+        FROM jsonb_populate_record(NULL::expenses, v_data) e
+        WHERE x.id = v_id
+        RETURNING x.* INTO v_expense;
+        RETURN jsonb_build_object('status', 'applied', 'data', to_jsonb(v_expense) - 'search_vector');
+
+    ELSIF v_entity = 'comment' THEN
+        SELECT * INTO v_comment FROM comments WHERE id = v_id FOR UPDATE;
+
+        IF v_action = 'create' THEN
+            IF v_comment.id IS NOT NULL AND v_comment.user_id IS DISTINCT FROM p_user_id THEN
+                RETURN jsonb_build_object('status', 'forbidden');
+            ELSIF v_comment.id IS NOT NULL THEN
+                RETURN jsonb_build_object('status', 'duplicate', 'data', to_jsonb(v_comment));
+            END IF;
+            -- Cualquier miembro del proyecto puede comentar
+            SELECT project_id INTO v_owner FROM expenses WHERE id = (v_data->>'expense_id')::UUID;
+            IF v_owner IS NULL THEN
+                RETURN jsonb_build_object('status', 'not_found');
+            ELSIF NOT sync_is_project_member(p_user_id, v_owner) THEN
+                RETURN jsonb_build_object('status', 'forbidden');
+            END IF;
+            INSERT INTO comments (id, expense_id, user_id, text)
+            VALUES (v_id, (v_data->>'expense_id')::UUID, p_user_id, v_data->>'text')
+            RETURNING * INTO v_comment;
+            RETURN jsonb_build_object('status', 'applied', 'data', to_jsonb(v_comment));
+        END IF;
+
+        IF v_comment.id IS NULL THEN
+            RETURN jsonb_build_object('status', CASE WHEN v_action = 'delete' THEN 'applied' ELSE 'not_found' END);
+        ELSIF v_comment.user_id IS DISTINCT FROM p_user_id THEN
+            RETURN jsonb_build_object('status', 'forbidden');
+        ELSIF v_base IS NOT NULL AND v_comment.updated_at IS DISTINCT FROM v_base THEN
+            RETURN jsonb_build_object('status', 'conflict', 'data', to_jsonb(v_comment));
+        END IF;
+
+        IF v_action = 'delete' THEN
+            DELETE FROM comments WHERE id = v_id;
+            RETURN jsonb_build_object('status', 'applied');
+        END IF;
+
+        UPDATE comments SET text = COALESCE(v_data->>'text', text)
+        WHERE id = v_id
+        RETURNING * INTO v_comment;
+        RETURN jsonb_build_object('status', 'applied', 'data', to_jsonb(v_comment));
+
+    ELSIF v_entity = 'receipt' THEN
+        -- Los recibos no se editan: se crean (la imagen ya subida a Storage) o se borran
+        SELECT * INTO v_receipt FROM receipts WHERE id = v_id FOR UPDATE;
+
+        IF v_action = 'create' THEN
+            SELECT user_id INTO v_owner FROM expenses
+            WHERE id = COALESCE(v_receipt.expense_id, (v_data->>'expense_id')::UUID);
+            IF v_owner IS DISTINCT FROM p_user_id THEN
+                RETURN jsonb_build_object('status', CASE WHEN v_owner IS NULL THEN 'not_found' ELSE 'forbidden' END);
+            ELSIF v_receipt.id IS NOT NULL THEN
+                RETURN jsonb_build_object('status', 'duplicate', 'data', to_jsonb(v_receipt) - 'ocr_text' - 'ocr_data');
+            END IF;
+            INSERT INTO receipts (id, expense_id, image_url, thumbnail_url)
+            VALUES (v_id, (v_data->>'expense_id')::UUID, v_data->>'image_url', v_data->>'thumbnail_url')
+            RETURNING * INTO v_receipt;
+            RETURN jsonb_build_object('status', 'applied', 'data', to_jsonb(v_receipt) - 'ocr_text' - 'ocr_data');
+        END IF;
+
+        IF v_receipt.id IS NULL THEN
+            RETURN jsonb_build_object('status', 'applied');
+        END IF;
+        SELECT user_id INTO v_owner FROM expenses WHERE id = v_receipt.expense_id;
+        IF v_owner IS DISTINCT FROM p_user_id THEN
+            RETURN jsonb_build_object('status', 'forbidden');
+        END IF;
+        DELETE FROM receipts WHERE id = v_id;
+        RETURN jsonb_build_object('status', 'applied');
+    END IF;
+
+    RAISE EXCEPTION 'Operación no soportada: % %', v_entity, v_action;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Aplica la cola de operaciones del cliente en orden, en una sola llamada.
+-- Cada operación corre en su propio savepoint: si una falla, se reporta
+-- con status `error` y las demás siguen.
+-- Returns: [{op_id, status, data?, error?}] en el mismo orden que p_ops
+CREATE OR REPLACE FUNCTION sync_push(p_user_id UUID, p_ops JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_op JSONB;
+    v_result JSONB;
+    v_results JSONB := '[]'::JSONB;
+BEGIN
+    FOR v_op IN SELECT value FROM jsonb_array_elements(p_ops) LOOP
+        BEGIN
+            v_result := sync_apply_operation(p_user_id, v_op);
+        EXCEPTION WHEN OTHERS THEN
+            v_result := jsonb_build_object('status', 'error', 'error', SQLERRM);
+        END;
+        v_results := v_results || jsonb_build_array(jsonb_build_object('op_id', v_op->'op_id') || v_result);
+    END LOOP;
+    RETURN v_results;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Borra el log anterior a p_before y recuerda hasta qué transacción llegó
+CREATE OR REPLACE FUNCTION sync_prune(p_before TIMESTAMP WITH TIME ZONE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_deleted INTEGER;
+    v_through XID8;
+BEGIN
+    WITH deleted AS (
+        DELETE FROM sync_changes WHERE changed_at < p_before RETURNING txid
+    )
+    SELECT COUNT(*), MAX(txid) INTO v_deleted, v_through FROM deleted;
+
+    IF v_through IS NOT NULL THEN
+        UPDATE sync_state
+        SET pruned_through = GREATEST(COALESCE(pruned_through, v_through), v_through);
+    END IF;
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reciben el usuario como parámetro (el backend ya lo autenticó) y
+-- sync_pull ignora RLS: no se exponen por PostgREST a anon ni authenticated,
+-- solo el backend las llama con la service key
+REVOKE EXECUTE ON FUNCTION
+    sync_pull(UUID, TEXT, BIGINT, INTEGER),
+    sync_push(UUID, JSONB),
+    sync_apply_operation(UUID, JSONB),
+    sync_is_project_member(UUID, UUID),
+    sync_prune(TIMESTAMP WITH TIME ZONE)
+FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION
+    sync_pull(UUID, TEXT, BIGINT, INTEGER),
+    sync_push(UUID, JSONB),
+    sync_apply_operation(UUID, JSONB),
+    sync_is_project_member(UUID, UUID),
+    sync_prune(TIMESTAMP WITH TIME ZONE)
+TO service_role;
+
 -- ===================================
 -- ROW LEVEL SECURITY (RLS)
 -- ===================================
@@ -226,7 +1651,15 @@ ALTER TABLE expenses ENABLE ROW LEVEL SECURITY;
 ALTER TABLE receipts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE comments ENABLE ROW LEVEL SECURITY;
 ALTER TABLE budgets ENABLE ROW LEVEL SECURITY;
+ALTER TABLE budget_alerts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE goals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE expense_daily_totals ENABLE ROW LEVEL SECURITY;
+-- Sin políticas: solo se leen con expenses_list_version (SECURITY DEFINER,
+-- así que funciona con cualquier key; solo devuelve contadores)
+ALTER TABLE list_versions ENABLE ROW LEVEL SECURITY;
+-- Sin políticas: solo se leen con sync_pull (filtra por usuario)
+ALTER TABLE sync_changes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sync_state ENABLE ROW LEVEL SECURITY;
 
 -- Políticas básicas (ajustar según necesidad)
 -- Los usuarios solo ven sus propios datos
@@ -254,6 +1687,20 @@ CREATE POLICY "Users can update own expenses" ON expenses
 CREATE POLICY "Users can delete own expenses" ON expenses
     FOR DELETE USING (user_id = auth.uid());
 
+-- Rollup: solo lectura para miembros del proyecto (lo escriben los triggers)
+CREATE POLICY "Users can view project daily totals" ON expense_daily_totals
+    FOR SELECT USING (
+        project_id IN (
+            SELECT project_id FROM project_members WHERE user_id = auth.uid()
+        )
+    );
+
+-- Alertas de presupuestos: solo las de presupuestos propios
+CREATE POLICY "Users can view own budget alerts" ON budget_alerts
+    FOR SELECT USING (
+        budget_id IN (SELECT id FROM budgets WHERE user_id = auth.uid())
+    );
+
 -- ===================================
 -- DATOS INICIALES: Categorías del sistema
 -- ===================================
@@ -264,3 +1711,6 @@ INSERT INTO categories (name, icon, color, is_system) VALUES
     ('Compras', 'cart-outline', '#F38181', TRUE),
     ('Salud', 'medkit-outline', '#A8E6CF', TRUE),
     ('Educación', 'book-outline', '#FFD3B6', TRUE);
+
+-- Estado del log de sincronización (una sola fila)
+INSERT INTO sync_state DEFAULT VALUES;
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -6,11 +7,31 @@ import os
 # Cargar variables de entorno
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Cerrar los pools de conexiones a Supabase
+    from app.database import admin_database, database
+    await database.close()
+    await admin_database.close()
+
 # Crear app
 app = FastAPI(
     title="FinanceApp API",
     description="Backend para app de finanzas con ML y OCR",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Límite de tamaño de los uploads de OCR (antes de leer el cuerpo completo).
+# Va antes que CORS, que así queda por fuera y el 413 también lleva sus headers
+from app.config import settings
+from app.services.upload_intake import UploadSizeLimitMiddleware
+
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.ocr_upload_max_request_bytes,
+    path_prefix="/api/ocr",
 )
 
 # CORS - permitir que React Native se conecte
@@ -39,12 +60,14 @@ async def health_check():
     }
 
 # Importar routers
-from app.routers import ocr, expenses
+from app.routers import ocr, expenses, budgets, sync
 # from app.routers import ml  # Próximamente
 
 # Registrar routers
 app.include_router(ocr.router, prefix="/api/ocr", tags=["OCR"])
 app.include_router(expenses.router, prefix="/api/expenses", tags=["Expenses"])
+app.include_router(budgets.router, prefix="/api/budgets", tags=["Budgets"])
+app.include_router(sync.router, prefix="/api/sync", tags=["Sync"])
 
 if __name__ == "__main__":
     import uvicorn
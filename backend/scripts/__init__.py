@@ -0,0 +1 @@
+"""Jobs de mantenimiento (se corren con `python -m scripts.<nombre>` desde backend/)"""
@@ -0,0 +1,58 @@
+"""
+Verificación y reconstrucción del rollup diario de gastos
+
+`expense_daily_totals` guarda los totales por (proyecto, día, categoría) que
+leen los resúmenes del dashboard; los triggers de `expenses` lo mantienen al
+día en cada insert, update y delete (database_schema.sql, sección ROLLUP
+DIARIO). Este job compara el rollup con `expenses` y lo reconstruye si hace
+falta: al crearlo en una BD que ya tiene gastos, o si alguien escribió en
+`expenses` con los triggers desactivados.
+
+La reconstrucción bloquea las escrituras a `expenses` mientras corre.
+
+Uso (desde backend/):
+    python -m scripts.expense_rollup verify
+    python -m scripts.expense_rollup verify --project-id <uuid>
+    python -m scripts.expense_rollup rebuild [--project-id <uuid>]
+"""
+import argparse
+import time
+from typing import Optional
+
+from app.database import supabase_admin
+
+
+def verify(project_id: Optional[str]) -> int:
+    result = supabase_admin.rpc("expense_rollup_verify", {"p_project_id": project_id}).execute()
+    mismatches = result.data or []
+
+    for row in mismatches[:20]:
+        print(f"  {row['project_id']} {row['day']} categoría {row['category_id']}: "
+              f"esperado {row['expected_count']} / {row['expected_total']}, "
+              f"rollup {row['actual_count']} / {row['actual_total']}")
+    if len(mismatches) > 20:
+        print(f"  ... {len(mismatches) - 20} diferencias más")
+
+    if mismatches:
+        print(f"\n{len(mismatches)} filas del rollup no coinciden con expenses. "
+              "Corre `python -m scripts.expense_rollup rebuild`")
+        return 1
+    print("El rollup coincide con expenses")
+    return 0
+
+
+def rebuild(project_id: Optional[str]) -> int:
+    started = time.perf_counter()
+    result = supabase_admin.rpc("expense_rollup_rebuild", {"p_project_id": project_id}).execute()
+    print(f"Rollup reconstruido en {time.perf_counter() - started:.1f}s: {result.data} filas "
+          f"(proyecto, día, categoría)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("verify", "rebuild"))
+    parser.add_argument("--project-id", help="Solo este proyecto (default: todos)")
+    args = parser.parse_args()
+    commands = {"verify": verify, "rebuild": rebuild}
+    raise SystemExit(commands[args.command](args.project_id))
@@ -0,0 +1,91 @@
+"""
+Importación masiva de gastos desde la terminal (CSV, XLSX, OFX)
+
+Mismo importador que `POST /api/expenses/import` (app/services/expense_import),
+pero leyendo el archivo del disco y con la service key: útil para migraciones
+grandes que no conviene subir por HTTP. Lee el archivo como stream y escribe
+por lotes, así que la memoria no crece con el número de filas. Volver a
+correrlo con el mismo archivo y proyecto no duplica gastos (upsert por
+proyecto y external_id).
+
+Uso (desde backend/):
+    python -m scripts.import_expenses gastos.csv --project-id <uuid> --dry-run
+    python -m scripts.import_expenses movimientos.ofx --project-id <uuid> --user-id <uuid>
+    python -m scripts.import_expenses gastos.xlsx --project-id <uuid> --chunk-size 1000 --errors errores.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.config import settings
+from app.database import Database
+from app.services.expense_import import FORMATS, detect_format, expense_importer
+
+TEMP_USER_ID = "00000000-0000-0000-0000-000000000000"
+
+
+async def main(path: Path, project_id: str, user_id: str, file_format: Optional[str],
+               chunk_size: Optional[int], dry_run: bool, signed_amounts: bool, errors_path: Optional[Path]) -> int:
+    file_format = file_format or detect_format(path.name)
+    if file_format not in FORMATS:
+        print(f"Formato no soportado: {path.name}. Usa --format {' | '.join(FORMATS)}")
+        return 2
+
+    database = Database(settings.supabase_url, settings.supabase_service_key)
+    started = time.perf_counter()
+
+    def progress(report: Dict) -> None:
+        seconds = time.perf_counter() - started
+        print(f"{report['rows']} filas | {report['imported']} importadas, {report['duplicates']} duplicadas, "
+              f"{report['skipped']} omitidas, {report['failed']} con error | "
+              f"{report['rows'] / seconds if seconds else 0:.0f} filas/s")
+
+    try:
+        with path.open("rb") as file:
+            report = await expense_importer.import_file(
+                database.client,
+                file,
+                file_format,
+                project_id=project_id,
+                user_id=user_id,
+                chunk_size=chunk_size,
+                dry_run=dry_run,
+                signed_amounts=signed_amounts,
+                on_chunk=progress
+            )
+    finally:
+        await database.close()
+
+    for error in report["errors"][:20]:
+        print(f"  renglón {error['row']}: {error['error']}")
+    if len(report["errors"]) > 20 or report["errors_truncated"]:
+        print(f"  ... {len(report['errors']) - 20 + report['errors_truncated']} errores más")
+    if errors_path:
+        errors_path.write_text(json.dumps(report["errors"], indent=2, ensure_ascii=False))
+
+    total_seconds = time.perf_counter() - started
+    print(f"\nListo en {total_seconds:.1f}s: {report['imported']} importadas de {report['rows']} filas"
+          + (" (dry-run: no se escribió nada)" if dry_run else ""))
+    if not report["success"]:
+        print(report["error"])
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="Archivo CSV, XLSX u OFX")
+    parser.add_argument("--project-id", required=True, help="Proyecto al que se asignan los gastos")
+    parser.add_argument("--user-id", default=TEMP_USER_ID, help="Dueño de los gastos")
+    parser.add_argument("--format", choices=FORMATS, help="Default: según la extensión")
+    parser.add_argument("--chunk-size", type=int, help=f"Filas por upsert (default {settings.expense_import_chunk_size})")
+    parser.add_argument("--dry-run", action="store_true", help="Solo validar, sin escribir")
+    parser.add_argument("--signed-amounts", action="store_true",
+                        help="Montos con signo (estado de cuenta): los positivos son abonos y se omiten")
+    parser.add_argument("--errors", type=Path, help="Guardar los errores por fila en un JSON")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args.path, args.project_id, args.user_id, args.format,
+                                      args.chunk_size, args.dry_run, args.signed_amounts, args.errors)))
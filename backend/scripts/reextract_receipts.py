@@ -0,0 +1,175 @@
+"""
+Re-extracción masiva de recibos guardados
+
+Cuando mejoran las reglas de OCRPostProcessor (catálogo de comercios, regex,
+búsqueda aproximada), este job las aplica a los recibos históricos usando el
+`ocr_text` guardado. Nunca llama a Document AI: solo lee y escribe en
+Supabase.
+
+- Recorre `receipts` por páginas en orden de id (keyset: `id > último`), sin
+  OFFSET, así que cada página cuesta lo mismo aunque haya cientos de miles
+- Corre `OCRPostProcessor.process` en un pool de procesos
+- Escribe solo los recibos con cambios, por lotes con un solo UPDATE cada
+  uno (`receipts_update_ocr_data`): un recibo borrado mientras tanto se
+  salta, no se vuelve a insertar
+- Guarda un checkpoint (último id procesado) después de cada página: si se
+  interrumpe, la siguiente corrida continúa donde se quedó
+- Reporta filas por segundo
+
+Pistas de Document AI: los recibos nuevos guardan las originales en
+`ocr_data.docai_hints`. En los anteriores solo existen los valores ya
+mejorados, que se usan como pistas; por eso en ellos los cambios vienen
+sobre todo de la detección de comercio y RFC.
+
+Uso (desde backend/):
+    python -m scripts.reextract_receipts --dry-run
+    python -m scripts.reextract_receipts --workers 8 --page-size 1000
+    python -m scripts.reextract_receipts --reset   # ignorar el checkpoint
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.database import supabase_admin
+from app.services.ocr_postprocessor import OCRPostProcessor, ocr_postprocessor
+
+# Campos de ocr_data que produce el post-procesador
+EXTRACTED_FIELDS = ('merchant_name', 'rfc', 'total_amount', 'date')
+UNKNOWN_MERCHANT = "Comercio no identificado"
+
+
+def reextract(row: Dict) -> Optional[Dict]:
+    """
+    Corre el post-procesador sobre un recibo guardado (en un proceso del pool)
+
+    Returns:
+        {id, ocr_data} si algún campo cambió, None si no
+    """
+    text = row.get("ocr_text") or ""
+    if not text.strip():
+        return None
+
+    ocr_data = row.get("ocr_data") or {}
+    hints = ocr_data.get("docai_hints")
+    if hints is None:
+        # Recibo anterior a docai_hints: los valores guardados son las pistas
+        hints = OCRPostProcessor.docai_hints(ocr_data)
+        if hints.get("merchant_name") == UNKNOWN_MERCHANT:
+            hints.pop("merchant_name")
+
+    enhanced = ocr_postprocessor.process({"extracted_data": hints}, text)
+
+    changes = {
+        field: enhanced[field]
+        for field in EXTRACTED_FIELDS
+        if enhanced[field] is not None and enhanced[field] != ocr_data.get(field)
+    }
+    if not changes:
+        return None
+
+    return {
+        "id": row["id"],
+        "ocr_data": {
+            **ocr_data,
+            **changes,
+            "reextracted_at": datetime.now(timezone.utc).isoformat(),
+        },
+    }
+
+
+def load_checkpoint(path: Path) -> Dict:
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"last_id": None, "processed": 0, "changed": 0}
+
+
+def save_checkpoint(path: Path, checkpoint: Dict) -> None:
+    # Escritura atómica: un checkpoint a medias haría repetir o saltar filas
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(checkpoint, indent=2))
+    tmp_path.replace(path)
+
+
+def fetch_page(last_id: Optional[str], page_size: int) -> List[Dict]:
+    query = supabase_admin.table("receipts")\
+        .select("id, ocr_text, ocr_data")\
+        .order("id")\
+        .limit(page_size)
+    if last_id:
+        query = query.gt("id", last_id)
+    return query.execute().data
+
+
+def write_changes(rows: List[Dict], batch_size: int) -> int:
+    """Returns: recibos actualizados (los borrados mientras tanto no cuentan)"""
+    updated = 0
+    for start in range(0, len(rows), batch_size):
+        result = supabase_admin.rpc("receipts_update_ocr_data", {
+            "p_rows": rows[start:start + batch_size],
+        }).execute()
+        updated += result.data or 0
+    return updated
+
+
+def main(workers: int, page_size: int, batch_size: int, checkpoint_path: Path,
+         reset: bool, dry_run: bool, limit: Optional[int]) -> None:
+    checkpoint = {"last_id": None, "processed": 0, "changed": 0} if reset else load_checkpoint(checkpoint_path)
+    if checkpoint["last_id"]:
+        print(f"Continuando después de {checkpoint['last_id']} "
+              f"({checkpoint['processed']} procesados, {checkpoint['changed']} con cambios)")
+
+    run_processed = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while limit is None or run_processed < limit:
+            page_started = time.perf_counter()
+            rows = fetch_page(checkpoint["last_id"], page_size)
+            if not rows:
+                break
+
+            chunksize = max(1, len(rows) // (workers * 4))
+            changed = [row for row in pool.map(reextract, rows, chunksize=chunksize) if row]
+
+            if changed and not dry_run:
+                updated = write_changes(changed, batch_size)
+                if updated < len(changed):
+                    print(f"{len(changed) - updated} recibos se borraron antes de escribir; se saltan")
+
+            run_processed += len(rows)
+            checkpoint["last_id"] = rows[-1]["id"]
+            checkpoint["processed"] += len(rows)
+            checkpoint["changed"] += len(changed)
+            if not dry_run:
+                save_checkpoint(checkpoint_path, checkpoint)
+
+            page_seconds = time.perf_counter() - page_started
+            total_seconds = time.perf_counter() - started
+            print(f"{len(rows)} filas, {len(changed)} con cambios | "
+                  f"{len(rows) / page_seconds:.0f} filas/s (promedio {run_processed / total_seconds:.0f}) | "
+                  f"último id {checkpoint['last_id']}")
+
+    total_seconds = time.perf_counter() - started
+    print(f"\nListo: {run_processed} filas en {total_seconds:.1f}s "
+          f"({run_processed / total_seconds if total_seconds else 0:.0f} filas/s), "
+          f"{checkpoint['changed']} con cambios en total"
+          + (" (dry-run: no se escribió nada)" if dry_run else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Procesos del pool")
+    parser.add_argument("--page-size", type=int, default=1000, help="Recibos leídos por página")
+    parser.add_argument("--batch-size", type=int, default=500, help="Filas por UPDATE")
+    parser.add_argument("--checkpoint", default="reextract_receipts.checkpoint.json")
+    parser.add_argument("--reset", action="store_true", help="Empezar desde el inicio")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar cambios, sin escribir")
+    parser.add_argument("--limit", type=int, help="Máximo de recibos en esta corrida")
+    args = parser.parse_args()
+    main(args.workers, args.page_size, args.batch_size, Path(args.checkpoint),
+         args.reset, args.dry_run, args.limit)